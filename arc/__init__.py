@@ -1,16 +1,20 @@
 # from .augmentations import *
-from .agents import Agent
+from .agents import Agent, AsyncAgent
+from .batch import RiddleBatch
 from .eval import evaluate_and_report
 from .hints import BoardHints, Hints
-from .interface import Board, BoardPair, Riddle, TaskData, TopKList
+from .interface import Board, BoardPair, LazyRiddle, Riddle, TaskData, TopKList
 
 __all__ = [
     "Board",
     "BoardPair",
     "Riddle",
+    "LazyRiddle",
     "TaskData",
     "TopKList",
+    "RiddleBatch",
     "Agent",
+    "AsyncAgent",
     "BoardHints",
     "Hints",
     "evaluate_and_report",
@@ -1,3 +1,3 @@
-from .base import Agent
+from .base import Agent, AsyncAgent, RiddleWithHints, load_agent, load_agent_class
 
-__all__ = ["Agent"]
+__all__ = ["Agent", "AsyncAgent", "RiddleWithHints", "load_agent", "load_agent_class"]
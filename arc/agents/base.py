@@ -1,13 +1,59 @@
 #!/usr/bin/env python3
 
+import asyncio
+import hashlib
+import json
+from importlib import import_module
+from typing import Any, NamedTuple, Union
+
 from arc.hints import BoardHints, Hints
 from arc.interface import Board, BoardPair, RiddleSolution, TaskData, TopKList
 
 
+def agent_fingerprint(agent) -> str:
+    """Hash of an agent's class, ``version`` and ``cache_key()``."""
+    agent_class = type(agent)
+    key = json.dumps(
+        [
+            f"{agent_class.__module__}:{agent_class.__qualname__}",
+            agent.version,
+            agent.cache_key(),
+        ],
+        sort_keys=True,
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class RiddleWithHints(NamedTuple):
+    """What ``Agent.solve_riddle`` gets for one riddle, as an item of a batch."""
+
+    train: list[BoardPair]
+    test: list[Board]
+    hints: Hints
+
+
 class Agent:
+    # bump to invalidate cached solutions after changing the agent's behavior
+    version = "0"
+
     def __init__(self):
         pass
 
+    def cache_key(self) -> Any:
+        """
+        The configuration the agent's solutions depend on, e.g. its constructor
+        arguments, as JSON-serializable data.
+
+        Together with the class and ``version`` it identifies the agent in the
+        solution cache. Runtime state must stay out of it. By default agents of
+        one class are interchangeable.
+        """
+        return None
+
+    def fingerprint(self) -> str:
+        """Identity of the agent for the solution cache, see ``cache_key``."""
+        return agent_fingerprint(self)
+
     def solve_riddle(
         self,
         task_data: TaskData,
@@ -29,3 +75,81 @@ class Agent:
         test_idx: int,
     ) -> TopKList:
         raise NotImplementedError()
+
+    def solve_riddles_batch(
+        self, task_data: TaskData, riddles_with_hints: list[RiddleWithHints]
+    ) -> list[RiddleSolution]:
+        """
+        Solve many riddles at once, e.g. in one forward pass of a model.
+
+        The evaluator only calls this if a subclass overrides it, with batches
+        of riddles whose test inputs have the same shapes. Access hints through
+        the ``hints`` of each riddle so they are recorded per test sample.
+        """
+        return [
+            self.solve_riddle(task_data, item.hints, item.train, item.test)
+            for item in riddles_with_hints
+        ]
+
+    @classmethod
+    def has_batch_solver(cls) -> bool:
+        return cls.solve_riddles_batch is not Agent.solve_riddles_batch
+
+
+class AsyncAgent:
+    """
+    An agent whose solving is a coroutine, e.g. because it awaits a model server.
+
+    The evaluator runs many riddles concurrently on one event loop. By default
+    the test samples of a riddle are solved concurrently as well.
+    """
+
+    # see Agent
+    version = "0"
+
+    def __init__(self):
+        pass
+
+    def cache_key(self) -> Any:
+        return None
+
+    def fingerprint(self) -> str:
+        return agent_fingerprint(self)
+
+    async def solve_riddle(
+        self,
+        task_data: TaskData,
+        hints: Hints,
+        train: list[BoardPair],
+        test: list[Board],
+    ) -> RiddleSolution:
+        return list(
+            await asyncio.gather(
+                *(
+                    self.solve_test_sample(task_data, hints.board(idx), train, t, idx)
+                    for idx, t in enumerate(test)
+                )
+            )
+        )
+
+    async def solve_test_sample(
+        self,
+        task_data: TaskData,
+        hints: BoardHints,
+        train: list[BoardPair],
+        test: Board,
+        test_idx: int,
+    ) -> TopKList:
+        raise NotImplementedError()
+
+
+def load_agent_class(agent_path: str) -> type:
+    """Import an agent class from a ``module:ClassName`` path."""
+    agent_module_name, agent_classname = agent_path.split(":")
+    module = import_module(agent_module_name)
+    return getattr(module, agent_classname)
+
+
+def load_agent(agent_path: str) -> Union[Agent, AsyncAgent]:
+    """Instantiate an agent from a ``module:ClassName`` path."""
+    return load_agent_class(agent_path)()
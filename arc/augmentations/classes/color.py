@@ -2,6 +2,7 @@ import functools
 import random
 from typing import Union
 
+from arc import tracing
 from arc.augmentations.classes.helpers import same_aug_for_all_pairs_helper
 from arc.augmentations.functional.color import permute_color
 from arc.interface import BoardPair, Riddle
@@ -27,6 +28,7 @@ class RandomColor(object):
             colours = [0] + random.sample(list(range(1, 10)), 9)
         return (colours,)
 
+    @tracing.traced(category="augmentation")
     def __call__(
         self, input: Union[BoardPair, list[BoardPair], Riddle]
     ) -> Union[BoardPair, list[BoardPair]]:
@@ -5,6 +5,7 @@ from typing import Tuple, Union
 
 import numpy as np
 
+from arc import tracing
 from arc.augmentations.classes.helpers import same_aug_for_all_pairs_helper
 from arc.augmentations.functional.noise import noiseInput
 from arc.interface import BoardPair, Riddle
@@ -37,6 +38,7 @@ class Noise(object):
         noise_size = kwargs["noise_size"]
         return noise_level, noise_size
 
+    @tracing.traced(category="augmentation")
     def __call__(
         self, inp: Union[BoardPair, list[BoardPair], Riddle]
     ) -> Union[BoardPair, list[BoardPair]]:
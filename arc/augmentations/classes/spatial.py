@@ -2,6 +2,7 @@
 import random
 from typing import Union
 
+from arc import tracing
 from arc.augmentations.classes.helpers import p_and_same_aug_helper
 from arc.augmentations.functional.spatial import (
     Direction,
@@ -41,6 +42,7 @@ class RandomCropInputAndOuput:
         dir_choice_row = random.choice([-1, 1])
         return col_choice, row_choice, dir_choice_col, dir_choice_row
 
+    @tracing.traced(category="augmentation")
     def __call__(
         self, input: Union[BoardPair, list[BoardPair], Riddle]
     ) -> Union[BoardPair, list[BoardPair], Riddle]:
@@ -91,6 +93,7 @@ class RandomDoubleInputBoard:
 
         return sep, is_horizontal, z_index_of_original
 
+    @tracing.traced(category="augmentation")
     def __call__(
         self, input: Union[BoardPair, list[BoardPair], Riddle]
     ) -> Union[BoardPair, list[BoardPair], Riddle]:
@@ -132,6 +135,7 @@ class RandomRotate:
         rotation_to_use = random.choice(list(range(r + 1)))
         return rotation_to_use
 
+    @tracing.traced(category="augmentation")
     def __call__(
         self, input: Union[BoardPair, list[BoardPair], Riddle]
     ) -> Union[BoardPair, list[BoardPair], Riddle]:
@@ -172,6 +176,7 @@ class RandomReflect:
             y_axis = random.choice([True, False])
         return x_axis, y_axis
 
+    @tracing.traced(category="augmentation")
     def __call__(
         self, input: Union[BoardPair, list[BoardPair], Riddle]
     ) -> Union[BoardPair, list[BoardPair], Riddle]:
@@ -208,6 +213,7 @@ class RandomPad:
         v = random.choice(pad_values)
         return s, v
 
+    @tracing.traced(category="augmentation")
     def __call__(
         self, input: Union[BoardPair, list[BoardPair], Riddle]
     ) -> Union[BoardPair, list[BoardPair], Riddle]:
@@ -244,6 +250,7 @@ class RandomPadInputOnly:
         v = random.choice(pad_values)
         return s, v
 
+    @tracing.traced(category="augmentation")
     def __call__(
         self, input: Union[BoardPair, list[BoardPair], Riddle]
     ) -> Union[BoardPair, list[BoardPair], Riddle]:
@@ -282,6 +289,7 @@ class RandomSuperResolution:
         axes = random.choice(stretch_axis)
         return s, axes
 
+    @tracing.traced(category="augmentation")
     def __call__(
         self, input: Union[BoardPair, list[BoardPair], Riddle]
     ) -> Union[BoardPair, list[BoardPair], Riddle]:
@@ -13,4 +13,4 @@ def permute_color(InputPair: BoardPair, color_permutation):
         ret_input_board[input_np_board == i] = color_permutation[i]
         ret_output_board[output_np_board == i] = color_permutation[i]
 
-    return BoardPair(input=ret_input_board.tolist(), output=ret_output_board.tolist())
+    return BoardPair.construct_fast(input=ret_input_board, output=ret_output_board)
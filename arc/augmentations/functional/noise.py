@@ -5,7 +5,6 @@ from arc.interface import BoardPair
 
 def noiseInput(inputPair: BoardPair, noise_level, noise_size, color) -> BoardPair:
     input_np_board = inputPair.input.np
-    output_np_board = inputPair.output.np
     height, width = input_np_board.shape
 
     rng = np.random.default_rng(28)
@@ -13,8 +12,8 @@ def noiseInput(inputPair: BoardPair, noise_level, noise_size, color) -> BoardPai
     N = int(width * height * noise_level)
     nx = rng.integers(low=0, high=width, size=N)
     ny = rng.integers(low=0, high=height, size=N)
-    noise = np.zeros((height, width))
-    mask = np.ones((height, width))
+    noise = np.zeros((height, width), dtype=np.uint8)
+    mask = np.ones((height, width), dtype=np.uint8)
     for x, y in zip(nx, ny):
         for i in range(x, x + noise_size[0]):
             for j in range(y, y + noise_size[1]):
@@ -23,4 +22,4 @@ def noiseInput(inputPair: BoardPair, noise_level, noise_size, color) -> BoardPai
                     mask[i, j] = 0
     res = mask * input_np_board + noise
 
-    return BoardPair(input=res.tolist(), output=output_np_board.tolist())
+    return BoardPair.construct_fast(input=res, output=inputPair.output)
@@ -39,7 +39,7 @@ def cropInputAndOutput(
         dir_choice_row,
     ).np
 
-    return BoardPair(input=input_np_board.tolist(), output=output_np_board.tolist())
+    return BoardPair.construct_fast(input=input_np_board, output=output_np_board)
 
 
 def cropBoard(
@@ -60,7 +60,8 @@ def cropBoard(
         else:
             boardIn = boardIn[:, :-rows_to_rem_choice]
 
-    return Board(__root__=boardIn.tolist())
+    # validated: cropping more rows or columns than there are leaves no board
+    return Board(__root__=boardIn)
 
 
 def doubleBoard(
@@ -86,7 +87,7 @@ def doubleBoard(
         ret_board_size[1] = ret_board_size[1] * 2 + separation
     else:
         ret_board_size[0] = ret_board_size[0] * 2 + separation
-    ret_board = np.zeros(ret_board_size)
+    ret_board = np.zeros(ret_board_size, dtype=np.uint8)
 
     if is_horizontal_cat:
         if z_index_of_original == 0:
@@ -104,7 +105,7 @@ def doubleBoard(
             ret_board[-len(np_board) :, :] = np_board
             ret_board[: len(np_board), :] = np_board
 
-    return Board(__root__=ret_board.tolist())
+    return Board.from_array_trusted(ret_board)
 
 
 def doubleInputBoard(
@@ -126,9 +127,9 @@ def rotate(board_pair: BoardPair, num_rotations: int = 0) -> BoardPair:
     assert num_rotations >= 0 and num_rotations < 4
     if num_rotations == 0:
         return board_pair
-    return BoardPair(
-        input=Board(__root__=np.rot90(board_pair.input.np, num_rotations)),
-        output=Board(__root__=np.rot90(board_pair.output.np, num_rotations)),
+    return BoardPair.construct_fast(
+        input=np.rot90(board_pair.input.np, num_rotations),
+        output=np.rot90(board_pair.output.np, num_rotations),
     )
 
 
@@ -150,9 +151,9 @@ def reflect(
     elif y_axis:
         flip = 1
 
-    return BoardPair(
-        input=Board(__root__=np.flip(board_pair.input.np, flip)),
-        output=Board(__root__=np.flip(board_pair.output.np, flip)),
+    return BoardPair.construct_fast(
+        input=np.flip(board_pair.input.np, flip),
+        output=np.flip(board_pair.output.np, flip),
     )
 
 
@@ -161,13 +162,13 @@ def padInputOutput(board: BoardPair, size: int, pad_value: int) -> BoardPair:
     output_np_board = board.output.np
     input_np_board = padBoard(input_np_board, size, pad_value)
     output_np_board = padBoard(output_np_board, size, pad_value)
-    return BoardPair(input=input_np_board.tolist(), output=output_np_board.tolist())
+    return BoardPair.construct_fast(input=input_np_board, output=output_np_board)
 
 
 def padInputOnly(board: BoardPair, size: int, pad_value: int) -> BoardPair:
     input_np_board = board.input.np
     input_np_board = padBoard(input_np_board, size, pad_value)
-    return BoardPair(input=input_np_board.tolist(), output=board.output)
+    return BoardPair.construct_fast(input=input_np_board, output=board.output)
 
 
 def padBoard(boardIn: np.ndarray, size: int, pad_value: int) -> np.ndarray:
@@ -194,4 +195,5 @@ def superResolutionBoard(boardIn: Board, factor: int, stretch_axis: Direction) -
     elif stretch_axis == Direction.both:
         np_board = np.repeat(np_board, factor, axis=0)
         np_board = np.repeat(np_board, factor, axis=1)
-    return Board(__root__=np_board.tolist())
+    # validated: a factor of 0 leaves no board
+    return Board(__root__=np_board)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from arc.interface import Riddle
+
+
+class RiddleBatch:
+    """
+    All train and test pairs of one or many riddles as padded uint8 arrays.
+
+    Every pair is one entry along the first axis. ``inputs`` and ``outputs``
+    have shape ``(N, H_max, W_max)`` and are padded with ``pad_value``;
+    ``input_shapes``/``output_shapes`` hold the real ``(rows, cols)`` of every
+    board, and ``riddle_idx``, ``pair_idx`` and ``is_test`` locate the pair in
+    its riddle. Test outputs are only filled if requested (see ``has_output``).
+
+    Passing a previous batch as ``out`` reuses its buffers whenever they are
+    large enough, so feeding many batches does not reallocate.
+    """
+
+    def __init__(self):
+        self._capacity = (0, 0, 0)
+        self._buffers: dict[str, np.ndarray] = {}
+        self.riddle_ids: list[Optional[str]] = []
+        self.pad_value = 0
+        self._num_pairs, self._height, self._width = 0, 0, 0
+
+    def __len__(self) -> int:
+        return self._num_pairs
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return (self._num_pairs, self._height, self._width)
+
+    def _allocate(self, num_pairs: int, height: int, width: int):
+        capacity = tuple(
+            max(c, n) for c, n in zip(self._capacity, (num_pairs, height, width))
+        )
+        if capacity != self._capacity:
+            n, h, w = capacity
+            self._buffers = {
+                "inputs": np.empty((n, h, w), dtype=np.uint8),
+                "outputs": np.empty((n, h, w), dtype=np.uint8),
+                "input_shapes": np.empty((n, 2), dtype=np.int32),
+                "output_shapes": np.empty((n, 2), dtype=np.int32),
+                "riddle_idx": np.empty(n, dtype=np.int32),
+                "pair_idx": np.empty(n, dtype=np.int32),
+                "is_test": np.empty(n, dtype=bool),
+                "has_output": np.empty(n, dtype=bool),
+            }
+            self._capacity = capacity
+        self._num_pairs, self._height, self._width = num_pairs, height, width
+
+    @property
+    def inputs(self) -> np.ndarray:
+        return self._buffers["inputs"][: self._num_pairs, : self._height, : self._width]
+
+    @property
+    def outputs(self) -> np.ndarray:
+        return self._buffers["outputs"][
+            : self._num_pairs, : self._height, : self._width
+        ]
+
+    @property
+    def input_shapes(self) -> np.ndarray:
+        return self._buffers["input_shapes"][: self._num_pairs]
+
+    @property
+    def output_shapes(self) -> np.ndarray:
+        return self._buffers["output_shapes"][: self._num_pairs]
+
+    @property
+    def riddle_idx(self) -> np.ndarray:
+        return self._buffers["riddle_idx"][: self._num_pairs]
+
+    @property
+    def pair_idx(self) -> np.ndarray:
+        return self._buffers["pair_idx"][: self._num_pairs]
+
+    @property
+    def is_test(self) -> np.ndarray:
+        return self._buffers["is_test"][: self._num_pairs]
+
+    @property
+    def has_output(self) -> np.ndarray:
+        return self._buffers["has_output"][: self._num_pairs]
+
+    def _valid_mask(self, shapes: np.ndarray) -> np.ndarray:
+        rows = np.arange(self._height)[None, :, None] < shapes[:, 0, None, None]
+        cols = np.arange(self._width)[None, None, :] < shapes[:, 1, None, None]
+        return rows & cols
+
+    @property
+    def input_mask(self) -> np.ndarray:
+        """``(N, H_max, W_max)`` mask of the cells that belong to the input."""
+        return self._valid_mask(self.input_shapes)
+
+    @property
+    def output_mask(self) -> np.ndarray:
+        """``(N, H_max, W_max)`` mask of the cells that belong to the output."""
+        return self._valid_mask(self.output_shapes)
+
+    @classmethod
+    def from_riddles(
+        cls,
+        riddles: Sequence[Riddle],
+        with_test_outputs: bool = True,
+        pad_value: int = 0,
+        out: Optional["RiddleBatch"] = None,
+    ) -> "RiddleBatch":
+        """
+        Stack all pairs of the given riddles.
+
+        :param riddles: Riddles to stack, in order.
+        :param with_test_outputs: Whether to fill in the test outputs.
+        :param pad_value: Value of the cells outside of the boards.
+        :param out: Batch whose buffers to reuse (and return).
+        :return: The filled batch.
+        """
+        pairs = [
+            (riddle_idx, pair_idx, is_test, pair)
+            for riddle_idx, riddle in enumerate(riddles)
+            for is_test, riddle_pairs in ((False, riddle.train), (True, riddle.test))
+            for pair_idx, pair in enumerate(riddle_pairs)
+        ]
+        # hidden test outputs must not widen the padding, that would leak their shape
+        boards = [
+            board
+            for _, _, is_test, pair in pairs
+            for board in (
+                (pair.input, pair.output)
+                if with_test_outputs or not is_test
+                else (pair.input,)
+            )
+        ]
+        height = max((board.num_rows for board in boards), default=0)
+        width = max((board.num_cols for board in boards), default=0)
+
+        batch = cls() if out is None else out
+        batch._allocate(len(pairs), height, width)
+        batch.riddle_ids = [riddle.riddle_id for riddle in riddles]
+        batch.pad_value = pad_value
+        inputs, outputs = batch.inputs, batch.outputs
+        inputs.fill(pad_value)
+        outputs.fill(pad_value)
+        for idx, (riddle_idx, pair_idx, is_test, pair) in enumerate(pairs):
+            has_output = with_test_outputs or not is_test
+            input_rows, input_cols = pair.input.shape
+            inputs[idx, :input_rows, :input_cols] = pair.input.np
+            batch.input_shapes[idx] = pair.input.shape
+            if has_output:
+                output_rows, output_cols = pair.output.shape
+                outputs[idx, :output_rows, :output_cols] = pair.output.np
+                batch.output_shapes[idx] = pair.output.shape
+            else:
+                batch.output_shapes[idx] = 0
+            batch.riddle_idx[idx] = riddle_idx
+            batch.pair_idx[idx] = pair_idx
+            batch.is_test[idx] = is_test
+            batch.has_output[idx] = has_output
+        return batch
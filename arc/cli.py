@@ -1,20 +1,34 @@
 #!/usr/bin/env python3
 
 import webbrowser
-from importlib import import_module
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
+import click
 import typer
 from matplotlib import pyplot as plt
 
-from arc import TaskData, evaluate_and_report
+from arc import TaskData, evaluate_and_report, image, profiling, render, tracing
+from arc.eval import (
+    ASYNC_CONCURRENCY,
+    BATCH_SIZE,
+    evaluate_streaming,
+    merge_reports,
+    profile_slowest_riddles,
+)
 from arc.metrics import get_all_metrics, get_default_metrics
+from arc.report import Report
+from arc.runs import Run
 from arc.settings import settings
-from arc.utils import dataset
+from arc.solution_cache import SolutionCache
+from arc.utils import dataset, features
 
 app = typer.Typer()
 
+# per-riddle profiles and their merged profile in a run directory
+PROFILES_DIRNAME = "profiles"
+PROFILE_FN = "profile.pstats"
+
 
 @app.command()
 def main(name: str):
@@ -25,9 +39,24 @@ def main(name: str):
 def download_arc_dataset(
     output_dir: Optional[Path] = typer.Option(None),
     inventory_path: Optional[Path] = typer.Option(None),
+    concurrency: int = typer.Option(dataset.DOWNLOAD_CONCURRENCY),
 ):
     typer.echo(f"Downloading arc dataset to {output_dir=} from {inventory_path=}")
-    dataset.download_arc_dataset(output_dir=output_dir, inventory_path=inventory_path)
+    dataset.download_arc_dataset(
+        output_dir=output_dir, inventory_path=inventory_path, concurrency=concurrency
+    )
+
+
+@app.command()
+def pack_dataset(
+    subdir: List[str] = typer.Option(["training"]),
+    input_dir: Optional[Path] = typer.Option(None),
+    output_path: Optional[Path] = typer.Option(None),
+):
+    packed_path = dataset.pack_dataset(
+        subdirs=subdir, output_path=output_path, input_dir=input_dir
+    )
+    typer.echo(f"Packed dataset written to {packed_path}")
 
 
 @app.command()
@@ -35,12 +64,23 @@ def show(
     file: Optional[Path] = typer.Option(None),
     riddle_id: Optional[str] = typer.Option(None),
     random_id: bool = typer.Option(False),
+    show_all: bool = typer.Option(
+        False, "--all", help="Page through every riddle of --subdir"
+    ),
     colored: bool = typer.Option(True),
     solution: bool = typer.Option(False),
     subdir: str = typer.Option("training"),
     output_format: str = typer.Option("term", help="['term', 'arc-game', 'pyplot']"),
     output_path: Optional[Path] = typer.Option(None),
 ):
+    if show_all:
+        riddles = dataset.iter_riddles(subdirs=[subdir])
+        click.echo_via_pager(
+            render.iter_rendered_riddles(
+                riddles, colored=colored, with_test_outputs=solution
+            )
+        )
+        return
     if file:
         riddle = dataset.load_riddle_from_file(file)
     elif riddle_id:
@@ -68,33 +108,183 @@ def show(
         raise ValueError(f"Unknown output format: {output_format}")
 
 
+@app.command()
+def export_images(
+    subdir: str = typer.Option("training"),
+    output_dir: Path = typer.Option(...),
+    scale: int = typer.Option(image.DEFAULT_SCALE, help="Pixels per cell"),
+    solution: bool = typer.Option(False),
+    workers: Optional[int] = typer.Option(None, help="Defaults to the CPU count"),
+):
+    riddle_paths = [*dataset.get_riddle_paths(subdirs=[subdir]).values()]
+    typer.echo(f"Exporting {len(riddle_paths)} riddles to {output_dir}")
+    image.export_riddle_images(
+        riddle_paths,
+        output_dir,
+        scale=scale,
+        with_test_outputs=solution,
+        workers=workers,
+    )
+
+
 @app.command()
 def list(
     subdir=typer.Option("training"),
+    where: List[str] = typer.Option(
+        [], help="Feature conditions such as 'num_train>=3' or 'same_shape'"
+    ),
 ):
-    typer.echo("\n".join(dataset.get_riddle_ids(subdirs=[subdir])))
+    if where:
+        riddle_ids = features.query_riddle_ids(where, subdirs=[subdir])
+    else:
+        riddle_ids = dataset.get_riddle_ids(subdirs=[subdir])
+    typer.echo("\n".join(riddle_ids))
 
 
 @app.command()
 def eval(
-    agent_path: str,
+    agent_path: Optional[str] = typer.Argument(None, help="module:AgentClass"),
     topk: int = typer.Option(settings.default_topk),
     default_metrics: bool = typer.Option(True),
     all_metrics: bool = typer.Option(False),
     subdir: str = typer.Option("training"),
+    load_workers: int = typer.Option(1, help="Parallel riddle loaders"),
+    workers: int = typer.Option(1, help="Parallel agent processes"),
+    concurrency: int = typer.Option(
+        ASYNC_CONCURRENCY, help="Riddles an async agent solves at the same time"
+    ),
+    timeout: Optional[float] = typer.Option(
+        None, help="Seconds before the agent fails a riddle"
+    ),
+    memory_limit_mb: Optional[int] = typer.Option(
+        None, help="Memory limit of an isolated agent process"
+    ),
+    max_riddles_per_worker: Optional[int] = typer.Option(
+        None, help="Riddles before an isolated agent process is restarted"
+    ),
+    resume: Optional[str] = typer.Option(
+        None, help="Id of an interrupted run to continue"
+    ),
+    cache: bool = typer.Option(
+        False, help="Reuse solutions of a deterministic agent from earlier runs"
+    ),
+    batch_size: int = typer.Option(
+        BATCH_SIZE, help="Riddles per call of an agent's batch solver"
+    ),
+    stream: bool = typer.Option(
+        False, help="Keep only per-riddle scores, for very large evaluations"
+    ),
+    shard: Optional[str] = typer.Option(
+        None, help="Only evaluate shard 'i/n' (i from 0), see merge-reports"
+    ),
+    report_path: Optional[Path] = typer.Option(
+        None, help="Where to write the report, defaults to the run directory"
+    ),
+    trace: Optional[Path] = typer.Option(
+        settings.trace_path, help="Write a Chrome trace (for Perfetto) here"
+    ),
+    profile: bool = typer.Option(
+        False, help="Profile every riddle, see also the profile command"
+    ),
 ):
-    typer.echo(f"Evaluating {agent_path} on {subdir}")
-    agent_module_name, agent_classname = agent_path.split(":")
-    module = import_module(agent_module_name)
-    agent_class = getattr(module, agent_classname)
-    agent = agent_class()
-
-    riddles = dataset.get_riddles(subdirs=[subdir])
     task_data = TaskData(topk=topk)
+    if resume:
+        run = Run.load(resume)
+        agent_path = run.metadata["agent_path"]
+        subdir = run.metadata["subdirs"][0]
+        task_data = run.task_data
+        shard = run.metadata.get("shard")
+    elif not agent_path:
+        raise typer.BadParameter("Give an agent path or a run id to --resume")
+    try:
+        parsed_shard = dataset.parse_shard(shard) if shard else None
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    if not resume:
+        run = Run.create(agent_path, task_data, subdirs=[subdir], shard=shard)
+    shard_str = f" shard {shard}" if shard else ""
+    typer.echo(f"Evaluating {agent_path} on {subdir}{shard_str}, run id {run.run_id}")
+
+    riddles = dataset.iter_riddles(
+        subdirs=[subdir], workers=load_workers, shard=parsed_shard
+    )
     metrics = get_default_metrics() if default_metrics else []
     if all_metrics:
         metrics = get_all_metrics()
-    report = evaluate_and_report(agent, riddles, task_data, metrics)
+    if profile:
+        # a profiler sees everything that runs meanwhile in its thread
+        concurrency = 1
+    kwargs = dict(
+        workers=workers,
+        concurrency=concurrency,
+        timeout=timeout,
+        memory_limit_mb=memory_limit_mb,
+        max_riddles_per_worker=max_riddles_per_worker,
+        run=run,
+        solution_cache=SolutionCache() if cache else None,
+        batch_size=batch_size,
+    )
+    if profile:
+        profiling.start_profiling(run.run_dir / PROFILES_DIRNAME)
+    if trace:
+        tracing.start_tracing(trace)
+    try:
+        if stream:
+            report = evaluate_streaming(
+                agent_path, riddles, task_data, metrics, **kwargs
+            )
+            report_path = report_path or run.run_dir / "scores.json"
+            report.save_to_file(report_path)
+        else:
+            report = evaluate_and_report(
+                agent_path, riddles, task_data, metrics, **kwargs
+            )
+            report.shard = shard
+            report_path = report_path or run.run_dir / "report.jsonl"
+            report.save_compact(report_path)
+    finally:
+        if trace:
+            tracing.stop_tracing()
+            typer.echo(f"Wrote trace to {trace}")
+        if profile:
+            profiling.stop_profiling()
+    print(report.fmt_txt())
+    typer.echo(f"Wrote report to {report_path}")
+    if profile:
+        _print_profiles(run.run_dir / PROFILES_DIRNAME, run.run_dir / PROFILE_FN)
+
+
+@app.command()
+def profile(
+    run_id: str = typer.Argument(..., help="Id of a finished run"),
+    slowest: int = typer.Option(10, help="Number of slowest riddles to profile"),
+):
+    """Profile the slowest riddles of a run again, one at a time."""
+    run = Run.load(run_id)
+    profile_dir = run.run_dir / f"{PROFILES_DIRNAME}-slowest"
+    profile_slowest_riddles(run, slowest, profile_dir)
+    _print_profiles(profile_dir, run.run_dir / f"slowest-{PROFILE_FN}")
+
+
+def _print_profiles(profile_dir: Path, merged_path: Path):
+    stats = profiling.merge_profiles(profile_dir, merged_path)
+    if stats is None:
+        typer.echo("No riddles were profiled")
+        return
+    typer.echo(profiling.fmt_hot_functions(stats))
+    typer.echo(
+        f"Wrote per-riddle profiles to {profile_dir} and merged to {merged_path}"
+    )
+
+
+@app.command("merge-reports")
+def merge_reports_command(
+    report_paths: List[Path] = typer.Argument(..., help="Compact partial reports"),
+    output: Path = typer.Option(..., help="Path of the merged compact report"),
+):
+    """Combine the reports of evaluation shards, recomputing the metrics."""
+    report = merge_reports([Report.load_compact(path) for path in report_paths])
+    report.save_compact(output)
     print(report.fmt_txt())
 
 
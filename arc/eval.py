@@ -1,22 +1,69 @@
 #!/usr/bin/env python3
 
+import asyncio
+import collections
+import functools
+import itertools as itt
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent import futures
+from multiprocessing import connection
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Sized, Union
+
 import tqdm
 from loguru import logger
 
-from arc.agents import Agent
+from arc import profiling, tracing
+from arc.agents import (
+    Agent,
+    AsyncAgent,
+    RiddleWithHints,
+    load_agent,
+    load_agent_class,
+)
 from arc.hints import Hints
-from arc.interface import EvalResult, EvalResultList, Riddle, TaskData
-from arc.metrics import Metric, MetricResultDict
-from arc.report import Report
+from arc.interface import (
+    Board,
+    EvalResult,
+    EvalResultList,
+    HintsAccessed,
+    ResourceUsage,
+    Riddle,
+    RiddleSolution,
+    TaskData,
+)
+from arc.metrics import (
+    Metric,
+    MetricResultDict,
+    OnlineMetrics,
+    compute_test_scores,
+    get_metrics,
+)
+from arc.report import Report, ScoreReport, eval_result_riddle_id
+from arc.resources import ResourceMeter
+from arc.runs import Run
+from arc.solution_cache import SolutionCache
+from arc.utils import dataset, processes
 
+# riddles an AsyncAgent works on at the same time, unless given otherwise
+ASYNC_CONCURRENCY = 8
 
-def evaluate_agent_on_riddle(
-    agent: Agent, riddle: Riddle, task_data: TaskData
+# riddles per call of Agent.solve_riddles_batch, unless given otherwise
+BATCH_SIZE = 32
+
+
+def _make_eval_result(
+    riddle: Riddle,
+    task_data: TaskData,
+    solution: RiddleSolution,
+    hints: Hints,
+    resource_usage: Optional[ResourceUsage] = None,
 ) -> EvalResult:
-    hints = Hints(riddle=riddle)
-    solution = agent.solve_riddle(
-        task_data=task_data, hints=hints, train=riddle.train, test=riddle.test_inputs
-    )
     if (num_tests := len(riddle.test)) != (num_solutions := len(solution)):
         raise ValueError(
             f"Riddle has {num_tests} tests, but got {num_solutions} solutions."
@@ -29,21 +76,736 @@ def evaluate_agent_on_riddle(
             f"but got {solution_ks}"
         )
 
+    if all(isinstance(board, Board) for topk in solution for board in topk):
+        # the solution was checked above, skip re-validating the whole riddle
+        return EvalResult.construct_fast(
+            riddle=riddle,
+            task_data=task_data,
+            solution=solution,
+            hints_accessed=hints.hints_accessed,
+            resource_usage=resource_usage,
+        )
     return EvalResult(
         riddle=riddle,
         task_data=task_data,
         solution=solution,
         hints_accessed=hints.hints_accessed,
+        resource_usage=resource_usage,
+    )
+
+
+def _profile_name(riddle: Riddle) -> str:
+    return riddle.riddle_id or riddle.content_hash
+
+
+def evaluate_agent_on_riddle(
+    agent: Agent, riddle: Riddle, task_data: TaskData
+) -> EvalResult:
+    hints = Hints(riddle=riddle)
+    with ResourceMeter() as meter, tracing.span(
+        "solve_riddle", "eval", riddle_id=riddle.riddle_id
+    ), profiling.profile(_profile_name(riddle)):
+        solution = agent.solve_riddle(
+            task_data=task_data,
+            hints=hints,
+            train=riddle.train,
+            test=riddle.test_inputs,
+        )
+    return _make_eval_result(riddle, task_data, solution, hints, meter.usage)
+
+
+def evaluate_agent_on_batch(
+    agent: Agent, riddles: list[Riddle], task_data: TaskData
+) -> list[EvalResult]:
+    """Evaluate an agent on riddles with one call of its batch solver."""
+    batch = [
+        RiddleWithHints(
+            train=riddle.train, test=riddle.test_inputs, hints=Hints(riddle)
+        )
+        for riddle in riddles
+    ]
+    with ResourceMeter() as meter, tracing.span(
+        "solve_riddles_batch", "eval", num_riddles=len(batch)
+    ), profiling.profile(f"batch-{_profile_name(riddles[0])}"):
+        solutions = agent.solve_riddles_batch(task_data, batch)
+    if (num_riddles := len(riddles)) != (num_solutions := len(solutions)):
+        raise ValueError(
+            f"Batch has {num_riddles} riddles, but got {num_solutions} solutions."
+        )
+    resource_usage = meter.share(num_riddles)
+    return [
+        _make_eval_result(riddle, task_data, solution, item.hints, resource_usage)
+        for riddle, item, solution in zip(riddles, batch, solutions)
+    ]
+
+
+def _evaluate_batched(
+    agent: Agent,
+    riddles: Iterable[Riddle],
+    task_data: TaskData,
+    batch_size: int,
+    on_result: Callable[[EvalResult], None],
+    keep_results: bool = True,
+) -> list[EvalResult]:
+    # riddles are bucketed by the shapes of their test inputs, so the test
+    # inputs of a batch can be stacked; a bucket is solved once it is full
+    buckets: dict[tuple, list[tuple[int, Riddle]]] = collections.defaultdict(list)
+    eval_results: dict[int, EvalResult] = {}
+    progress = tqdm.tqdm(total=len(riddles) if isinstance(riddles, Sized) else None)
+
+    def _solve_bucket(key: tuple):
+        riddle_idxs, bucket = zip(*buckets.pop(key))
+        for idx, eval_result in zip(
+            riddle_idxs, evaluate_agent_on_batch(agent, list(bucket), task_data)
+        ):
+            if keep_results:
+                eval_results[idx] = eval_result
+            on_result(eval_result)
+        progress.update(len(bucket))
+
+    with progress:
+        for idx, riddle in enumerate(riddles):
+            key = tuple(board.shape for board in riddle.test_inputs)
+            buckets[key].append((idx, riddle))
+            if len(buckets[key]) >= batch_size:
+                _solve_bucket(key)
+        for key in list(buckets):
+            _solve_bucket(key)
+    return [eval_results[idx] for idx in range(len(eval_results))]
+
+
+async def evaluate_async_agent_on_riddle(
+    agent: AsyncAgent,
+    riddle: Riddle,
+    task_data: TaskData,
+    timeout: Optional[float] = None,
+) -> EvalResult:
+    """
+    Evaluate an AsyncAgent on one riddle.
+
+    A riddle that times out or raises is returned as a failed result (see
+    ``EvalResult.error``), so one slow or broken request does not abort a run.
+    """
+    hints = Hints(riddle=riddle)
+    # riddles run concurrently, only their wall time can be told apart
+    meter = ResourceMeter(exclusive=False)
+    try:
+        with meter, tracing.span(
+            "solve_riddle", "eval", riddle_id=riddle.riddle_id
+        ), profiling.profile(_profile_name(riddle)):
+            solution = await asyncio.wait_for(
+                agent.solve_riddle(
+                    task_data=task_data,
+                    hints=hints,
+                    train=riddle.train,
+                    test=riddle.test_inputs,
+                ),
+                timeout=timeout,
+            )
+        return _make_eval_result(riddle, task_data, solution, hints, meter.usage)
+    except asyncio.TimeoutError:
+        error = f"Timed out after {timeout}s"
+    except Exception:
+        error = traceback.format_exc()
+    logger.warning(f"Agent failed on riddle {riddle.riddle_id}:\n{error}")
+    return EvalResult.from_error(
+        riddle=riddle,
+        task_data=task_data,
+        error=error,
+        hints_accessed=hints.hints_accessed,
+        resource_usage=meter.usage,
+    )
+
+
+async def evaluate_async_agent_on_riddles(
+    agent: AsyncAgent,
+    riddles: Iterable[Riddle],
+    task_data: TaskData,
+    concurrency: int = ASYNC_CONCURRENCY,
+    timeout: Optional[float] = None,
+    on_result: Optional[Callable[[EvalResult], None]] = None,
+    show_progress: bool = True,
+    keep_results: bool = True,
+) -> list[EvalResult]:
+    """
+    Evaluate an AsyncAgent on riddles with at most ``concurrency`` in flight.
+
+    Riddles are pulled from ``riddles`` only when a slot is free, results keep
+    the order of the riddles.
+
+    :param agent: The agent.
+    :param riddles: Riddles to evaluate on.
+    :param task_data: Task description given to the agent.
+    :param concurrency: Maximum number of riddles solved at the same time.
+    :param timeout: Seconds after which a riddle counts as failed.
+    :param on_result: Called with every result as soon as it is done.
+    :param show_progress: Whether to show a progress bar.
+    :param keep_results: Whether to return the results, else only
+        ``on_result`` sees them.
+    :return: One EvalResult per riddle, or none.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    progress = tqdm.tqdm(
+        total=len(riddles) if isinstance(riddles, Sized) else None,
+        disable=not show_progress,
+    )
+
+    async def _evaluate(riddle: Riddle) -> EvalResult:
+        try:
+            eval_result = await evaluate_async_agent_on_riddle(
+                agent, riddle, task_data, timeout=timeout
+            )
+            if on_result is not None:
+                on_result(eval_result)
+            return eval_result
+        finally:
+            semaphore.release()
+            progress.update()
+
+    tasks = []
+    # the event loop only holds weak references to tasks
+    running = set()
+    with progress:
+        for riddle in riddles:
+            await semaphore.acquire()
+            task = asyncio.create_task(_evaluate(riddle))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            if keep_results:
+                tasks.append(task)
+        await asyncio.gather(*running)
+        return [task.result() for task in tasks]
+
+
+# chunks per worker when splitting riddles, trades overhead against balance
+EVAL_CHUNKS_PER_WORKER = 4
+
+# chunks (or riddles) per worker that are submitted ahead of the results
+EVAL_PREFETCH_FACTOR = 2
+
+# seconds a supervised worker gets to exit before it is killed
+WORKER_STOP_TIMEOUT = 5.0
+
+# what a worker sends back for a riddle: solution, hints accessed, error, usage
+_Outcome = tuple[
+    Optional[RiddleSolution], HintsAccessed, Optional[str], Optional[ResourceUsage]
+]
+
+# agent of the current worker process, see _init_worker
+_worker_agent: Optional[Union[Agent, AsyncAgent]] = None
+
+
+def _init_worker(
+    agent: Union[Agent, AsyncAgent, str],
+    parent_settings: dict,
+    trace_path: Optional[Path] = None,
+    profile_dir: Optional[Path] = None,
+):
+    global _worker_agent
+    processes.init_worker(parent_settings, trace_path)
+    profiling.init_worker(profile_dir)
+    _worker_agent = load_agent(agent) if isinstance(agent, str) else agent
+
+
+def _to_outcome(eval_result: EvalResult) -> _Outcome:
+    # only the solution is sent back, the riddle is already in the parent
+    return (
+        eval_result.solution,
+        eval_result.hints_accessed,
+        eval_result.error,
+        eval_result.resource_usage,
+    )
+
+
+def _solve_in_worker(riddle: Riddle, task_data: TaskData) -> _Outcome:
+    try:
+        if isinstance(_worker_agent, AsyncAgent):
+            eval_result = asyncio.run(
+                evaluate_async_agent_on_riddle(_worker_agent, riddle, task_data)
+            )
+        else:
+            eval_result = evaluate_agent_on_riddle(_worker_agent, riddle, task_data)
+    except Exception:
+        return None, HintsAccessed(), traceback.format_exc(), None
+    return _to_outcome(eval_result)
+
+
+def _outcome_to_eval_result(
+    riddle: Riddle,
+    task_data: TaskData,
+    outcome: _Outcome,
+) -> EvalResult:
+    solution, hints_accessed, error, resource_usage = outcome
+    if error is not None:
+        logger.warning(f"Agent failed on riddle {riddle.riddle_id}:\n{error}")
+        return EvalResult.from_error(
+            riddle=riddle,
+            task_data=task_data,
+            error=error,
+            hints_accessed=hints_accessed,
+            resource_usage=resource_usage,
+        )
+    return EvalResult.construct_fast(
+        riddle=riddle,
+        task_data=task_data,
+        solution=solution,
+        hints_accessed=hints_accessed,
+        resource_usage=resource_usage,
+    )
+
+
+def _map_prefetched(
+    executor: futures.Executor, fn: Callable, items: Iterable, max_pending: int
+) -> Iterator[tuple]:
+    """
+    Like ``executor.map``, yielding ``(item, result)`` pairs in order, but
+    items are only pulled from the iterable while fewer than ``max_pending``
+    results are outstanding, so work starts with the first item.
+    """
+    items = iter(items)
+    pending = collections.deque()
+
+    def _submit():
+        for item in itt.islice(items, 1):
+            pending.append((item, executor.submit(fn, item)))
+
+    for _ in range(max_pending):
+        _submit()
+    while pending:
+        item, future = pending.popleft()
+        result = future.result()
+        _submit()
+        yield item, result
+
+
+def _solve_chunk_in_worker(
+    riddles: list[Riddle],
+    task_data: TaskData,
+    concurrency: int,
+    timeout: Optional[float],
+) -> list[_Outcome]:
+    if isinstance(_worker_agent, AsyncAgent):
+        eval_results = asyncio.run(
+            evaluate_async_agent_on_riddles(
+                _worker_agent,
+                riddles,
+                task_data,
+                concurrency=concurrency,
+                timeout=timeout,
+                show_progress=False,
+            )
+        )
+        return [_to_outcome(eval_result) for eval_result in eval_results]
+    return [_solve_in_worker(riddle, task_data) for riddle in riddles]
+
+
+def _evaluate_in_processes(
+    agent: Union[Agent, AsyncAgent, str],
+    riddles: Iterable[Riddle],
+    task_data: TaskData,
+    is_async: bool,
+    workers: int,
+    chunksize: Optional[int],
+    concurrency: int,
+    timeout: Optional[float],
+    on_result: Callable[[EvalResult], None],
+    keep_results: bool = True,
+) -> list[EvalResult]:
+    num_riddles = len(riddles) if isinstance(riddles, Sized) else None
+    # the workers of an AsyncAgent share the concurrency, their chunks must be
+    # large enough to keep it busy
+    worker_concurrency = max(1, concurrency // workers)
+    if chunksize is None:
+        # without a length, send riddles one by one as they are loaded
+        chunksize = max(1, (num_riddles or 0) // (workers * EVAL_CHUNKS_PER_WORKER))
+        if is_async:
+            chunksize = max(chunksize, worker_concurrency)
+    riddles = iter(riddles)
+    chunks = iter(lambda: list(itt.islice(riddles, chunksize)), [])
+    solve = functools.partial(
+        _solve_chunk_in_worker,
+        task_data=task_data,
+        concurrency=worker_concurrency,
+        timeout=timeout,
     )
+    eval_results = []
+    with futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=processes.get_context(),
+        initializer=_init_worker,
+        initargs=(agent, *processes.worker_initargs(), profiling.profile_dir()),
+    ) as executor, tqdm.tqdm(total=num_riddles) as progress:
+        for chunk, outcomes in _map_prefetched(
+            executor, solve, chunks, max_pending=workers * EVAL_PREFETCH_FACTOR
+        ):
+            for riddle, outcome in zip(chunk, outcomes):
+                eval_result = _outcome_to_eval_result(riddle, task_data, outcome)
+                if keep_results:
+                    eval_results.append(eval_result)
+                on_result(eval_result)
+            progress.update(len(chunk))
+    return eval_results
+
+
+def _supervised_worker_main(
+    conn: connection.Connection,
+    agent: Union[Agent, AsyncAgent, str],
+    memory_limit_mb: Optional[int],
+    parent_settings: dict,
+    trace_path: Optional[Path],
+    profile_dir: Optional[Path],
+):
+    if memory_limit_mb is not None:
+        import resource
+
+        limit = memory_limit_mb * 2**20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    _init_worker(agent, parent_settings, trace_path, profile_dir)
+    while (task := conn.recv()) is not None:
+        conn.send(_solve_in_worker(*task))
+
+
+class SupervisedWorker:
+    """
+    A subprocess that solves one riddle at a time under a time and memory limit.
+
+    A riddle that exceeds ``timeout`` gets the process killed, a crash (e.g.
+    the OOM killer) is detected from the closed pipe. In both cases the riddle
+    fails and the next one starts a fresh process. The process is also
+    replaced after ``max_riddles`` riddles to contain leaks of the agent.
+    """
+
+    def __init__(
+        self,
+        agent: Union[Agent, AsyncAgent, str],
+        timeout: Optional[float] = None,
+        memory_limit_mb: Optional[int] = None,
+        max_riddles: Optional[int] = None,
+    ):
+        self.agent = agent
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_riddles = max_riddles
+        self._process: Optional[multiprocessing.Process] = None
+        self._conn: Optional[connection.Connection] = None
+        self._num_riddles = 0
+
+    def _start(self):
+        context = processes.get_context()
+        conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_supervised_worker_main,
+            args=(
+                child_conn,
+                self.agent,
+                self.memory_limit_mb,
+                *processes.worker_initargs(),
+                profiling.profile_dir(),
+            ),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self._process, self._conn = process, conn
+        self._num_riddles = 0
+
+    def _kill(self):
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process = self._conn = None
+
+    def stop(self):
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+            self._process.join(timeout=WORKER_STOP_TIMEOUT)
+        except (BrokenPipeError, OSError):
+            pass
+        self._kill()
 
+    def solve(self, riddle: Riddle, task_data: TaskData) -> _Outcome:
+        if self._process is None:
+            self._start()
+        self._num_riddles += 1
+        try:
+            self._conn.send((riddle, task_data))
+            if not self._conn.poll(self.timeout):
+                self._kill()
+                return None, HintsAccessed(), f"Timed out after {self.timeout}s", None
+            outcome = self._conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            self._process.join(timeout=WORKER_STOP_TIMEOUT)
+            exitcode = self._process.exitcode
+            self._kill()
+            error = f"Worker died with exit code {exitcode}"
+            return None, HintsAccessed(), error, None
+        if self.max_riddles is not None and self._num_riddles >= self.max_riddles:
+            self.stop()
+        return outcome
 
-def evaluate_agent_on_riddles(agent: Agent, riddles: list[Riddle], task_data: TaskData):
-    logger.info(f"Evaluating agent on {len(riddles)} riddles.")
-    eval_results = [
-        evaluate_agent_on_riddle(agent, riddle, task_data)
-        for riddle in tqdm.tqdm(riddles)
+
+def _evaluate_supervised(
+    agent: Union[Agent, AsyncAgent, str],
+    riddles: Iterable[Riddle],
+    task_data: TaskData,
+    workers: int,
+    timeout: Optional[float],
+    memory_limit_mb: Optional[int],
+    max_riddles_per_worker: Optional[int],
+    on_result: Callable[[EvalResult], None],
+    keep_results: bool = True,
+) -> list[EvalResult]:
+    idle_workers = queue.SimpleQueue()
+    supervised_workers = [
+        SupervisedWorker(
+            agent,
+            timeout=timeout,
+            memory_limit_mb=memory_limit_mb,
+            max_riddles=max_riddles_per_worker,
+        )
+        for _ in range(workers)
     ]
-    eval_result_list = EvalResultList(eval_results=eval_results, task_data=task_data)
+    for worker in supervised_workers:
+        idle_workers.put(worker)
+
+    def _evaluate(riddle: Riddle) -> EvalResult:
+        worker = idle_workers.get()
+        try:
+            outcome = worker.solve(riddle, task_data)
+        finally:
+            idle_workers.put(worker)
+        eval_result = _outcome_to_eval_result(riddle, task_data, outcome)
+        on_result(eval_result)
+        return eval_result
+
+    num_riddles = len(riddles) if isinstance(riddles, Sized) else None
+    try:
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            eval_results = _map_prefetched(
+                executor, _evaluate, riddles, max_pending=workers * EVAL_PREFETCH_FACTOR
+            )
+            return [
+                eval_result
+                for _, eval_result in tqdm.tqdm(eval_results, total=num_riddles)
+                if keep_results
+            ]
+    finally:
+        for worker in supervised_workers:
+            worker.stop()
+
+
+def _ignore_result(eval_result: EvalResult):
+    pass
+
+
+def _is_supervised(
+    is_async: bool,
+    timeout: Optional[float],
+    memory_limit_mb: Optional[int],
+    max_riddles_per_worker: Optional[int],
+) -> bool:
+    return (
+        memory_limit_mb is not None
+        or max_riddles_per_worker is not None
+        or (timeout is not None and not is_async)
+    )
+
+
+def _evaluate_with_cache(
+    agent: Union[Agent, AsyncAgent],
+    riddles: Iterable[Riddle],
+    task_data: TaskData,
+    solution_cache: SolutionCache,
+    on_result: Callable[[EvalResult], None],
+    keep_results: bool = True,
+    **kwargs,
+) -> list[EvalResult]:
+    fingerprint = agent.fingerprint()
+    # results in the order of the riddles, None for those the agent solves
+    results: list[Optional[EvalResult]] = []
+    num_riddles = num_cached = 0
+
+    def _uncached_riddles() -> Iterator[Riddle]:
+        nonlocal num_riddles, num_cached
+        for riddle in riddles:
+            num_riddles += 1
+            key = solution_cache.key(fingerprint, riddle, task_data)
+            if (cached := solution_cache.get(key)) is None:
+                if keep_results:
+                    results.append(None)
+                yield riddle
+                continue
+            num_cached += 1
+            solution, hints_accessed = cached
+            eval_result = EvalResult.construct_fast(
+                riddle=riddle,
+                task_data=task_data,
+                solution=solution,
+                hints_accessed=hints_accessed,
+            )
+            if keep_results:
+                results.append(eval_result)
+            on_result(eval_result)
+
+    def _store(eval_result: EvalResult):
+        if eval_result.error is None:
+            key = solution_cache.key(fingerprint, eval_result.riddle, task_data)
+            solution_cache.put(key, eval_result.solution, eval_result.hints_accessed)
+        on_result(eval_result)
+
+    new_results = iter(
+        evaluate_agent_on_riddles(
+            agent,
+            _uncached_riddles(),
+            task_data,
+            on_result=_store,
+            keep_results=keep_results,
+            **kwargs,
+        ).eval_results
+    )
+    logger.info(f"Found cached solutions for {num_cached} of {num_riddles} riddles.")
+    return [next(new_results) if result is None else result for result in results]
+
+
+def evaluate_agent_on_riddles(
+    agent: Union[Agent, AsyncAgent, str],
+    riddles: Iterable[Riddle],
+    task_data: TaskData,
+    workers: int = 1,
+    chunksize: Optional[int] = None,
+    concurrency: int = ASYNC_CONCURRENCY,
+    timeout: Optional[float] = None,
+    memory_limit_mb: Optional[int] = None,
+    max_riddles_per_worker: Optional[int] = None,
+    on_result: Optional[Callable[[EvalResult], None]] = None,
+    solution_cache: Optional[SolutionCache] = None,
+    batch_size: int = BATCH_SIZE,
+    keep_results: bool = True,
+):
+    """
+    Evaluate an agent on riddles, optionally in parallel or isolated.
+
+    :param agent: Agent or AsyncAgent, or its ``module:ClassName`` path.
+    :param riddles: Riddles to evaluate on, results keep their order.
+    :param task_data: Task description given to the agent.
+    :param workers: Number of processes. With more than one, every worker
+        builds its own agent (from the path, or a copy of the instance) and
+        an exception on a riddle is recorded in ``EvalResult.error`` instead
+        of aborting the run.
+    :param chunksize: Riddles sent to a worker at once, defaults to splitting
+        the riddles into ``EVAL_CHUNKS_PER_WORKER`` chunks per worker, or to
+        single riddles if ``riddles`` has no length.
+    :param concurrency: Riddles an AsyncAgent solves at the same time, split
+        evenly among the workers.
+    :param timeout: Seconds after which a riddle fails. AsyncAgents are
+        cancelled, other agents run in SupervisedWorkers that are killed.
+    :param memory_limit_mb: Address space limit of a SupervisedWorker.
+    :param max_riddles_per_worker: Riddles after which a SupervisedWorker is
+        replaced by a fresh process.
+    :param on_result: Called with every result as soon as it is done, e.g. to
+        checkpoint it. Called from several threads with SupervisedWorkers.
+    :param solution_cache: Reuse the solutions of riddles this agent (by its
+        fingerprint) already solved with the same TaskData, and store new ones.
+        An agent given by its path is then built once, in this process.
+    :param batch_size: Riddles per call of ``Agent.solve_riddles_batch`` for
+        agents that implement it, when evaluating in this process.
+    :param keep_results: Whether to return the results. Without, only
+        ``on_result`` sees them and memory use does not grow with the riddles.
+    :return: The EvalResultList, empty unless ``keep_results``.
+    """
+    if isinstance(riddles, Sized):
+        logger.info(f"Evaluating agent on {len(riddles)} riddles.")
+    else:
+        logger.info("Evaluating agent on streamed riddles.")
+    if on_result is None:
+        on_result = _ignore_result
+    if solution_cache is not None:
+        if isinstance(agent, str):
+            # the fingerprint needs an instance, which workers then copy
+            agent = load_agent(agent)
+        eval_results = _evaluate_with_cache(
+            agent,
+            riddles,
+            task_data,
+            solution_cache,
+            on_result=on_result,
+            workers=workers,
+            chunksize=chunksize,
+            concurrency=concurrency,
+            timeout=timeout,
+            memory_limit_mb=memory_limit_mb,
+            max_riddles_per_worker=max_riddles_per_worker,
+            batch_size=batch_size,
+            keep_results=keep_results,
+        )
+        return EvalResultList.construct_fast(
+            eval_results=eval_results, task_data=task_data
+        )
+    is_async = issubclass(
+        load_agent_class(agent) if isinstance(agent, str) else type(agent),
+        AsyncAgent,
+    )
+    if _is_supervised(is_async, timeout, memory_limit_mb, max_riddles_per_worker):
+        eval_results = _evaluate_supervised(
+            agent,
+            riddles,
+            task_data,
+            workers=workers,
+            timeout=timeout,
+            memory_limit_mb=memory_limit_mb,
+            max_riddles_per_worker=max_riddles_per_worker,
+            on_result=on_result,
+            keep_results=keep_results,
+        )
+    elif workers > 1:
+        eval_results = _evaluate_in_processes(
+            agent,
+            riddles,
+            task_data,
+            is_async=is_async,
+            workers=workers,
+            chunksize=chunksize,
+            concurrency=concurrency,
+            timeout=timeout,
+            on_result=on_result,
+            keep_results=keep_results,
+        )
+    else:
+        if isinstance(agent, str):
+            agent = load_agent(agent)
+        if is_async:
+            eval_results = asyncio.run(
+                evaluate_async_agent_on_riddles(
+                    agent,
+                    riddles,
+                    task_data,
+                    concurrency=concurrency,
+                    timeout=timeout,
+                    on_result=on_result,
+                    keep_results=keep_results,
+                )
+            )
+        elif agent.has_batch_solver():
+            eval_results = _evaluate_batched(
+                agent,
+                riddles,
+                task_data,
+                batch_size=batch_size,
+                on_result=on_result,
+                keep_results=keep_results,
+            )
+        else:
+            eval_results = []
+            for riddle in tqdm.tqdm(riddles):
+                eval_result = evaluate_agent_on_riddle(agent, riddle, task_data)
+                if keep_results:
+                    eval_results.append(eval_result)
+                on_result(eval_result)
+    eval_result_list = EvalResultList.construct_fast(
+        eval_results=eval_results, task_data=task_data
+    )
     return eval_result_list
 
 
@@ -52,25 +814,217 @@ def apply_metrics(
 ) -> MetricResultDict:
     eval_results = eval_result_list.eval_results
     metric_results = MetricResultDict()
+    # one pass over the boards for all metrics the engine covers
+    test_scores = compute_test_scores(metrics, eval_results)
     for metric in metrics:
         logger.info(f"Applying metric {metric.name}.")
-        compute_results = [
-            metric.compute(eval_result) for eval_result in tqdm.tqdm(eval_results)
-        ]
+        compute_results = metric.compute_all(eval_results, test_scores)
         metric_result = metric.aggregate(eval_result_list, compute_results)
         metric_results[metric.name] = metric_result
     return metric_results
 
 
+def profile_slowest_riddles(
+    run: Run, num: int, profile_dir: os.PathLike
+) -> list[EvalResult]:
+    """
+    Evaluate the ``num`` slowest riddles of a run again, under the profiler.
+
+    Riddles are ranked by their recorded wall time and solved one at a time in
+    this process; the results of the run are left as they are.
+    """
+    timed_results = [
+        eval_result
+        for eval_result in run.iter_eval_results()
+        if eval_result.resource_usage is not None
+    ]
+    slowest = sorted(timed_results, key=lambda r: -r.resource_usage.wall_time)[:num]
+    logger.info(f"Profiling the {len(slowest)} slowest riddles of run {run.run_id}")
+    profiling.start_profiling(profile_dir)
+    try:
+        return evaluate_agent_on_riddles(
+            load_agent(run.metadata["agent_path"]),
+            [eval_result.riddle for eval_result in slowest],
+            run.task_data,
+            concurrency=1,
+        ).eval_results
+    finally:
+        profiling.stop_profiling()
+
+
+def merge_reports(reports: list[Report]) -> Report:
+    """
+    Combine the partial reports of shards into the report of a single run.
+
+    Results are ordered by riddle id, like a run over the whole dataset, and
+    the metrics are recomputed from them, so no agent is run again.
+    """
+    if not reports:
+        raise ValueError("No reports to merge")
+    first = reports[0]
+    task_data = first.eval_results.task_data
+    metric_names = list(first.metric_results)
+    for report in reports[1:]:
+        if report.eval_results.task_data != task_data:
+            raise ValueError(
+                f"Cannot merge reports for {task_data} and "
+                f"{report.eval_results.task_data}"
+            )
+        if list(report.metric_results) != metric_names:
+            raise ValueError(
+                f"Cannot merge reports with metrics {metric_names} and "
+                f"{list(report.metric_results)}"
+            )
+    shards = [report.shard for report in reports]
+    if all(shard is not None for shard in shards):
+        parsed = [dataset.parse_shard(shard) for shard in shards]
+        shard_count = parsed[0][1]
+        if any(count != shard_count for _, count in parsed):
+            raise ValueError(f"Reports of different shardings: {shards}")
+        missing = set(range(shard_count)) - {idx for idx, _ in parsed}
+        if missing:
+            logger.warning(f"Missing shards {sorted(missing)} of {shard_count}")
+
+    eval_results = {}
+    for report in reports:
+        for eval_result in report.eval_results.eval_results:
+            riddle_id = eval_result_riddle_id(eval_result)
+            if riddle_id in eval_results:
+                raise ValueError(f"Riddle {riddle_id} is in several reports")
+            eval_results[riddle_id] = eval_result
+    eval_result_list = EvalResultList.construct_fast(
+        task_data=task_data,
+        eval_results=[eval_results[riddle_id] for riddle_id in sorted(eval_results)],
+    )
+    metric_results = apply_metrics(eval_result_list, get_metrics(metric_names))
+    return Report(
+        eval_results=eval_result_list,
+        metric_results=metric_results,
+        tags=first.tags,
+        subdirs=first.subdirs,
+        comment=first.comment,
+    )
+
+
 def evaluate_and_report(
-    agent: Agent,
-    riddles: list[Riddle],
+    agent: Union[Agent, AsyncAgent, str],
+    riddles: Iterable[Riddle],
     task_data: TaskData,
     metrics: list[Metric] = None,
+    workers: int = 1,
+    concurrency: int = ASYNC_CONCURRENCY,
+    timeout: Optional[float] = None,
+    memory_limit_mb: Optional[int] = None,
+    max_riddles_per_worker: Optional[int] = None,
+    run: Optional[Run] = None,
+    solution_cache: Optional[SolutionCache] = None,
+    batch_size: int = BATCH_SIZE,
 ):
-    eval_results = evaluate_agent_on_riddles(agent, riddles, task_data)
+    previous_results = []
+    on_result = None
+    if run is not None:
+        if run.task_data != task_data:
+            raise ValueError(
+                f"Run {run.run_id} was started with {run.task_data}, not {task_data}"
+            )
+        previous_results = run.load_eval_results()
+        riddles = run.remaining(riddles)
+        on_result = run.append
+    start_time = time.perf_counter()
+    eval_results = evaluate_agent_on_riddles(
+        agent,
+        riddles,
+        task_data,
+        workers=workers,
+        concurrency=concurrency,
+        timeout=timeout,
+        memory_limit_mb=memory_limit_mb,
+        max_riddles_per_worker=max_riddles_per_worker,
+        on_result=on_result,
+        solution_cache=solution_cache,
+        batch_size=batch_size,
+    )
+    elapsed = time.perf_counter() - start_time
+    riddles_per_second = len(eval_results.eval_results) / elapsed if elapsed else None
+    if previous_results:
+        eval_results = EvalResultList.construct_fast(
+            task_data=task_data,
+            eval_results=[*previous_results, *eval_results.eval_results],
+        )
     if metrics is None:
         metrics = []
     metric_results = apply_metrics(eval_results, metrics)
     logger.info("Constructing report.")
-    return Report(eval_results=eval_results, metric_results=metric_results)
+    return Report(
+        eval_results=eval_results,
+        metric_results=metric_results,
+        riddles_per_second=riddles_per_second,
+    )
+
+
+def evaluate_streaming(
+    agent: Union[Agent, AsyncAgent, str],
+    riddles: Iterable[Riddle],
+    task_data: TaskData,
+    metrics: list[Metric] = None,
+    workers: int = 1,
+    concurrency: int = ASYNC_CONCURRENCY,
+    timeout: Optional[float] = None,
+    memory_limit_mb: Optional[int] = None,
+    max_riddles_per_worker: Optional[int] = None,
+    run: Optional[Run] = None,
+    solution_cache: Optional[SolutionCache] = None,
+    batch_size: int = BATCH_SIZE,
+) -> ScoreReport:
+    """
+    Evaluate an agent like ``evaluate_and_report`` in bounded memory.
+
+    Every result is scored (see ``OnlineMetrics``) and checkpointed as soon as
+    it is done and then dropped, so only the per-riddle scores are kept. Scores
+    are in the order the riddles finish. The remaining arguments are those of
+    ``evaluate_agent_on_riddles``.
+    """
+    online_metrics = OnlineMetrics(metrics or [])
+    report = ScoreReport(task_data=task_data)
+    # results arrive from several threads with SupervisedWorkers
+    lock = threading.Lock()
+
+    def _record(eval_result: EvalResult):
+        with lock:
+            online_metrics.update(eval_result)
+            report.riddle_ids.append(eval_result.riddle.riddle_id)
+            report.hints_accessed.update(eval_result.hints_accessed)
+            if eval_result.error is not None:
+                report.failed_riddle_ids.append(eval_result.riddle.riddle_id)
+
+    def _checkpoint_and_record(eval_result: EvalResult):
+        run.append(eval_result)
+        _record(eval_result)
+
+    on_result = _record
+    if run is not None:
+        if run.task_data != task_data:
+            raise ValueError(
+                f"Run {run.run_id} was started with {run.task_data}, not {task_data}"
+            )
+        for eval_result in run.iter_eval_results():
+            _record(eval_result)
+        riddles = run.remaining(riddles)
+        on_result = _checkpoint_and_record
+
+    evaluate_agent_on_riddles(
+        agent,
+        riddles,
+        task_data,
+        workers=workers,
+        concurrency=concurrency,
+        timeout=timeout,
+        memory_limit_mb=memory_limit_mb,
+        max_riddles_per_worker=max_riddles_per_worker,
+        on_result=on_result,
+        solution_cache=solution_cache,
+        batch_size=batch_size,
+        keep_results=False,
+    )
+    report.metric_results = online_metrics.metric_results()
+    return report
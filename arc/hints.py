@@ -44,7 +44,7 @@ class BoardHints:
     @property
     @record_hint_access
     def num_colors(self):
-        return len(set(self._test_output.data_flat))
+        return self._test_output.num_unique_values
 
 
 class Hints:
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+"""
+Image export of boards and riddles without matplotlib.
+
+Boards are mapped to RGB through the ARC palette with a single NumPy lookup,
+upscaled with ``np.repeat`` and laid out on one canvas per riddle: one row per
+pair with the input on the left and the output on the right, train pairs
+first. The canvas is written as a PNG by a small encoder built on ``zlib``, so
+exporting thousands of riddles neither creates figures nor leaks their memory.
+"""
+
+import functools
+import os
+import struct
+import zlib
+from concurrent import futures
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import tqdm
+
+from arc.interface import Riddle
+from arc.utils import dataset, processes
+
+# colors of the ARC app, see arc/augmentations/vis_helpers.py
+ARC_COLORS = [
+    "#000000",
+    "#0074D9",
+    "#FF4136",
+    "#2ECC40",
+    "#FFDC00",
+    "#AAAAAA",
+    "#F012BE",
+    "#FF851B",
+    "#7FDBFF",
+    "#870C25",
+]
+BACKGROUND_COLOR = "#404040"
+DEFAULT_SCALE = 16
+DEFAULT_GAP = 1
+
+
+def _hex_to_rgb(color: str) -> tuple[int, int, int]:
+    return tuple(int(color[i : i + 2], 16) for i in (1, 3, 5))
+
+
+@functools.lru_cache(maxsize=None)
+def palette() -> np.ndarray:
+    """``(256, 3)`` RGB lookup table; values outside 0..9 are drawn white."""
+    table = np.full((256, 3), 255, dtype=np.uint8)
+    table[: len(ARC_COLORS)] = [_hex_to_rgb(color) for color in ARC_COLORS]
+    table.flags.writeable = False
+    return table
+
+
+def board_to_rgb(board: np.ndarray, scale: int = DEFAULT_SCALE) -> np.ndarray:
+    """Map a ``(rows, cols)`` board to a ``(rows*scale, cols*scale, 3)`` image."""
+    rgb = palette()[board]
+    return np.repeat(np.repeat(rgb, scale, axis=0), scale, axis=1)
+
+
+def riddle_to_rgb(
+    riddle: Riddle,
+    scale: int = DEFAULT_SCALE,
+    with_test_outputs: bool = False,
+    gap: int = DEFAULT_GAP,
+) -> np.ndarray:
+    """
+    Lay out all pairs of a riddle on one RGB canvas.
+
+    :param riddle: Riddle to draw.
+    :param scale: Size of a cell in pixels.
+    :param with_test_outputs: Whether to draw the test outputs.
+    :param gap: Space between boards, in cells.
+    :return: ``(height, width, 3)`` uint8 image.
+    """
+    rows = [(pair.input.np, pair.output.np) for pair in riddle.train]
+    rows.extend(
+        (pair.input.np, pair.output.np if with_test_outputs else None)
+        for pair in riddle.test
+    )
+    gap_px = gap * scale
+    input_width = max(inp.shape[1] for inp, _ in rows) * scale
+    output_width = (
+        max((out.shape[1] for _, out in rows if out is not None), default=0) * scale
+    )
+    row_heights = [
+        max(inp.shape[0], 0 if out is None else out.shape[0]) * scale
+        for inp, out in rows
+    ]
+    height = sum(row_heights) + gap_px * (len(rows) + 1)
+    width = input_width + output_width + gap_px * 3
+
+    canvas = np.empty((height, width, 3), dtype=np.uint8)
+    canvas[:] = _hex_to_rgb(BACKGROUND_COLOR)
+    top = gap_px
+    for (inp, out), row_height in zip(rows, row_heights):
+        for board, left in ((inp, gap_px), (out, input_width + 2 * gap_px)):
+            if board is not None:
+                image = board_to_rgb(board, scale=scale)
+                canvas[top : top + image.shape[0], left : left + image.shape[1]] = image
+        top += row_height + gap_px
+    return canvas
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(chunk_type + data)
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def encode_png(image: np.ndarray, compression: int = 6) -> bytes:
+    """Encode a ``(height, width, 3)`` uint8 image as an RGB PNG."""
+    height, width, _ = image.shape
+    # every scanline starts with its filter type, 0 (none)
+    scanlines = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = image.reshape(height, width * 3)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            _png_chunk(b"IHDR", header),
+            _png_chunk(b"IDAT", zlib.compress(scanlines.tobytes(), compression)),
+            _png_chunk(b"IEND", b""),
+        ]
+    )
+
+
+def write_png(path: os.PathLike, image: np.ndarray):
+    Path(path).write_bytes(encode_png(image))
+
+
+def save_riddle_image(
+    riddle: Riddle,
+    output_path: os.PathLike,
+    scale: int = DEFAULT_SCALE,
+    with_test_outputs: bool = False,
+):
+    write_png(
+        output_path,
+        riddle_to_rgb(riddle, scale=scale, with_test_outputs=with_test_outputs),
+    )
+
+
+def _export_riddle_file(
+    riddle_path, output_dir: Path, scale: int, with_test_outputs: bool
+) -> Path:
+    riddle = dataset.load_riddle_from_file(riddle_path)
+    output_path = output_dir / f"{riddle.riddle_id}.png"
+    save_riddle_image(
+        riddle, output_path, scale=scale, with_test_outputs=with_test_outputs
+    )
+    return output_path
+
+
+def export_riddle_images(
+    riddle_paths: list,
+    output_dir: os.PathLike,
+    scale: int = DEFAULT_SCALE,
+    with_test_outputs: bool = False,
+    workers: Optional[int] = None,
+) -> list[Path]:
+    """
+    Write one ``<riddle_id>.png`` per riddle file into ``output_dir``.
+
+    Riddles are loaded and drawn in the worker processes, only paths are sent
+    between processes.
+
+    :param riddle_paths: Riddle files (or archive members) to export.
+    :param output_dir: Directory to write the images to.
+    :param scale: Size of a cell in pixels.
+    :param with_test_outputs: Whether to draw the test outputs.
+    :param workers: Number of processes, defaults to the number of CPUs.
+    :return: Paths of the written images, in the order of ``riddle_paths``.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    export = functools.partial(
+        _export_riddle_file,
+        output_dir=output_dir,
+        scale=scale,
+        with_test_outputs=with_test_outputs,
+    )
+    if workers == 1:
+        return [export(path) for path in tqdm.tqdm(riddle_paths)]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(riddle_paths) // (workers * 4))
+    with futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=processes.get_context(),
+        initializer=processes.init_worker,
+        initargs=processes.worker_initargs(),
+    ) as executor:
+        return [
+            *tqdm.tqdm(
+                executor.map(export, riddle_paths, chunksize=chunksize),
+                total=len(riddle_paths),
+            )
+        ]
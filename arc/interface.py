@@ -1,154 +1,214 @@
 #!/usr/bin/env python3
 
+import hashlib
 import itertools as itt
-from typing import Optional
+from typing import Optional, Union
 
 import numpy as np
 import pydantic
-from colored import attr, bg, fg
 from matplotlib import pyplot as plt
 
+from arc import render, tracing
+from arc.render import BOARD_GAP_STR, CELL_PADDING_STR, COLORMAP, PAIR_GAP_STR  # noqa
 from arc.settings import settings
 
-CELL_PADDING_STR = " " * settings.cell_padding
-BOARD_GAP_STR = " " * settings.board_gap
-PAIR_GAP_STR = "\n" + " " * settings.pair_gap + "\n"
 
-COLORMAP = {0: 0, 1: 4, 2: 1, 3: 2, 4: 3, 5: 8, 6: 5, 7: 166, 8: 6, 9: 52}
+def _ndarray_to_list(array: np.ndarray) -> list:
+    return array.tolist()
 
 
-class Board(pydantic.BaseModel):
-    __root__: list[list[int]]
+class ArcBaseModel(pydantic.BaseModel):
+    """Base of all models that (transitively) contain Boards."""
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {np.ndarray: _ndarray_to_list}
+
+    def __eq__(self, other) -> bool:
+        # the pydantic default compares .dict() outputs, which is ambiguous for
+        # the arrays inside Boards, so compare field by field instead
+        if not isinstance(other, pydantic.BaseModel):
+            return NotImplemented
+        return self.__fields__.keys() == other.__fields__.keys() and all(
+            getattr(self, name) == getattr(other, name) for name in self.__fields__
+        )
+
+
+class Board(ArcBaseModel):
+    """
+    A single grid, stored as a contiguous, read-only uint8 array.
+
+    Boards can be constructed from nested lists or arrays. Since the array is
+    never modified, ``np`` hands it out without copying and derived values are
+    cached.
+    """
+
+    __root__: np.ndarray
+
+    _unique_values: Optional[frozenset] = pydantic.PrivateAttr(None)
+    _content_hash: Optional[str] = pydantic.PrivateAttr(None)
 
     @pydantic.validator("__root__", pre=True)
+    @tracing.traced("Board validation", "validation")
     def validate_native_list(cls, v):
-        if isinstance(v, np.ndarray):
-            v = v.tolist()
+        if isinstance(v, (list, tuple)):
+            if len(set(lengths := [len(row) for row in v])) != 1:
+                raise ValueError(
+                    f"All rows of a Board must be of same lengths, but got {lengths=}"
+                )
+        v = np.asarray(v)
+        if v.dtype.kind not in "biuf":
+            raise ValueError(f"Board values must be integers, but got {v.dtype=}")
+        if v.size and (v.min() < 0 or v.max() > 255):
+            raise ValueError(
+                f"Board values must be in [0, 255], but got {v.min()}..{v.max()}"
+            )
+        v = np.array(v, dtype=np.uint8, order="C")
+        v.setflags(write=False)
         return v
 
     @pydantic.validator("__root__")
     def validate_non_ragged(cls, v):
-        if len(set(lengths := list(map(len, v)))) != 1:
-            raise ValueError(
-                f"All rows of a Board must be of same lengths, but got {lengths=}"
-            )
+        if v.ndim != 2 or not v.shape[0]:
+            raise ValueError(f"A Board must be a non-empty 2d grid, but got {v.shape=}")
         return v
 
+    @classmethod
+    def from_array_trusted(cls, array: np.ndarray) -> "Board":
+        """
+        Wrap an array without validation, for boards produced by our own code.
+
+        The array must be a non-empty 2d uint8 array of colors in 0..9. Nothing
+        is checked: other dtypes are cast, so out-of-range values wrap silently.
+        It is only copied if it is not contiguous and must not be modified
+        afterwards.
+        """
+        array = np.ascontiguousarray(array, dtype=np.uint8)
+        if array.flags.writeable:
+            array = array.view()
+            array.setflags(write=False)
+        return cls.construct(__root__=array)
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.__root__.setflags(write=False)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Board):
+            return NotImplemented
+        return self.shape == other.shape and np.array_equal(self.np, other.np)
+
     @property
-    def data(self):
+    def data(self) -> np.ndarray:
         return self.__root__
 
     @property
-    def data_flat(self):
-        return list(itt.chain.from_iterable(self.data))
+    def data_flat(self) -> list[int]:
+        return self.flat
 
     @property
     def np(self) -> np.ndarray:
-        return np.array(self.data, dtype=np.int64)
+        """Read-only uint8 view of the board."""
+        return self.__root__
 
     @property
     def num_rows(self) -> int:
-        return len(self.data)
+        return self.__root__.shape[0]
 
     @property
     def num_cols(self) -> int:
-        return len(self.data[0])
+        return self.__root__.shape[1]
 
     @property
     def shape(self) -> tuple[int, int]:
-        return (self.num_rows, self.num_cols)
+        return self.__root__.shape
 
     @property
     def flat(self) -> list[int]:
-        return list(itt.chain.from_iterable(self.data))
+        return self.__root__.ravel().tolist()
 
     @property
-    def unique_values(self) -> set[int]:
-        return set(self.flat)
+    def unique_values(self) -> frozenset[int]:
+        if self._unique_values is None:
+            self._unique_values = frozenset(np.unique(self.__root__).tolist())
+        return self._unique_values
 
     @property
     def num_unique_values(self) -> int:
         return len(self.unique_values)
 
+    @property
+    def content_hash(self) -> str:
+        """Hash of the shape and cells, stable across processes and runs."""
+        if self._content_hash is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.array(self.shape, dtype="<u4").tobytes())
+            digest.update(self.__root__.tobytes())
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
     def fmt_cell(self, row: int, col: int, colored=False) -> str:
-        value = self.data[row][col]
-        color = COLORMAP[value]
-        value_str = f"{CELL_PADDING_STR}{value}{CELL_PADDING_STR}"
-        if colored:
-            return f"{fg(15)}{bg(color)}{value_str}{attr(0)}"
-        else:
-            return value_str
+        return render.cell_table(colored)[self.np[row, col]]
 
     def fmt_row(self, row: int, colored=False) -> str:
-        return "".join(
-            self.fmt_cell(row, col, colored=colored)
-            for col in range(len(self.data[row]))
-        )
+        return "".join(render.cell_table(colored)[self.np[row]].tolist())
 
     def fmt_empty_row(self):
-        return "".join(
-            f"{CELL_PADDING_STR} {CELL_PADDING_STR}" for _ in range(self.num_cols)
-        )
+        return render.empty_row(self.num_cols)
 
     def fmt(self, colored=False) -> str:
-        return "\n".join(
-            self.fmt_row(row, colored=colored) for row in range(len(self.data))
-        )
+        return render.render_board(self, colored=colored)
 
 
 TopKList = list[Board]
 RiddleSolution = list[TopKList]
 
 
-class BoardPair(pydantic.BaseModel):
+class BoardPair(ArcBaseModel):
     input: Board
     output: Board
 
     def fmt(self, colored=False, with_output=True) -> str:
-        rows = []
-        max_row = (
-            max(self.input.num_rows, self.output.num_rows)
-            if with_output
-            else self.input.num_rows
-        )
-        for row in range(max_row):
-            row_parts = []
-            if row >= self.input.num_rows:
-                row_parts.append(self.input.fmt_empty_row())
-            else:
-                row_parts.append(self.input.fmt_row(row, colored=colored))
-            if with_output:
-                row_parts.append(BOARD_GAP_STR)
-                if row >= self.output.num_rows:
-                    row_parts.append(self.output.fmt_empty_row())
-                else:
-                    row_parts.append(self.output.fmt_row(row, colored=colored))
-            rows.append("".join(row_parts))
-        return "\n".join(rows)
+        return render.render_pair(self, colored=colored, with_output=with_output)
+
+    @classmethod
+    def construct_fast(
+        cls,
+        input: Union[Board, np.ndarray],
+        output: Union[Board, np.ndarray],
+    ) -> "BoardPair":
+        """Build a pair without validation from trusted Boards or arrays."""
+        if not isinstance(input, Board):
+            input = Board.from_array_trusted(input)
+        if not isinstance(output, Board):
+            output = Board.from_array_trusted(output)
+        return cls.construct(input=input, output=output)
 
     def as_np(self, with_solution=True):
         return (self.input.np, self.output.np if with_solution else None)
 
 
-class Riddle(pydantic.BaseModel):
+class Riddle(ArcBaseModel):
     train: list[BoardPair]
     test: list[BoardPair]
     riddle_id: Optional[str] = None
     subdir: Optional[str] = None
 
+    @classmethod
+    def construct_fast(
+        cls,
+        train: list[BoardPair],
+        test: list[BoardPair],
+        riddle_id: Optional[str] = None,
+        subdir: Optional[str] = None,
+    ) -> "Riddle":
+        """Build a riddle without validation from trusted BoardPairs."""
+        return cls.construct(train=train, test=test, riddle_id=riddle_id, subdir=subdir)
+
     def fmt(self, colored=False, with_test_outputs=False) -> str:
-        parts = []
-        if self.riddle_id:
-            parts.append(f"ID: {self.riddle_id}")
-        if self.subdir:
-            parts.append(f"SUBDIR: {self.subdir}")
-        for idx, train_pair in enumerate(self.train):
-            parts.append(f"TRAIN {idx}")
-            parts.append(train_pair.fmt(colored=colored))
-        for idx, test_pair in enumerate(self.test):
-            parts.append(f"TEST {idx}")
-            parts.append(test_pair.fmt(colored=colored, with_output=with_test_outputs))
-        return PAIR_GAP_STR.join(parts)
+        return render.render_riddle(
+            self, colored=colored, with_test_outputs=with_test_outputs
+        )
 
     def fmt_plt(self, with_test_outputs=False):
         parts = [pair.as_np() for pair in self.train]
@@ -176,10 +236,129 @@ class Riddle(pydantic.BaseModel):
             [board.as_np(with_solution=with_solution) for board in self.test],
         )
 
+    def to_batch(self, with_test_outputs=True, pad_value: int = 0):
+        """Stack all pairs into a padded RiddleBatch."""
+        from arc.batch import RiddleBatch
+
+        return RiddleBatch.from_riddles(
+            [self], with_test_outputs=with_test_outputs, pad_value=pad_value
+        )
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of all boards of the riddle, independent of its id."""
+        digest = hashlib.blake2b(digest_size=16)
+        for pairs in (self.train, self.test):
+            digest.update(len(pairs).to_bytes(4, "little"))
+            for pair in pairs:
+                digest.update(bytes.fromhex(pair.input.content_hash))
+                digest.update(bytes.fromhex(pair.output.content_hash))
+        return digest.hexdigest()
+
     @property
     def test_inputs(self) -> list[Board]:
         return [t.input for t in self.test]
 
+    @property
+    def num_train(self) -> int:
+        return len(self.train)
+
+    @property
+    def num_test(self) -> int:
+        return len(self.test)
+
+    @property
+    def train_shapes(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        return [(pair.input.shape, pair.output.shape) for pair in self.train]
+
+    @property
+    def test_shapes(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        return [(pair.input.shape, pair.output.shape) for pair in self.test]
+
+
+def _raw_shape(raw_board: list[list[int]]) -> tuple[int, int]:
+    return (len(raw_board), len(raw_board[0]) if raw_board else 0)
+
+
+class LazyRiddle(Riddle):
+    """
+    A Riddle that keeps the raw JSON data of its boards and only validates them
+    into BoardPairs when ``train`` or ``test`` is first accessed.
+
+    Ids, pair counts and shapes are served from the raw data, so listing and
+    filtering riddles does not pay for pydantic validation.
+    """
+
+    _raw: Optional[dict] = pydantic.PrivateAttr(None)
+
+    @classmethod
+    def from_raw(
+        cls,
+        raw: dict,
+        riddle_id: Optional[str] = None,
+        subdir: Optional[str] = None,
+    ) -> "LazyRiddle":
+        riddle = cls.construct(riddle_id=riddle_id, subdir=subdir)
+        riddle._raw = {"train": raw["train"], "test": raw["test"]}
+        return riddle
+
+    @property
+    def is_loaded(self) -> bool:
+        return "train" in self.__dict__ and "test" in self.__dict__
+
+    def load(self) -> "LazyRiddle":
+        """Validate the raw boards, keeping boards that were already assigned."""
+        if self.is_loaded:
+            return self
+        values = {}
+        for name, field in self.__fields__.items():
+            if name in self.__dict__:
+                values[name] = self.__dict__[name]
+            elif name in ("train", "test"):
+                values[name] = pydantic.parse_obj_as(field.outer_type_, self._raw[name])
+        object.__setattr__(self, "__dict__", values)
+        self.__fields_set__.update(("train", "test"))
+        self._raw = None
+        return self
+
+    def __getattr__(self, name):
+        if name in ("train", "test"):
+            return self.load().__dict__[name]
+        raise AttributeError(
+            f"{type(self).__name__!r} object has no attribute {name!r}"
+        )
+
+    def _iter(self, *args, **kwargs):
+        self.load()
+        return super()._iter(*args, **kwargs)
+
+    def _raw_pairs(self, name: str) -> list:
+        return self._raw[name] if name not in self.__dict__ else None
+
+    @property
+    def num_train(self) -> int:
+        if (raw_pairs := self._raw_pairs("train")) is None:
+            return super().num_train
+        return len(raw_pairs)
+
+    @property
+    def num_test(self) -> int:
+        if (raw_pairs := self._raw_pairs("test")) is None:
+            return super().num_test
+        return len(raw_pairs)
+
+    @property
+    def train_shapes(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        if (raw_pairs := self._raw_pairs("train")) is None:
+            return super().train_shapes
+        return [(_raw_shape(p["input"]), _raw_shape(p["output"])) for p in raw_pairs]
+
+    @property
+    def test_shapes(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        if (raw_pairs := self._raw_pairs("test")) is None:
+            return super().test_shapes
+        return [(_raw_shape(p["input"]), _raw_shape(p["output"])) for p in raw_pairs]
+
 
 class TaskData(pydantic.BaseModel):
     topk: int = settings.default_topk
@@ -188,15 +367,81 @@ class TaskData(pydantic.BaseModel):
 HintsAccessed = set
 
 
-class EvalResult(pydantic.BaseModel):
+class ResourceUsage(pydantic.BaseModel):
+    """
+    Resources an agent used on one riddle, see ``arc.resources``.
+
+    Riddles solved concurrently (AsyncAgent) only record their wall time.
+    Riddles solved in one batch get an even share of the batch's times, and
+    the batch's memory and counters.
+    """
+
+    wall_time: float
+    cpu_time: Optional[float] = None
+    # how far the riddle raised the high-water mark of the process' resident
+    # memory, 0 if an earlier riddle of the process had needed as much
+    rss_growth_bytes: Optional[int] = None
+    # peak of traced Python allocations above the start, if tracing memory
+    traced_peak_bytes: Optional[int] = None
+    counters: dict[str, float] = {}
+
+
+class EvalResult(ArcBaseModel):
     riddle: Riddle
     task_data: TaskData
     solution: RiddleSolution
     hints_accessed: HintsAccessed = HintsAccessed()
+    # set if the agent failed on this riddle, the solution then has empty topk lists
+    error: Optional[str] = None
+    resource_usage: Optional[ResourceUsage] = None
+
+    @classmethod
+    def construct_fast(
+        cls,
+        riddle: Riddle,
+        task_data: TaskData,
+        solution: RiddleSolution,
+        hints_accessed: Optional[HintsAccessed] = None,
+        error: Optional[str] = None,
+        resource_usage: Optional[ResourceUsage] = None,
+    ) -> "EvalResult":
+        """Build a result without validation; the caller checked the solution."""
+        return cls.construct(
+            riddle=riddle,
+            task_data=task_data,
+            solution=solution,
+            hints_accessed=(
+                HintsAccessed() if hints_accessed is None else hints_accessed
+            ),
+            error=error,
+            resource_usage=resource_usage,
+        )
 
-    @pydantic.validator("solution")
-    def validate_solution(cls, v, values):
-        riddle = values["riddle"]
+    @classmethod
+    def from_error(
+        cls,
+        riddle: Riddle,
+        task_data: TaskData,
+        error: str,
+        hints_accessed: Optional[HintsAccessed] = None,
+        resource_usage: Optional[ResourceUsage] = None,
+    ) -> "EvalResult":
+        """A result for a riddle the agent failed on, scored as unsolved."""
+        return cls.construct_fast(
+            riddle=riddle,
+            task_data=task_data,
+            solution=[[] for _ in riddle.test],
+            hints_accessed=hints_accessed,
+            error=error,
+            resource_usage=resource_usage,
+        )
+
+    @pydantic.root_validator(skip_on_failure=True)
+    def validate_solution(cls, values):
+        # failed results carry no solution
+        if values["error"] is not None:
+            return values
+        riddle, v = values["riddle"], values["solution"]
         if len(v) != len(riddle.test):
             raise ValueError(
                 f"Solution length must be equal to number of test pairs "
@@ -209,13 +454,20 @@ class EvalResult(pydantic.BaseModel):
                     f"Solution length must be equal to topk ({task_data.topk}),"
                     f" but got {len(solution)=}"
                 )
-        return v
+        return values
 
 
-class EvalResultList(pydantic.BaseModel):
+class EvalResultList(ArcBaseModel):
     task_data: TaskData
     eval_results: list[EvalResult]
 
+    @classmethod
+    def construct_fast(
+        cls, task_data: TaskData, eval_results: list[EvalResult]
+    ) -> "EvalResultList":
+        """Build a list without validation from results for the same task_data."""
+        return cls.construct(task_data=task_data, eval_results=eval_results)
+
     @pydantic.validator("eval_results")
     def validate_eval_results(cls, v, values):
         task_data = values["task_data"]
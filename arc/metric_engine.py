@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Vectorized scoring of the built-in metrics.
+
+``score_tests`` reads the expected output and the candidates of every test of
+every result once, packs the cells of all candidates that have the expected
+shape into one flat array, and compares them in a single pass. From that it
+derives, per test, whether a candidate has the right shape, whether one is
+correct, the best pixel accuracy and the inverse rank of the first correct
+candidate. A metric of the form "min over tests" (see ``Metric.test_score``)
+then only takes a minimum per result. The values are identical to those of
+``Metric.compute``.
+"""
+
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+from arc.interface import EvalResult
+
+
+class TestScores(NamedTuple):
+    """Scores of every test of the scored results, tests of a result adjacent."""
+
+    # index of the first test of every result
+    result_starts: np.ndarray
+    # 1.0 if a candidate has the shape of the expected output
+    board_size: np.ndarray
+    # 1.0 if a candidate equals the expected output
+    correct: np.ndarray
+    # highest fraction of cells a candidate of the right shape got right, 1.0
+    # for a board without cells
+    correct_pixels: np.ndarray
+    # 1 / rank of the first correct candidate, 0.0 without one
+    inverse_rank: np.ndarray
+
+    def min_over_tests(self, score: str) -> list[float]:
+        """The lowest value of a score over the tests of every result."""
+        values = getattr(self, score)
+        if not len(self.result_starts):
+            return []
+        return np.minimum.reduceat(values, self.result_starts).tolist()
+
+
+def score_tests(eval_results: Sequence[EvalResult]) -> TestScores:
+    result_starts = []
+    # per candidate
+    candidate_tests, candidate_ranks, shape_matches = [], [], []
+    # cells of the candidates with the expected shape
+    expected_cells, candidate_cells, num_cells = [], [], []
+    num_tests = 0
+    for eval_result in eval_results:
+        result_start = num_tests
+        for test, topk in zip(eval_result.riddle.test, eval_result.solution):
+            expected = test.output.np
+            for rank, board in enumerate(topk):
+                candidate = board.np
+                shape_match = candidate.shape == expected.shape
+                candidate_tests.append(num_tests)
+                candidate_ranks.append(rank)
+                shape_matches.append(shape_match)
+                if shape_match:
+                    expected_cells.append(expected.ravel())
+                    candidate_cells.append(candidate.ravel())
+                    num_cells.append(expected.size)
+            num_tests += 1
+        if num_tests == result_start:
+            raise ValueError("No values for min computation.")
+        result_starts.append(result_start)
+
+    candidate_tests = np.array(candidate_tests, dtype=np.intp)
+    candidate_ranks = np.array(candidate_ranks, dtype=np.intp)
+    shape_matches = np.array(shape_matches, dtype=bool)
+    pixel_accuracies = np.zeros(len(shape_matches))
+    exact_matches = np.zeros(len(shape_matches), dtype=bool)
+    if num_cells:
+        equal_cells = np.concatenate(expected_cells) == np.concatenate(candidate_cells)
+        num_cells = np.array(num_cells, dtype=np.intp)
+        # per candidate, unlike reduceat also right for boards without cells
+        num_equal = np.bincount(
+            np.repeat(np.arange(len(num_cells)), num_cells),
+            weights=equal_cells,
+            minlength=len(num_cells),
+        )
+        pixel_accuracies[shape_matches] = np.divide(
+            num_equal,
+            num_cells,
+            # all cells of a board without cells are right
+            out=np.ones(len(num_cells)),
+            where=num_cells > 0,
+        )
+        exact_matches[shape_matches] = num_equal == num_cells
+
+    def _max_per_test(values: np.ndarray, candidates=slice(None)) -> np.ndarray:
+        maxima = np.zeros(num_tests)
+        np.maximum.at(maxima, candidate_tests[candidates], values)
+        return maxima
+
+    return TestScores(
+        result_starts=np.array(result_starts, dtype=np.intp),
+        board_size=_max_per_test(shape_matches.astype(float)),
+        correct=_max_per_test(exact_matches.astype(float)),
+        correct_pixels=_max_per_test(pixel_accuracies),
+        inverse_rank=_max_per_test(
+            1.0 / (candidate_ranks[exact_matches] + 1), exact_matches
+        ),
+    )
@@ -8,7 +8,9 @@ import numpy as np
 import pydantic
 import pydantic.generics
 
+from arc import tracing
 from arc.interface import Board, BoardPair, EvalResult, EvalResultList, TopKList
+from arc.metric_engine import TestScores, score_tests
 
 C = TypeVar("C")
 A = TypeVar("A")
@@ -40,8 +42,9 @@ class NotFoundError(Exception):
 
 
 def get_correct_solution_idx(test_output: Board, topk_list: TopKList) -> int:
+    # boards are integer grids, equal cells are all that counts
     for i, output in enumerate(topk_list):
-        if safe_allclose(test_output.np, output.np):
+        if output == test_output:
             return i
     raise NotFoundError()
 
@@ -58,7 +61,54 @@ def safe_allclose(a, b):
     return np.allclose(a, b)
 
 
+class Aggregator(Generic[C, A]):
+    """Aggregates the compute results of a metric one at a time."""
+
+    def update(self, compute_result: C):
+        raise NotImplementedError()
+
+    def result(self) -> A:
+        raise NotImplementedError()
+
+
+class ListAggregator(Aggregator[C, A]):
+    """Keeps all compute results and aggregates them at the end."""
+
+    def __init__(self, aggregate: Callable[[list[C]], A]):
+        self._aggregate = aggregate
+        self._compute_results: list[C] = []
+
+    def update(self, compute_result: C):
+        self._compute_results.append(compute_result)
+
+    def result(self) -> A:
+        return self._aggregate(self._compute_results)
+
+
+class MeanAggregator(Aggregator[float, float]):
+    """Running mean of the (included) values, the streamed ``safe_mean``."""
+
+    def __init__(self, include: Optional[Callable[[float], bool]] = None):
+        self._include = include
+        self._total = 0.0
+        self._count = 0
+
+    def update(self, compute_result: float):
+        if self._include is None or self._include(compute_result):
+            self._total += compute_result
+            self._count += 1
+
+    def result(self) -> float:
+        if not self._count:
+            return 0.0
+        return self._total / self._count
+
+
 class Metric(Generic[C, A]):
+    # the TestScores field this metric is the min over tests of, if any; such
+    # metrics are computed for many results at once by the metric engine
+    test_score: Optional[str] = None
+
     def __init__(self, name: str):
         self.name = name
 
@@ -71,7 +121,26 @@ class Metric(Generic[C, A]):
         raise NotImplementedError()
 
     def compute(self, eval_result: EvalResult) -> C:
-        return self._compute(eval_result)
+        with tracing.span(self.name, "metric"):
+            return self._compute(eval_result)
+
+    def compute_all(
+        self, eval_results: list[EvalResult], test_scores: Optional[TestScores] = None
+    ) -> list[C]:
+        """Compute the results of many results, from ``test_scores`` if given."""
+        if self._uses_engine() and test_scores is not None:
+            return test_scores.min_over_tests(self.test_score)
+        return [self.compute(eval_result) for eval_result in eval_results]
+
+    @classmethod
+    def _uses_engine(cls) -> bool:
+        # a subclass that overrides _compute but inherits test_score is
+        # computed by its own _compute
+        if cls.test_score is None:
+            return False
+        declaring = next(c for c in cls.__mro__ if "test_score" in vars(c))
+        computing = next(c for c in cls.__mro__ if "_compute" in vars(c))
+        return declaring is computing
 
     def aggregate(
         self, eval_result_list: EvalResultList, compute_results: list[C]
@@ -84,6 +153,16 @@ class Metric(Generic[C, A]):
         )
         return result
 
+    def aggregator(self) -> Aggregator[C, A]:
+        """
+        An incremental aggregation of this metric, for streamed evaluations.
+
+        Metrics whose aggregation can be updated per result should override
+        this, the default collects the compute results and calls ``_aggregate``
+        without an EvalResultList (None).
+        """
+        return ListAggregator(lambda results: self._aggregate(None, results))
+
 
 METRICS = {}
 
@@ -102,8 +181,13 @@ class MeanAggMetric(Metric[float, float]):
     ) -> float:
         return safe_mean(compute_results)
 
+    def aggregator(self) -> MeanAggregator:
+        return MeanAggregator()
+
 
 class BoardSizeMetric(MeanAggMetric, Metric[float, float]):
+    test_score = "board_size"
+
     def __init__(self):
         super().__init__(name="board_size")
 
@@ -121,6 +205,8 @@ register_metric(BoardSizeMetric())
 
 
 class CorrectMetric(MeanAggMetric, Metric[float, float]):
+    test_score = "correct"
+
     def __init__(self):
         super().__init__(name="correct")
 
@@ -139,18 +225,22 @@ register_metric(CorrectMetric())
 
 
 class CorrectPixelsMetric(MeanAggMetric, Metric[float, float]):
+    test_score = "correct_pixels"
+
     def __init__(self):
         super().__init__(name="correct_pixels")
 
     def _compute(self, eval_result: EvalResult) -> float:
         def _get_value(test: BoardPair, topk_list: TopKList) -> float:
             def _get_correct_pixels(trial) -> float:
-                if trial.shape == test.output.shape:
-                    return np.mean(np.equal(trial.np, test.output.np)).item()
-                else:
+                if trial.shape != test.output.shape:
                     return 0.0
+                if not test.output.np.size:
+                    # all cells of a board without cells are right
+                    return 1.0
+                return np.mean(np.equal(trial.np, test.output.np)).item()
 
-            return max(_get_correct_pixels(trial) for trial in topk_list)
+            return max((_get_correct_pixels(trial) for trial in topk_list), default=0.0)
 
         return min_over_tests(eval_result, _get_value)
 
@@ -159,6 +249,8 @@ register_metric(CorrectPixelsMetric())
 
 
 class InverseRankOfCorrectMetric(Metric[float, float]):
+    test_score = "inverse_rank"
+
     def __init__(self):
         super().__init__(name="inverse_rank_of_correct")
 
@@ -177,10 +269,57 @@ class InverseRankOfCorrectMetric(Metric[float, float]):
     ) -> float:
         return safe_mean([r for r in compute_results if r > 0.0])
 
+    def aggregator(self) -> MeanAggregator:
+        return MeanAggregator(include=lambda r: r > 0.0)
+
 
 register_metric(InverseRankOfCorrectMetric())
 
 
+def compute_test_scores(
+    metrics: list[Metric], eval_results: list[EvalResult]
+) -> Optional[TestScores]:
+    """Run the metric engine once, if any of the metrics is based on it."""
+    if not any(metric._uses_engine() for metric in metrics):
+        return None
+    with tracing.span("score tests", "metric", num_results=len(eval_results)):
+        return score_tests(eval_results)
+
+
+class OnlineMetrics:
+    """
+    Scores results as they arrive without keeping them.
+
+    Only the compute result of every metric is kept per result, aggregates
+    are updated incrementally (see ``Metric.aggregator``).
+    """
+
+    def __init__(self, metrics: list[Metric]):
+        self.metrics = metrics
+        self._aggregators = {metric.name: metric.aggregator() for metric in metrics}
+        self._compute_results = {metric.name: [] for metric in metrics}
+
+    def update(self, eval_result: EvalResult):
+        self.update_all([eval_result])
+
+    def update_all(self, eval_results: list[EvalResult]):
+        test_scores = compute_test_scores(self.metrics, eval_results)
+        for metric in self.metrics:
+            for compute_result in metric.compute_all(eval_results, test_scores):
+                self._compute_results[metric.name].append(compute_result)
+                self._aggregators[metric.name].update(compute_result)
+
+    def metric_results(self) -> MetricResultDict:
+        return {
+            name: MetricResult(
+                name=name,
+                compute_results=self._compute_results[name],
+                aggregate_result=aggregator.result(),
+            )
+            for name, aggregator in self._aggregators.items()
+        }
+
+
 def get_all_metrics() -> list[Metric]:
     return list(METRICS.values())
 
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Per-riddle profiles of evaluation runs.
+
+While profiling is on, every riddle an agent solves is run under cProfile and
+its stats are written to ``<profile_dir>/<riddle_id>.pstats`` (batches of
+riddles to ``batch-<first riddle_id>.pstats``), also from worker processes.
+``merge_profiles`` combines them into one profile of the run, which
+``fmt_hot_functions`` summarizes; any ``.pstats`` file can be opened with
+``python -m pstats`` or viewers like snakeviz.
+"""
+
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+from pathlib import Path
+from typing import Iterator, Optional
+
+from loguru import logger
+
+# functions listed by fmt_hot_functions, unless given otherwise
+HOT_FUNCTIONS = 20
+
+_profile_dir: Optional[Path] = None
+
+
+def profile_dir() -> Optional[Path]:
+    return _profile_dir
+
+
+def start_profiling(directory: os.PathLike):
+    global _profile_dir
+    _profile_dir = Path(directory).absolute()
+    _profile_dir.mkdir(parents=True, exist_ok=True)
+
+
+def stop_profiling():
+    global _profile_dir
+    _profile_dir = None
+
+
+def init_worker(directory: Optional[Path]):
+    """Profile the riddles of a worker process like those of its parent."""
+    if directory is not None:
+        start_profiling(directory)
+
+
+@contextlib.contextmanager
+def profile(name: str) -> Iterator[None]:
+    """Profile the ``with`` block into ``<name>.pstats``, if profiling."""
+    if _profile_dir is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # only one profiler can run per thread, e.g. for concurrent riddles
+        logger.warning(f"Not profiling {name}, another profiler is active")
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(_profile_dir / f"{name}.pstats")
+
+
+def merge_profiles(
+    directory: os.PathLike, output_path: os.PathLike
+) -> Optional[pstats.Stats]:
+    """Sum up the profiles in a directory into one, None if there are none."""
+    paths = sorted(str(path) for path in Path(directory).glob("*.pstats"))
+    if not paths:
+        return None
+    stats = pstats.Stats(*paths)
+    stats.dump_stats(output_path)
+    return stats
+
+
+def fmt_hot_functions(stats: pstats.Stats, num: int = HOT_FUNCTIONS) -> str:
+    """The functions with the most time spent in themselves."""
+    stream = io.StringIO()
+    # without the header line per merged profile
+    previous, (stats.stream, stats.files) = (stats.stream, stats.files), (stream, [])
+    try:
+        stats.sort_stats("tottime").print_stats(num)
+    finally:
+        stats.stream, stats.files = previous
+    return stream.getvalue().strip()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Terminal rendering of boards, pairs and riddles.
+
+The string of every cell value is precomputed once (colored and uncolored),
+so rendering a board is a single table lookup over its array followed by one
+join per row, with no per-cell Python formatting.
+"""
+
+import functools
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+import numpy as np
+from colored import attr, bg, fg
+
+from arc.settings import settings
+
+if TYPE_CHECKING:
+    from arc.interface import Board, BoardPair, Riddle
+
+CELL_PADDING_STR = " " * settings.cell_padding
+BOARD_GAP_STR = " " * settings.board_gap
+PAIR_GAP_STR = "\n" + " " * settings.pair_gap + "\n"
+
+COLORMAP = {0: 0, 1: 4, 2: 1, 3: 2, 4: 3, 5: 8, 6: 5, 7: 166, 8: 6, 9: 52}
+
+
+@functools.lru_cache(maxsize=None)
+def cell_table(colored: bool) -> np.ndarray:
+    """Rendered string of every possible cell value, indexable by a board."""
+    table = np.empty(256, dtype=object)
+    for value in range(256):
+        value_str = f"{CELL_PADDING_STR}{value}{CELL_PADDING_STR}"
+        if colored and value in COLORMAP:
+            value_str = f"{fg(15)}{bg(COLORMAP[value])}{value_str}{attr(0)}"
+        table[value] = value_str
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def empty_row(num_cols: int) -> str:
+    return f"{CELL_PADDING_STR} {CELL_PADDING_STR}" * num_cols
+
+
+def board_rows(board: "Board", colored: bool = False) -> list[str]:
+    return ["".join(row) for row in cell_table(colored)[board.np].tolist()]
+
+
+def render_board(board: "Board", colored: bool = False) -> str:
+    return "\n".join(board_rows(board, colored=colored))
+
+
+def render_pair(pair: "BoardPair", colored: bool = False, with_output=True) -> str:
+    input_rows = board_rows(pair.input, colored=colored)
+    if not with_output:
+        return "\n".join(input_rows)
+    output_rows = board_rows(pair.output, colored=colored)
+    num_rows = max(len(input_rows), len(output_rows))
+    input_rows += [empty_row(pair.input.num_cols)] * (num_rows - len(input_rows))
+    output_rows += [empty_row(pair.output.num_cols)] * (num_rows - len(output_rows))
+    return "\n".join(
+        f"{input_row}{BOARD_GAP_STR}{output_row}"
+        for input_row, output_row in zip(input_rows, output_rows)
+    )
+
+
+def render_riddle(
+    riddle: "Riddle", colored: bool = False, with_test_outputs: bool = False
+) -> str:
+    parts = []
+    if riddle.riddle_id:
+        parts.append(f"ID: {riddle.riddle_id}")
+    if riddle.subdir:
+        parts.append(f"SUBDIR: {riddle.subdir}")
+    for idx, train_pair in enumerate(riddle.train):
+        parts.append(f"TRAIN {idx}")
+        parts.append(render_pair(train_pair, colored=colored))
+    for idx, test_pair in enumerate(riddle.test):
+        parts.append(f"TEST {idx}")
+        parts.append(
+            render_pair(test_pair, colored=colored, with_output=with_test_outputs)
+        )
+    return PAIR_GAP_STR.join(parts)
+
+
+def iter_rendered_riddles(
+    riddles: Iterable["Riddle"], colored: bool = False, with_test_outputs=False
+) -> Iterator[str]:
+    """Render riddles one by one, e.g. to stream them into a pager."""
+    for riddle in riddles:
+        yield render_riddle(
+            riddle, colored=colored, with_test_outputs=with_test_outputs
+        ) + "\n\n"
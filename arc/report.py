@@ -1,23 +1,238 @@
 #!/usr/bin/env python3
 
+import base64
 import datetime
+import json
 import os
 from pathlib import Path
+from typing import Optional
 
+import numpy as np
 import pydantic
 import tabulate
+from loguru import logger
 
-from arc.interface import EvalResultList
+from arc.interface import (
+    ArcBaseModel,
+    Board,
+    EvalResult,
+    EvalResultList,
+    HintsAccessed,
+    ResourceUsage,
+    RiddleSolution,
+    TaskData,
+)
 from arc.metrics import MetricResultDict
+from arc.utils import dataset
 
+COMPACT_REPORT_FORMAT = "arc-compact-report"
+COMPACT_REPORT_VERSION = 1
+# riddles listed in the timing section of a report
+SLOWEST_RIDDLES = 5
 
-class Report(pydantic.BaseModel):
+
+def encode_solution(solution: RiddleSolution) -> dict:
+    """Pack the boards of a solution into their shapes and one base64 blob."""
+    shapes = [[board.shape for board in topk] for topk in solution]
+    cells = b"".join(board.np.tobytes() for topk in solution for board in topk)
+    return {"shapes": shapes, "cells": base64.b64encode(cells).decode("ascii")}
+
+
+def decode_solution(data: dict) -> RiddleSolution:
+    cells = np.frombuffer(base64.b64decode(data["cells"]), dtype=np.uint8)
+    solution, offset = [], 0
+    for topk_shapes in data["shapes"]:
+        topk = []
+        for rows, cols in topk_shapes:
+            board = cells[offset : offset + rows * cols].reshape(rows, cols)
+            topk.append(Board.from_array_trusted(board))
+            offset += rows * cols
+        solution.append(topk)
+    return solution
+
+
+def encode_eval_result(eval_result: EvalResult) -> dict:
+    riddle = eval_result.riddle
+    if riddle.riddle_id is None:
+        raise ValueError("Compact reports can only reference riddles with an id")
+    return {
+        "riddle_id": riddle.riddle_id,
+        "riddle_hash": riddle.content_hash,
+        "hints_accessed": sorted(eval_result.hints_accessed),
+        "solution": encode_solution(eval_result.solution),
+        "error": eval_result.error,
+        "resource_usage": (
+            None
+            if eval_result.resource_usage is None
+            else eval_result.resource_usage.dict()
+        ),
+    }
+
+
+def eval_result_riddle_id(eval_result: EvalResult) -> Optional[str]:
+    """The id of a result's riddle, without loading a lazy result."""
+    if isinstance(eval_result, LazyEvalResult):
+        return eval_result.riddle_id
+    return eval_result.riddle.riddle_id
+
+
+def fmt_timing(
+    riddle_ids: list[Optional[str]],
+    resource_usages: list[Optional[ResourceUsage]],
+    riddles_per_second: Optional[float] = None,
+    slowest: int = SLOWEST_RIDDLES,
+) -> str:
+    timed = [
+        (riddle_id, usage)
+        for riddle_id, usage in zip(riddle_ids, resource_usages)
+        if usage is not None
+    ]
+    if not timed:
+        return ""
+    wall_times = np.array([usage.wall_time for _, usage in timed])
+    p50, p95, p99 = np.percentile(wall_times, [50, 95, 99])
+    lines = ["Timing:"]
+    lines.append(
+        f"Wall time per riddle: p50 {p50:.3f}s, p95 {p95:.3f}s, p99 {p99:.3f}s, "
+        f"total {wall_times.sum():.1f}s"
+    )
+    if riddles_per_second is not None:
+        lines.append(f"Throughput: {riddles_per_second:.2f} riddles/s")
+    counters = {}
+    for _, usage in timed:
+        for name, value in usage.counters.items():
+            counters[name] = counters.get(name, 0) + value
+    if counters:
+        counters_string = ", ".join(f"{k}={v:g}" for k, v in sorted(counters.items()))
+        lines.append(f"Counters: {counters_string}")
+
+    def _mb(num_bytes: Optional[int]) -> Optional[float]:
+        return None if num_bytes is None else num_bytes / 2**20
+
+    slowest_rows = [
+        [
+            riddle_id,
+            usage.wall_time,
+            usage.cpu_time,
+            _mb(usage.rss_growth_bytes),
+            _mb(usage.traced_peak_bytes),
+        ]
+        for riddle_id, usage in sorted(timed, key=lambda t: -t[1].wall_time)[:slowest]
+    ]
+    lines.append("")
+    lines.append(f"Slowest {len(slowest_rows)} riddles:")
+    lines.append(
+        tabulate.tabulate(
+            slowest_rows,
+            headers=["Riddle", "Wall (s)", "CPU (s)", "RSS growth (MB)", "Traced (MB)"],
+            floatfmt=".3f",
+        )
+    )
+    return "\n".join(lines)
+
+
+def fmt_summary(
+    metric_results: MetricResultDict,
+    hints_accessed: HintsAccessed,
+    failed_ids: list[str],
+) -> str:
+    lines = []
+    aggregation_rows = [
+        [k, v.aggregate_result]
+        for k, v in metric_results.items()
+        if v.aggregate_result is not None
+    ]
+    aggragation_table = tabulate.tabulate(aggregation_rows, headers=["Metric", "Value"])
+    lines.append("Aggregation results:")
+    lines.append(aggragation_table)
+    lines.append("")
+    hints_string = ",".join(sorted(hints_accessed))
+    lines.append(f"Hints accessed: {hints_string}")
+    if failed_ids:
+        lines.append(f"Agent failed on {len(failed_ids)} riddles: {failed_ids}")
+    return "\n".join(lines)
+
+
+class LazyEvalResult(EvalResult):
+    """
+    An EvalResult read from a compact report.
+
+    The solution is decoded and the riddle is loaded from the dataset by id
+    when first accessed. A riddle whose content changed since the report was
+    written raises a ValueError instead of being scored silently.
+    """
+
+    _record: Optional[dict] = pydantic.PrivateAttr(None)
+
+    @classmethod
+    def from_record(cls, record: dict, task_data: TaskData) -> "LazyEvalResult":
+        eval_result = cls.construct(
+            task_data=task_data,
+            hints_accessed=set(record["hints_accessed"]),
+            error=record["error"],
+            resource_usage=(
+                None
+                if record.get("resource_usage") is None
+                else ResourceUsage(**record["resource_usage"])
+            ),
+        )
+        eval_result._record = record
+        return eval_result
+
+    @property
+    def riddle_id(self) -> str:
+        if self._record is None:
+            return self.riddle.riddle_id
+        return self._record["riddle_id"]
+
+    def _load_riddle(self):
+        riddle = dataset.load_riddle_from_id(self._record["riddle_id"], lazy=True)
+        if riddle.content_hash != self._record["riddle_hash"]:
+            raise ValueError(
+                f"Riddle {riddle.riddle_id} changed since the report was written"
+            )
+        return riddle
+
+    def load(self) -> "LazyEvalResult":
+        if self._record is None:
+            return self
+        values = {**self.__dict__}
+        if "riddle" not in values:
+            values["riddle"] = self._load_riddle()
+        if "solution" not in values:
+            values["solution"] = decode_solution(self._record["solution"])
+        # keep the field order of a regular EvalResult for serialization
+        object.__setattr__(self, "__dict__", {k: values[k] for k in self.__fields__})
+        self.__fields_set__.update(("riddle", "solution"))
+        self._record = None
+        return self
+
+    def __getattr__(self, name):
+        if name == "solution" and self._record is not None:
+            solution = decode_solution(self._record["solution"])
+            return self.__dict__.setdefault("solution", solution)
+        if name == "riddle" and self._record is not None:
+            return self.__dict__.setdefault("riddle", self._load_riddle())
+        raise AttributeError(
+            f"{type(self).__name__!r} object has no attribute {name!r}"
+        )
+
+    def _iter(self, *args, **kwargs):
+        self.load()
+        return super()._iter(*args, **kwargs)
+
+
+class Report(ArcBaseModel):
     eval_results: EvalResultList
     metric_results: MetricResultDict = MetricResultDict()
     timestamp: datetime.datetime = pydantic.Field(default_factory=datetime.datetime.now)
     tags: list[str] = []
     subdirs: list[str] = []
     comment: str = ""
+    # "i/n" for the partial report of one shard, see merge_reports
+    shard: Optional[str] = None
+    # of the evaluation that produced the results, unknown for merged reports
+    riddles_per_second: Optional[float] = None
 
     def save_to_file(self, filename: os.PathLike):
         path = Path(filename)
@@ -25,19 +240,112 @@ class Report(pydantic.BaseModel):
         with path.open("w") as f:
             f.write(self.json())
 
+    def save_compact(self, filename: os.PathLike):
+        """
+        Write the report as JSONL that references riddles by id.
+
+        The first line holds the report metadata and the dataset fingerprint,
+        every following line one result with its solution boards packed as
+        uint8 arrays. See ``load_compact``.
+        """
+        path = Path(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = json.loads(self.json(exclude={"eval_results"}))
+        header.update(
+            format=COMPACT_REPORT_FORMAT,
+            version=COMPACT_REPORT_VERSION,
+            task_data=self.eval_results.task_data.dict(),
+            dataset_fingerprint=dataset.get_riddle_index().fingerprint(),
+            num_results=len(self.eval_results.eval_results),
+        )
+        with path.open("w") as f:
+            f.write(json.dumps(header) + "\n")
+            for eval_result in self.eval_results.eval_results:
+                f.write(json.dumps(encode_eval_result(eval_result)) + "\n")
+
+    @classmethod
+    def load_compact(cls, filename: os.PathLike) -> "Report":
+        """Read a report written by ``save_compact``, loading riddles lazily."""
+        with Path(filename).open() as f:
+            header = json.loads(next(f))
+            if header.get("format") != COMPACT_REPORT_FORMAT:
+                raise ValueError(f"{filename} is not a compact report")
+            if header["version"] != COMPACT_REPORT_VERSION:
+                raise ValueError(
+                    f"Unsupported compact report version {header['version']}"
+                )
+            task_data = TaskData(**header["task_data"])
+            eval_results = [
+                LazyEvalResult.from_record(json.loads(line), task_data)
+                for line in f
+                if line.strip()
+            ]
+        if header["dataset_fingerprint"] != dataset.get_riddle_index().fingerprint():
+            logger.warning(
+                f"Dataset changed since {filename} was written, "
+                "riddles are checked individually when loaded"
+            )
+        return cls(
+            eval_results=EvalResultList.construct_fast(
+                task_data=task_data, eval_results=eval_results
+            ),
+            **{
+                k: header[k]
+                for k in (
+                    "metric_results",
+                    "timestamp",
+                    "tags",
+                    "subdirs",
+                    "comment",
+                    "shard",
+                    "riddles_per_second",
+                )
+                if k in header
+            },
+        )
+
     def fmt_txt(self):
-        lines = []
-        aggregation_rows = [
-            [k, v.aggregate_result]
-            for k, v in self.metric_results.items()
-            if v.aggregate_result is not None
+        eval_results = self.eval_results.eval_results
+        riddle_ids = [eval_result_riddle_id(result) for result in eval_results]
+        failed_ids = [
+            str(riddle_id)
+            for riddle_id, result in zip(riddle_ids, eval_results)
+            if result.error is not None
         ]
-        aggragation_table = tabulate.tabulate(
-            aggregation_rows, headers=["Metric", "Value"]
+        summary = fmt_summary(
+            self.metric_results, self.eval_results.hints_accessed, failed_ids
         )
-        lines.append("Aggregation results:")
-        lines.append(aggragation_table)
-        lines.append("")
-        hints_string = ",".join(sorted(self.eval_results.hints_accessed))
-        lines.append(f"Hints accessed: {hints_string}")
-        return "\n".join(lines)
+        timing = fmt_timing(
+            riddle_ids,
+            [result.resource_usage for result in eval_results],
+            self.riddles_per_second,
+        )
+        return f"{summary}\n\n{timing}" if timing else summary
+
+
+class ScoreReport(ArcBaseModel):
+    """
+    Report of a streamed evaluation, which keeps scores instead of results.
+
+    ``compute_results`` of the metric results follow the order of
+    ``riddle_ids``.
+    """
+
+    task_data: TaskData
+    riddle_ids: list[Optional[str]] = []
+    metric_results: MetricResultDict = MetricResultDict()
+    hints_accessed: HintsAccessed = HintsAccessed()
+    failed_riddle_ids: list[Optional[str]] = []
+    timestamp: datetime.datetime = pydantic.Field(default_factory=datetime.datetime.now)
+    tags: list[str] = []
+    subdirs: list[str] = []
+    comment: str = ""
+
+    def save_to_file(self, filename: os.PathLike):
+        path = Path(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.json())
+
+    def fmt_txt(self):
+        failed_ids = [str(riddle_id) for riddle_id in self.failed_riddle_ids]
+        return fmt_summary(self.metric_results, self.hints_accessed, failed_ids)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Per-riddle resource accounting.
+
+The evaluator wraps every riddle in a ``ResourceMeter``, which records the
+wall and CPU time, the growth of the process' peak resident memory and, with
+``settings.trace_memory``, the peak of Python allocations. Agents can add
+their own counters (e.g. model calls or tokens) with ``count``; they end up in
+``EvalResult.resource_usage.counters`` of the riddle being solved.
+"""
+
+import contextvars
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+from arc.interface import ResourceUsage
+from arc.settings import settings
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# counters of the riddle solved in the current context
+_counters: contextvars.ContextVar[Optional[dict[str, float]]] = contextvars.ContextVar(
+    "arc_resource_counters", default=None
+)
+
+
+def count(name: str, value: float = 1):
+    """Add to a counter of the riddle that is being solved."""
+    counters = _counters.get()
+    if counters is not None:
+        counters[name] = counters.get(name, 0) + value
+
+
+def max_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class ResourceMeter:
+    """
+    Measures the resources used inside a ``with`` block.
+
+    :param exclusive: Whether nothing else runs in the process meanwhile. If
+        not (e.g. concurrent riddles on an event loop), only the wall time and
+        the counters are recorded, the rest would mix up the riddles.
+    """
+
+    def __init__(self, exclusive: bool = True):
+        self.exclusive = exclusive
+        self.usage: Optional[ResourceUsage] = None
+
+    def __enter__(self) -> "ResourceMeter":
+        self._token = _counters.set({})
+        if self.exclusive and settings.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._traced_start = tracemalloc.get_traced_memory()[0]
+        if self.exclusive:
+            self._max_rss_start = max_rss_bytes()
+        self._cpu_start = time.process_time()
+        self._wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall_time = time.perf_counter() - self._wall_start
+        counters = _counters.get()
+        _counters.reset(self._token)
+        if not self.exclusive:
+            self.usage = ResourceUsage(wall_time=wall_time, counters=counters)
+            return
+        traced_peak_bytes = None
+        if settings.trace_memory:
+            traced_peak_bytes = tracemalloc.get_traced_memory()[1] - self._traced_start
+        rss_growth_bytes = None
+        if self._max_rss_start is not None:
+            rss_growth_bytes = max_rss_bytes() - self._max_rss_start
+        self.usage = ResourceUsage(
+            wall_time=wall_time,
+            cpu_time=time.process_time() - self._cpu_start,
+            rss_growth_bytes=rss_growth_bytes,
+            traced_peak_bytes=traced_peak_bytes,
+            counters=counters,
+        )
+
+    def share(self, num_riddles: int) -> ResourceUsage:
+        """Usage of one of ``num_riddles`` riddles solved together."""
+        usage = self.usage.copy()
+        usage.wall_time /= num_riddles
+        if usage.cpu_time is not None:
+            usage.cpu_time /= num_riddles
+        return usage
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""
+Checkpointed evaluation runs.
+
+A run is a directory in the cache (``runs/<run_id>``) holding the run's
+metadata in ``run.json`` and every finished result as one line of
+``results.jsonl``, in the compact encoding of ``arc.report``. Results are
+appended and synced to disk as soon as they are done, so an interrupted run
+loses at most the riddles that were in progress, and resuming it evaluates
+only the remaining riddles.
+"""
+
+import datetime
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import filelock
+from loguru import logger
+
+from arc.interface import EvalResult, Riddle, TaskData
+from arc.report import LazyEvalResult, encode_eval_result
+from arc.utils import cache
+
+RUN_FN = "run.json"
+RESULTS_FN = "results.jsonl"
+
+
+def get_runs_dir() -> Path:
+    return cache.get_cache_dir("runs")
+
+
+def new_run_id() -> str:
+    return f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+class Run:
+    """An evaluation run whose results are checkpointed to disk."""
+
+    def __init__(self, run_id: str, run_dir: Path, metadata: dict):
+        self.run_id = run_id
+        self.run_dir = run_dir
+        self.metadata = metadata
+        self.results_path = run_dir / RESULTS_FN
+        self._lock = filelock.FileLock(str(run_dir / f"{RESULTS_FN}.lock"))
+
+    @classmethod
+    def create(
+        cls,
+        agent_path: str,
+        task_data: TaskData,
+        subdirs: list[str],
+        run_id: Optional[str] = None,
+        shard: Optional[str] = None,
+    ) -> "Run":
+        run_id = run_id or new_run_id()
+        run_dir = get_runs_dir() / run_id
+        run_dir.mkdir()
+        metadata = {
+            "agent_path": agent_path,
+            "task_data": task_data.dict(),
+            "subdirs": subdirs,
+            "shard": shard,
+            "created": datetime.datetime.now().isoformat(),
+        }
+        (run_dir / RUN_FN).write_text(json.dumps(metadata))
+        return cls(run_id, run_dir, metadata)
+
+    @classmethod
+    def load(cls, run_id: str) -> "Run":
+        run_dir = get_runs_dir() / run_id
+        if not (run_dir / RUN_FN).exists():
+            raise FileNotFoundError(f"No run {run_id} in {get_runs_dir()}")
+        metadata = json.loads((run_dir / RUN_FN).read_text())
+        return cls(run_id, run_dir, metadata)
+
+    @property
+    def task_data(self) -> TaskData:
+        return TaskData(**self.metadata["task_data"])
+
+    def append(self, eval_result: EvalResult):
+        """Durably add a finished result; safe to call from several threads."""
+        line = json.dumps(encode_eval_result(eval_result)) + "\n"
+        with self._lock, self.results_path.open("a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _records(self) -> Iterator[dict]:
+        if not self.results_path.exists():
+            return
+        with self._lock:
+            with self.results_path.open("rb+") as f:
+                content = f.read()
+                # a crash while appending leaves a partial last line, drop it
+                if content and not content.endswith(b"\n"):
+                    logger.warning(f"Dropping incomplete last result of {self.run_id}")
+                    f.truncate(content.rfind(b"\n") + 1)
+        for line in content.splitlines(keepends=True):
+            if line.endswith(b"\n"):
+                yield json.loads(line)
+
+    def iter_eval_results(self) -> Iterator[LazyEvalResult]:
+        """Results written so far, the last one per riddle wins."""
+        task_data = self.task_data
+        records = {record["riddle_id"]: record for record in self._records()}
+        for record in records.values():
+            yield LazyEvalResult.from_record(record, task_data)
+
+    def load_eval_results(self) -> list[LazyEvalResult]:
+        return list(self.iter_eval_results())
+
+    def done_riddle_ids(self) -> set[str]:
+        return {record["riddle_id"] for record in self._records()}
+
+    def remaining(self, riddles: Iterable[Riddle]) -> Iterator[Riddle]:
+        """Skip the riddles that already have a result in this run."""
+        done_ids = self.done_riddle_ids()
+        if done_ids:
+            logger.info(f"Resuming run {self.run_id}, {len(done_ids)} riddles done")
+        return (riddle for riddle in riddles if riddle.riddle_id not in done_ids)
@@ -13,6 +13,11 @@ class Settings(pydantic.BaseSettings):
     board_gap: int = 5
     pair_gap: int = 1
     default_topk: int = 1
+    solution_cache_max_mb: int = 512
+    # record the peak of Python allocations per riddle, slows agents down
+    trace_memory: bool = False
+    # write a Chrome trace of `arc eval` runs here, see arc.tracing
+    trace_path: Optional[str] = None
 
 
 settings = Settings()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+On-disk cache of agent solutions.
+
+A solution is keyed by the agent's fingerprint, the riddle's content hash and
+the TaskData, so a changed riddle or agent config is simply a miss. Entries are
+small JSON files in the cache directory (``solutions/``), using the compact
+report encoding. Reading an entry refreshes its mtime, and once the cache
+outgrows its size limit the least recently used entries are deleted.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from arc.interface import HintsAccessed, Riddle, RiddleSolution, TaskData
+from arc.report import decode_solution, encode_solution
+from arc.settings import settings
+from arc.utils import cache
+
+SOLUTION_CACHE_VERSION = 1
+# fraction of the size limit that eviction shrinks the cache to
+EVICT_TO_RATIO = 0.8
+
+
+class SolutionCache:
+    def __init__(
+        self, cache_dir: Optional[os.PathLike] = None, max_mb: Optional[int] = None
+    ):
+        self.cache_dir = Path(cache_dir or cache.get_cache_dir("solutions"))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if max_mb is None:
+            max_mb = settings.solution_cache_max_mb
+        self.max_bytes = max_mb * 2**20
+        self._size: Optional[int] = None
+
+    def __getstate__(self):
+        # sizes are estimated per process
+        return {**self.__dict__, "_size": None}
+
+    def key(self, agent_fingerprint: str, riddle: Riddle, task_data: TaskData) -> str:
+        key = json.dumps(
+            [
+                SOLUTION_CACHE_VERSION,
+                agent_fingerprint,
+                riddle.content_hash,
+                task_data.dict(),
+            ],
+            sort_keys=True,
+        )
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[tuple[RiddleSolution, HintsAccessed]]:
+        path = self._path(key)
+        try:
+            data = json.loads(path.read_text())
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f"Ignoring corrupt cached solution {path}")
+            return None
+        return decode_solution(data["solution"]), set(data["hints_accessed"])
+
+    def put(self, key: str, solution: RiddleSolution, hints_accessed: HintsAccessed):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        content = json.dumps(
+            {
+                "solution": encode_solution(solution),
+                "hints_accessed": sorted(hints_accessed),
+            }
+        )
+        try:
+            replaced_size = path.stat().st_size
+        except FileNotFoundError:
+            replaced_size = 0
+        with cache.atomic_write(path) as f:
+            f.write(content)
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += len(content) - replaced_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self) -> list[os.DirEntry]:
+        return [
+            entry
+            for subdir in os.scandir(self.cache_dir)
+            if subdir.is_dir()
+            for entry in os.scandir(subdir.path)
+            if entry.name.endswith(".json")
+        ]
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache is small enough."""
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime_ns)
+        size = sum(entry.stat().st_size for entry in entries)
+        target = self.max_bytes * EVICT_TO_RATIO
+        num_evicted = 0
+        for entry in entries:
+            if size <= target:
+                break
+            size -= entry.stat().st_size
+            # another process may have evicted it already
+            Path(entry.path).unlink(missing_ok=True)
+            num_evicted += 1
+        logger.debug(f"Evicted {num_evicted} cached solutions")
+        self._size = size
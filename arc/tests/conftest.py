@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import http.server
+import threading
+from pathlib import Path
+
+import pytest
+
+from arc.settings import settings
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_datadir(tmp_path_factory):
+    settings.dataset_dir = str(Path(__file__).parent / "test_data")
+    settings.cache_path = str(tmp_path_factory.mktemp("cache"))
+
+
+class _StandInServer(http.server.ThreadingHTTPServer):
+    """Local stand-in for a remote HTTP service."""
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+@pytest.fixture
+def serve():
+    """
+    Start stand-in servers for the test, ``serve(handler_class, **state)``.
+
+    The state becomes attributes of the server, which handlers reach through
+    ``self.server``.
+    """
+    servers = []
+
+    def _serve(handler_class: type, **state) -> _StandInServer:
+        server = _StandInServer(("127.0.0.1", 0), handler_class)
+        vars(server).update(state)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield _serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import shutil
+
+import pytest
+
+from arc.interface import Riddle
+from arc.utils import dataset, features
+
+
+def test_packed_roundtrip(tmp_path):
+    subdirs = ["training", "evaluation"]
+    packed_path = dataset.pack_dataset(subdirs, output_path=tmp_path / "t.arcpack")
+    packed = dataset.load_packed_dataset(packed_path)
+    assert packed.riddle_ids == dataset.get_riddle_ids(subdirs)
+    for riddle_id in packed.riddle_ids:
+        assert packed[riddle_id] == dataset.load_riddle_from_id(riddle_id)
+
+
+def test_loaders_use_packed_dataset(tmp_path, monkeypatch):
+    shutil.copytree(dataset.get_dataset_dir(), tmp_path / "dataset")
+    monkeypatch.setattr(dataset.settings, "dataset_dir", str(tmp_path / "dataset"))
+    monkeypatch.setattr(dataset.settings, "cache_path", str(tmp_path / "cache"))
+    subdirs = ["training", "evaluation"]
+    expected = dataset.get_riddles(subdirs)
+    packed_path = dataset.pack_dataset(subdirs)
+    with dataset.open_packed_dataset(subdirs) as packed:
+        assert packed.path == packed_path
+    riddles = dataset.get_riddles(subdirs)
+    assert riddles == expected
+    # packed riddles are views into the mapped file
+    assert not riddles[0].train[0].input.np.flags.owndata
+    assert list(dataset.iter_riddles(subdirs, workers=2)) == expected
+    assert dataset.open_packed_dataset(["training"]) is None
+
+    # a packed file of an older dataset is ignored
+    changed = riddles[0].copy(update={"train": riddles[0].train[:1]})
+    riddle_path = tmp_path / "dataset" / changed.subdir / f"{changed.riddle_id}.json"
+    # written like editors and git do, into a new file that replaces the old
+    new_path = riddle_path.with_name("edited.tmp")
+    new_path.write_text(changed.json(include={"train", "test"}))
+    new_path.replace(riddle_path)
+    assert dataset.open_packed_dataset(subdirs) is None
+    assert dataset.get_riddles(subdirs)[0] == changed
+
+
+def test_pack_dataset_from_input_dir(tmp_path):
+    input_dir = tmp_path / "downloaded"
+    shutil.copytree(dataset.get_dataset_dir(), input_dir)
+    (input_dir / dataset.DOWNLOAD_MANIFEST_FN).write_text("{}")
+    packed_path = dataset.pack_dataset(
+        input_dir=input_dir, output_path=tmp_path / "t.arcpack"
+    )
+    packed = dataset.load_packed_dataset(packed_path)
+    assert packed.riddle_ids == dataset.get_riddle_ids(["all"])
+
+
+def test_riddle_index_updates_incrementally(tmp_path, monkeypatch):
+    source = dataset.get_riddle_paths(["training"])["t001"]
+    monkeypatch.setattr(dataset.settings, "dataset_dir", str(tmp_path))
+    (tmp_path / "training").mkdir()
+    (tmp_path / "training" / "a.json").write_text(source.read_text())
+    assert dataset.get_riddle_ids(["training"]) == ["a"]
+
+    (tmp_path / "training" / "b.json").write_text(source.read_text())
+    assert dataset.get_riddle_ids(["training"]) == ["a", "b"]
+    assert dataset.load_riddle_from_id("b").subdir == "training"
+    assert dataset.get_random_riddle_id(["training"]) in {"a", "b"}
+
+    (tmp_path / "training" / "a.json").unlink()
+    assert dataset.get_riddle_ids([]) == ["b"]
+
+
+def test_iter_riddles_parallel():
+    subdirs = ["training", "evaluation"]
+    expected = dataset.get_riddles(subdirs)
+    assert list(dataset.iter_riddles(subdirs, workers=2)) == expected
+    unordered = dataset.iter_riddles(
+        subdirs, workers=2, ordered=False, use_processes=False
+    )
+    assert sorted(r.riddle_id for r in unordered) == [r.riddle_id for r in expected]
+
+
+def test_lazy_riddle():
+    riddle = dataset.load_riddle_from_id("t001")
+    lazy = dataset.load_riddle_from_id("t001", lazy=True)
+    assert isinstance(lazy, Riddle) and not lazy.is_loaded
+    assert (lazy.num_train, lazy.num_test) == (riddle.num_train, riddle.num_test)
+    assert lazy.train_shapes == riddle.train_shapes
+    assert not lazy.is_loaded
+    assert lazy.test == riddle.test and lazy.is_loaded
+    assert lazy == riddle
+
+
+def test_feature_index_query():
+    subdirs = ["training", "evaluation"]
+    riddles = {r.riddle_id: r for r in dataset.get_riddles(subdirs)}
+    assert features.query_riddle_ids([], subdirs) == sorted(riddles)
+    same_shape = [
+        riddle_id
+        for riddle_id, riddle in sorted(riddles.items())
+        if all(i == o for i, o in riddle.train_shapes + riddle.test_shapes)
+    ]
+    assert features.query_riddle_ids(["same_shape"], subdirs) == same_shape
+    assert features.query_riddle_ids(["num_train >= 3", "input_colors has 1"]) == [
+        riddle_id
+        for riddle_id, riddle in sorted(riddles.items())
+        if riddle.subdir == "training"
+        and riddle.num_train >= 3
+        and any(1 in pair.input.unique_values for pair in riddle.train + riddle.test)
+    ]
+
+
+def test_feature_index_follows_dataset(tmp_path, monkeypatch):
+    shutil.copytree(dataset.get_dataset_dir(), tmp_path / "dataset")
+    monkeypatch.setattr(dataset.settings, "dataset_dir", str(tmp_path / "dataset"))
+    monkeypatch.setattr(dataset.settings, "cache_path", str(tmp_path / "cache"))
+    features_dir = dataset.cache.get_cache_dir("features")
+    feature_index = features.get_feature_index()
+    assert features.get_feature_index() is feature_index
+    (index_path,) = features_dir.glob("*.npz")
+
+    source = tmp_path / "dataset" / "training" / "t001.json"
+    shutil.copy(source, source.with_name("t003.json"))
+    assert "t003" in features.query_riddle_ids([], ["training"])
+    (new_index_path,) = features_dir.glob("*.npz")
+    assert new_index_path != index_path
+
+
+@pytest.mark.parametrize("archive_format", ["zip", "gztar", "tar"])
+def test_archive_dataset(tmp_path, monkeypatch, archive_format):
+    subdirs = ["training", "evaluation"]
+    expected = dataset.get_riddles(subdirs)
+    archive_path = shutil.make_archive(
+        str(tmp_path / "dataset"), archive_format, root_dir=dataset.get_dataset_dir()
+    )
+    monkeypatch.setattr(dataset.settings, "dataset_dir", archive_path)
+    assert dataset.get_riddle_ids(["evaluation"]) == ["e001"]
+    assert dataset.load_riddle_from_id("t002") == expected[-1]
+    assert list(dataset.iter_riddles(subdirs, workers=2)) == expected
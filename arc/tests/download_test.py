@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import collections
+import http.server
+import json
+
+import pytest
+import yaml
+
+from arc.utils import dataset
+
+
+class _GithubHandler(http.server.BaseHTTPRequestHandler):
+    """Serves contents-API listings and raw files like the default inventory."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests[self.path] += 1
+        if server.failures[self.path] > 0:
+            server.failures[self.path] -= 1
+            self.send_error(503)
+            return
+        _, kind, subdir, *name = self.path.split("/")
+        if kind == "contents":
+            body = json.dumps(
+                [
+                    {
+                        "name": filename,
+                        "sha": dataset.git_blob_sha(content),
+                        "size": len(content),
+                        "download_url": f"{server.url}/raw/{subdir}/{filename}",
+                    }
+                    for filename, content in server.files[subdir].items()
+                ]
+            ).encode()
+        else:
+            body = server.files[subdir][name[0]]
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def github(serve):
+    riddle = dataset.get_riddle_paths(["training"])["t001"].read_bytes()
+    return serve(
+        _GithubHandler,
+        files={
+            "training": {"a.json": riddle, "b.json": riddle + b"\n"},
+            "yk": {"c.json": riddle, "README.md": b"skip me"},
+        },
+        requests=collections.Counter(),
+        failures=collections.Counter(),
+    )
+
+
+def test_incremental_download(github, tmp_path):
+    inventory_path = tmp_path / "inventory.yaml"
+    inventory_path.write_text(
+        yaml.safe_dump(
+            {
+                "subsets": {
+                    subdir: {"github_api_url": f"{github.url}/contents/{subdir}"}
+                    for subdir in github.files
+                }
+            }
+        )
+    )
+    output_dir = tmp_path / "dataset"
+    github.failures["/raw/training/b.json"] = 1
+
+    dataset.download_arc_dataset(output_dir, inventory_path, concurrency=2)
+    for subdir, files in github.files.items():
+        for filename, content in files.items():
+            if filename.endswith(".json"):
+                assert (output_dir / subdir / filename).read_bytes() == content
+    assert github.requests["/raw/training/b.json"] == 2
+
+    github.requests.clear()
+    github.files["training"]["a.json"] += b"\n\n"
+    dataset.download_arc_dataset(output_dir, inventory_path, concurrency=2)
+    raw_requests = [path for path in github.requests if path.startswith("/raw/")]
+    assert raw_requests == ["/raw/training/a.json"]
+    assert (output_dir / "training" / "a.json").read_bytes().endswith(b"\n\n")
+
+    # updates are journaled and compacted into the manifest at the end
+    manifest_path = output_dir / dataset.DOWNLOAD_MANIFEST_FN
+    manifest = dataset.DownloadManifest(manifest_path)
+    assert not manifest.journal_path.exists()
+    assert manifest.entries["training/a.json"]["size"] == len(
+        github.files["training"]["a.json"]
+    )
+    manifest.update("training/a.json", sha="0" * 40, size=1)
+    with manifest.journal_path.open("a") as f:
+        f.write('{"key": "training/b.j')  # interrupted while appending
+    assert dataset.DownloadManifest(manifest_path).entries == manifest.entries
+    manifest.compact()
+    assert not manifest.journal_path.exists()
+    assert json.loads(manifest_path.read_text()) == manifest.entries
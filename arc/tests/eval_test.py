@@ -1,27 +1,39 @@
 #!/usr/bin/env python3
 
-from pathlib import Path
+import asyncio
+import http.server
+import json
+import os
+import threading
+import time
+import tracemalloc
+import urllib.request
 
+import numpy as np
 import pytest
 
 import arc.eval
-from arc import TaskData
-from arc.agents.dummy_agents import CheatingAgent
-from arc.metrics import get_default_metrics
+import arc.resources
+from arc import AsyncAgent, Board, BoardPair, Riddle, TaskData, profiling, tracing
+from arc.agents.dummy_agents import CheatingAgent, EchoAgent
+from arc.metrics import get_all_metrics, get_default_metrics
+from arc.report import Report
+from arc.runs import Run
 from arc.settings import settings
+from arc.solution_cache import SolutionCache
 from arc.utils import dataset
 
 
-@pytest.fixture(scope="session", autouse=True)
-def set_datadir():
-    settings.dataset_dir = str(Path(__file__).parent / "test_data")
-
-
 @pytest.fixture(scope="class")
 def riddle1():
     return dataset.load_riddle_from_id(dataset.get_riddle_ids()[0])
 
 
+@pytest.fixture(scope="class")
+def riddles():
+    return [dataset.load_riddle_from_id(i) for i in dataset.get_riddle_ids(["all"])]
+
+
 @pytest.fixture(scope="class")
 def task_data():
     return TaskData(topk=3)
@@ -41,3 +53,489 @@ def test_evaluate_agent_on_riddle(riddle1, task_data):
     report = arc.eval.evaluate_and_report(agent, [riddle1], task_data, metrics=metrics)
     assert report.metric_results["correct"].aggregate_result == 1.0
     assert "output" in report.eval_results.hints_accessed
+
+
+def test_compact_report(tmp_path, task_data):
+    riddles = [dataset.load_riddle_from_id(i) for i in dataset.get_riddle_ids()]
+    metrics = get_default_metrics()
+    report = arc.eval.evaluate_and_report(EchoAgent(), riddles, task_data, metrics)
+    path = tmp_path / "report.jsonl"
+    report.save_compact(path)
+    assert path.stat().st_size < len(report.json())
+
+    loaded = Report.load_compact(path)
+    assert loaded.metric_results == report.metric_results
+    results = loaded.eval_results.eval_results
+    assert [r.riddle_id for r in results] == dataset.get_riddle_ids()
+    assert "riddle" not in results[0].__dict__
+    for result, expected in zip(results, report.eval_results.eval_results):
+        assert result.solution == expected.solution
+        assert result.riddle == expected.riddle
+        assert result.hints_accessed == expected.hints_accessed
+    assert arc.eval.apply_metrics(loaded.eval_results, metrics) == loaded.metric_results
+    assert loaded.json() == report.json()
+
+
+class FailingAgent(EchoAgent):
+    def solve_test_sample(self, *args, **kwargs):
+        raise RuntimeError("cannot solve")
+
+
+@pytest.mark.parametrize("agent", ["arc.agents.dummy_agents:EchoAgent", FailingAgent()])
+def test_evaluate_in_processes(agent, task_data, riddles):
+    serial = arc.eval.evaluate_agent_on_riddles(EchoAgent(), riddles, task_data)
+    parallel = arc.eval.evaluate_agent_on_riddles(
+        agent, riddles, task_data, workers=2, chunksize=1
+    )
+    for expected, result in zip(serial.eval_results, parallel.eval_results):
+        assert result.riddle is expected.riddle
+        if result.error is None:
+            assert result.solution == expected.solution
+        else:
+            assert "cannot solve" in result.error
+            assert get_default_metrics()[1].compute(result) == 0.0
+    num_failed = sum(r.error is not None for r in parallel.eval_results)
+    assert num_failed == (0 if isinstance(agent, str) else len(riddles))
+
+
+@pytest.mark.parametrize("limits", [{}, {"max_riddles_per_worker": 100}])
+def test_evaluate_in_processes_streams_riddles(limits, task_data, riddles):
+    num_pulled = []
+    pulled_at_result = []
+
+    def _stream():
+        for riddle in riddles * 10:
+            num_pulled.append(1)
+            yield riddle
+
+    arc.eval.evaluate_agent_on_riddles(
+        EchoAgent(),
+        _stream(),
+        task_data,
+        workers=2,
+        on_result=lambda _: pulled_at_result.append(len(num_pulled)),
+        **limits,
+    )
+    assert len(pulled_at_result) == len(riddles) * 10
+    assert pulled_at_result[0] <= 2 * arc.eval.EVAL_PREFETCH_FACTOR + 1
+
+
+class _ModelServerHandler(http.server.BaseHTTPRequestHandler):
+    """Echoes the posted board after a delay, tracking concurrent requests."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(request["delay"])
+        with server.lock:
+            server.in_flight -= 1
+        body = json.dumps(request["board"]).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ModelServerAgent(AsyncAgent):
+    def __init__(self, url: str, delay: float):
+        self.url, self.delay = url, delay
+
+    async def solve_test_sample(self, task_data, hints, train, test, test_idx):
+        data = json.dumps({"board": test.np.tolist(), "delay": self.delay})
+        request = urllib.request.Request(self.url, data=data.encode())
+        response = await asyncio.to_thread(urllib.request.urlopen, request)
+        board = Board(__root__=json.loads(response.read()))
+        return [board] * task_data.topk
+
+
+@pytest.fixture
+def model_server(serve):
+    return serve(
+        _ModelServerHandler, lock=threading.Lock(), in_flight=0, max_in_flight=0
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("delay,timeout", [(0.1, None), (0.5, 0.1)])
+def test_evaluate_async_agent(
+    model_server, task_data, riddles, delay, timeout, workers
+):
+    agent = ModelServerAgent(model_server.url, delay=delay)
+    # two riddles at a time per worker
+    concurrency = 2 * workers
+    eval_results = arc.eval.evaluate_agent_on_riddles(
+        agent,
+        riddles,
+        task_data,
+        workers=workers,
+        concurrency=concurrency,
+        timeout=timeout,
+    ).eval_results
+    assert [r.riddle for r in eval_results] == riddles
+    if timeout is None:
+        assert 2 <= model_server.max_in_flight <= concurrency
+        for result, riddle in zip(eval_results, riddles):
+            assert result.error is None
+            assert np.array_equal(result.solution[0][0].np, riddle.test[0].input.np)
+    else:
+        assert all("Timed out" in result.error for result in eval_results)
+
+
+class CountingAgent(EchoAgent):
+    """Answers every test with the number of riddles this instance has seen."""
+
+    def __init__(self):
+        self.num_riddles = 0
+
+    def solve_riddle(self, task_data, hints, train, test):
+        self.num_riddles += 1
+        return [[Board(__root__=[[self.num_riddles]])] * task_data.topk for _ in test]
+
+
+class SleepingAgent(EchoAgent):
+    def solve_test_sample(self, *args, **kwargs):
+        time.sleep(60)
+
+
+class GreedyAgent(EchoAgent):
+    def solve_test_sample(self, *args, **kwargs):
+        return np.ones(2**33, dtype=np.uint8)
+
+
+class CrashingAgent(EchoAgent):
+    def solve_test_sample(self, *args, **kwargs):
+        os._exit(3)
+
+
+def _current_memory_mb() -> int:
+    with open("/proc/self/status") as f:
+        return int(f.read().split("VmSize:")[1].split()[0]) // 1024
+
+
+@pytest.mark.parametrize(
+    "agent,limits,error",
+    [
+        (CountingAgent(), {"max_riddles_per_worker": 2}, None),
+        (SleepingAgent(), {"timeout": 0.5}, "Timed out after 0.5s"),
+        (GreedyAgent(), {"memory_limit_mb": 1024}, "MemoryError"),
+        (CrashingAgent(), {}, "Worker died with exit code 3"),
+    ],
+)
+def test_evaluate_supervised(agent, limits, error, task_data, riddles):
+    if "memory_limit_mb" in limits:
+        limits["memory_limit_mb"] += _current_memory_mb()
+    limits.setdefault("max_riddles_per_worker", 100)
+    start = time.monotonic()
+    eval_results = arc.eval.evaluate_agent_on_riddles(
+        agent, riddles * 2, task_data, workers=2, **limits
+    ).eval_results
+    assert time.monotonic() - start < 10
+    if error is None:
+        # one of the two workers sees at least three riddles, unless replaced
+        counts = [result.solution[0][0].np.item() for result in eval_results]
+        assert max(counts) == 2
+    else:
+        assert all(error in result.error for result in eval_results)
+
+
+def test_resume_run(task_data, riddles):
+    run = Run.create("arc.agents.dummy_agents:EchoAgent", task_data, subdirs=["all"])
+    arc.eval.evaluate_and_report(EchoAgent(), riddles[:2], task_data, run=run)
+    with run.results_path.open("a") as f:
+        f.write('{"riddle_id": "t00')  # interrupted while appending
+
+    agent = CountingAgent()
+    report = arc.eval.evaluate_and_report(
+        agent, riddles, task_data, get_default_metrics(), run=Run.load(run.run_id)
+    )
+    assert agent.num_riddles == 1
+    results = report.eval_results.eval_results
+    assert [result.riddle for result in results] == riddles
+    assert report.metric_results["correct"].compute_results == [0.0, 0.0, 0.0]
+    assert run.done_riddle_ids() == {riddle.riddle_id for riddle in riddles}
+
+
+def test_solution_cache(tmp_path, task_data, riddles):
+    solution_cache = SolutionCache(tmp_path)
+    agent = CountingAgent()
+    fingerprint = agent.fingerprint()
+    assert fingerprint == CountingAgent().fingerprint()
+    assert fingerprint != EchoAgent().fingerprint()
+    assert fingerprint != ConfiguredAgent(1).fingerprint()
+    assert ConfiguredAgent(1).fingerprint() == ConfiguredAgent(1).fingerprint()
+    assert ConfiguredAgent(1).fingerprint() != ConfiguredAgent(2).fingerprint()
+    first = arc.eval.evaluate_agent_on_riddles(
+        agent, riddles, task_data, solution_cache=solution_cache
+    )
+    # the counter is state, not config, and stays out of the cache key
+    assert agent.fingerprint() == fingerprint
+    # the test riddles share their content and thus one cache entry
+    assert agent.num_riddles == 1
+    changed = riddles[1].copy(update={"test": riddles[1].train[:1]})
+    second = arc.eval.evaluate_agent_on_riddles(
+        agent,
+        [riddles[0], changed, riddles[2]],
+        task_data,
+        solution_cache=solution_cache,
+    )
+    # only the changed riddle is solved again, by the agent in its new state
+    assert agent.num_riddles == 2
+    solutions = [result.solution for result in second.eval_results]
+    assert solutions[0] == solutions[2] == first.eval_results[-1].solution
+    assert solutions[1][0][0].np.item() == 2
+
+    # the least recently used entry (the changed riddle's) is evicted once the
+    # cache is full
+    solution_cache.max_bytes = solution_cache.size() - 1
+    solution_cache.evict()
+    assert solution_cache.size() <= solution_cache.max_bytes * 0.8
+    solution_cache.max_bytes = 2**20
+    arc.eval.evaluate_agent_on_riddles(
+        agent, [*riddles, changed], task_data, solution_cache=solution_cache
+    )
+    assert agent.num_riddles == 3
+    # overwriting an entry does not grow the cache
+    size = solution_cache.size()
+    key = solution_cache.key(fingerprint, riddles[0], task_data)
+    solution_cache.put(key, *solution_cache.get(key))
+    assert solution_cache._size == solution_cache.size() == size
+
+    # workers get a copy of the agent that was fingerprinted
+    solution_cache = SolutionCache(tmp_path / "echo")
+    for _ in range(2):
+        eval_results = arc.eval.evaluate_agent_on_riddles(
+            "arc.agents.dummy_agents:EchoAgent",
+            riddles,
+            task_data,
+            workers=2,
+            solution_cache=solution_cache,
+        ).eval_results
+        assert [r.riddle for r in eval_results] == riddles
+    # cached results carry no resource usage
+    assert all(r.resource_usage is None for r in eval_results)
+
+
+class ConfiguredAgent(CountingAgent):
+    def __init__(self, offset: int):
+        super().__init__()
+        self.offset = offset
+
+    def cache_key(self):
+        return {"offset": self.offset}
+
+
+class StackingAgent(EchoAgent):
+    """Echoes the test inputs of a batch, stacked into one array."""
+
+    def __init__(self):
+        self.batches = []
+
+    def solve_riddles_batch(self, task_data, riddles_with_hints):
+        test_inputs = np.stack([item.test[0].np for item in riddles_with_hints])
+        self.batches.append(test_inputs[:, 0, 0].tolist())
+        for item, test_input in zip(riddles_with_hints, test_inputs):
+            if test_input[0, 0] == 1:
+                item.hints.board(0).output_shape
+        return [
+            [[Board(__root__=test_input)] * task_data.topk]
+            for test_input in test_inputs
+        ]
+
+
+def test_evaluate_batched(task_data):
+    riddles = [
+        Riddle(
+            train=[],
+            test=[BoardPair(input=[[idx] * size] * size, output=[[0]])],
+        )
+        for idx, size in enumerate([1, 2, 1, 2, 1])
+    ]
+    agent = StackingAgent()
+    assert agent.has_batch_solver() and not EchoAgent.has_batch_solver()
+    eval_results = arc.eval.evaluate_agent_on_riddles(
+        agent, riddles, task_data, batch_size=2
+    ).eval_results
+    assert agent.batches == [[0, 2], [1, 3], [4]]
+    assert [result.solution[0][0] for result in eval_results] == [
+        riddle.test[0].input for riddle in riddles
+    ]
+    assert [result.hints_accessed for result in eval_results] == [
+        set(),
+        {"output_shape"},
+        set(),
+        set(),
+        set(),
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_evaluate_streaming(task_data, riddles, workers):
+    metrics = get_all_metrics()
+    report = arc.eval.evaluate_and_report(CheatingAgent(), riddles, task_data, metrics)
+    run = Run.create("arc.agents.dummy_agents:CheatingAgent", task_data, ["all"])
+    scores = arc.eval.evaluate_streaming(
+        CheatingAgent(), iter(riddles), task_data, metrics, workers=workers, run=run
+    )
+    assert run.done_riddle_ids() == {riddle.riddle_id for riddle in riddles}
+    assert scores.riddle_ids == [riddle.riddle_id for riddle in riddles]
+    assert scores.hints_accessed == {"output"}
+    for name, metric_result in report.metric_results.items():
+        streamed = scores.metric_results[name]
+        assert streamed.compute_results == metric_result.compute_results
+        assert streamed.aggregate_result == pytest.approx(
+            metric_result.aggregate_result
+        )
+    assert "Hints accessed: output" in scores.fmt_txt()
+    assert not arc.eval.evaluate_agent_on_riddles(
+        CheatingAgent(), iter(riddles), task_data, keep_results=False
+    ).eval_results
+
+
+def test_merge_sharded_reports(tmp_path, task_data):
+    riddle_ids = dataset.get_riddle_ids(["all"])
+    shards = [dataset.get_riddle_ids(["all"], shard=(i, 3)) for i in range(3)]
+    assert sorted(sum(shards, [])) == riddle_ids
+    assert shards[1] == [i for i in riddle_ids if dataset.in_shard(i, (1, 3))]
+
+    metrics = get_default_metrics()
+    full = arc.eval.evaluate_and_report(
+        EchoAgent(), dataset.iter_riddles(["all"]), task_data, metrics
+    )
+    paths = []
+    for i in range(3):
+        riddles = dataset.iter_riddles(["all"], shard=(i, 3))
+        report = arc.eval.evaluate_and_report(EchoAgent(), riddles, task_data, metrics)
+        report.shard = f"{i}/3"
+        paths.append(tmp_path / f"shard{i}.jsonl")
+        report.save_compact(paths[-1])
+
+    merged = arc.eval.merge_reports([Report.load_compact(p) for p in paths[::-1]])
+    for eval_result in [
+        *merged.eval_results.eval_results,
+        *full.eval_results.eval_results,
+    ]:
+        eval_result.resource_usage = None
+    assert merged.metric_results == full.metric_results
+    assert merged.eval_results == full.eval_results
+    duplicate = paths[next(i for i, shard in enumerate(shards) if shard)]
+    with pytest.raises(ValueError, match="several reports"):
+        arc.eval.merge_reports([Report.load_compact(p) for p in paths + [duplicate]])
+
+
+class MeteredAgent(EchoAgent):
+    """Echoes after allocating a MiB and counting a model call per test."""
+
+    def solve_test_sample(self, task_data, hints, train, test, test_idx):
+        arc.resources.count("model_calls")
+        buffer = bytearray(2**20)
+        del buffer
+        return super().solve_test_sample(task_data, hints, train, test, test_idx)
+
+
+def test_resource_usage(task_data, riddles, monkeypatch):
+    monkeypatch.setattr(settings, "trace_memory", True)
+    try:
+        report = arc.eval.evaluate_and_report(MeteredAgent(), riddles, task_data)
+    finally:
+        monkeypatch.undo()
+        tracemalloc.stop()
+    for eval_result in report.eval_results.eval_results:
+        usage = eval_result.resource_usage
+        assert usage.wall_time > 0 and usage.cpu_time >= 0
+        assert usage.traced_peak_bytes >= 2**20
+        assert usage.counters == {"model_calls": len(eval_result.riddle.test)}
+    assert report.riddles_per_second > 0
+    text = report.fmt_txt()
+    assert "Timing:" in text and "Slowest 3 riddles:" in text
+    assert f"Counters: model_calls={len(riddles)}" in text
+
+    eval_results = arc.eval.evaluate_agent_on_riddles(
+        MeteredAgent(), riddles, task_data, workers=2
+    ).eval_results
+    assert all(r.resource_usage.counters["model_calls"] == 1 for r in eval_results)
+    assert all(r.resource_usage.traced_peak_bytes is None for r in eval_results)
+
+
+class MemoryHungryAgent(EchoAgent):
+    """Raises the peak resident memory by 64 MiB on its second riddle."""
+
+    def __init__(self):
+        self.num_riddles = 0
+
+    def solve_riddle(self, task_data, hints, train, test):
+        self.num_riddles += 1
+        if self.num_riddles == 2:
+            with open("/proc/self/statm") as f:
+                rss_bytes = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            peak_bytes = arc.resources.max_rss_bytes()
+            np.ones(peak_bytes - rss_bytes + 2**26, dtype=np.uint8)
+        return super().solve_riddle(task_data, hints, train, test)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs procfs")
+def test_rss_growth(task_data, riddles):
+    eval_results = arc.eval.evaluate_agent_on_riddles(
+        MemoryHungryAgent(), riddles, task_data
+    ).eval_results
+    growth = {
+        r.riddle.riddle_id: r.resource_usage.rss_growth_bytes for r in eval_results
+    }
+    assert growth["t001"] >= 2**25
+    assert growth["e001"] < 2**25 and growth["t002"] < 2**25
+
+
+class TracedAgent(EchoAgent):
+    def solve_test_sample(self, task_data, hints, train, test, test_idx):
+        with tracing.span("echo", test_idx=test_idx):
+            return super().solve_test_sample(task_data, hints, train, test, test_idx)
+
+
+def test_tracing(tmp_path, task_data, riddles):
+    trace_path = tmp_path / "trace.json"
+    with tracing.tracing(trace_path):
+        report = arc.eval.evaluate_and_report(
+            TracedAgent(), riddles, task_data, get_default_metrics(), workers=2
+        )
+    assert not tracing.is_tracing()
+    assert isinstance(tracing.span("untraced"), tracing._NullSpan)
+
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    spans = [event for event in events if event["ph"] == "X"]
+    solve_spans = [span for span in spans if span["name"] == "solve_riddle"]
+    assert sorted(span["args"]["riddle_id"] for span in solve_spans) == [
+        riddle.riddle_id for riddle in riddles
+    ]
+    # spans of the worker processes are merged into the trace
+    assert {span["pid"] for span in solve_spans} != {os.getpid()}
+    assert sum(span["name"] == "echo" for span in spans) == len(riddles)
+    metric_spans = [span for span in spans if span["cat"] == "metric"]
+    assert [span["name"] for span in metric_spans] == ["score tests"]
+    assert all(span["dur"] >= 0 for span in spans)
+    assert not list(tmp_path.glob("*.part"))
+    assert len(report.eval_results.eval_results) == len(riddles)
+
+
+def test_profiling(tmp_path, task_data, riddles):
+    run = Run.create("arc.agents.dummy_agents:EchoAgent", task_data, subdirs=["all"])
+    profiling.start_profiling(tmp_path / "all")
+    try:
+        arc.eval.evaluate_and_report(EchoAgent(), riddles, task_data, run=run)
+    finally:
+        profiling.stop_profiling()
+    assert sorted(path.stem for path in (tmp_path / "all").iterdir()) == [
+        riddle.riddle_id for riddle in riddles
+    ]
+    stats = profiling.merge_profiles(tmp_path / "all", tmp_path / "all.pstats")
+    assert (tmp_path / "all.pstats").exists()
+    hot_functions = profiling.fmt_hot_functions(stats, num=5)
+    assert "solve_test_sample" in hot_functions and ".pstats" not in hot_functions
+
+    eval_results = arc.eval.profile_slowest_riddles(run, 2, tmp_path / "slowest")
+    assert len(eval_results) == 2 and len(list((tmp_path / "slowest").iterdir())) == 2
+    assert profiling.profile_dir() is None
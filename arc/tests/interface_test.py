@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pydantic
+import pytest
+from matplotlib import pyplot as plt
+
+from arc import RiddleBatch, image
+from arc.augmentations.functional import noise, spatial
+from arc.interface import BOARD_GAP_STR, Board, BoardPair, Riddle
+
+
+def test_board_storage():
+    board = Board(__root__=[[1, 2, 3], [3, 2, 1]])
+    assert board.np.dtype == np.uint8 and not board.np.flags.writeable
+    assert board.np is board.np
+    assert board.shape == (2, 3)
+    assert board.unique_values == {1, 2, 3}
+    assert board == Board(__root__=np.array([[1, 2, 3], [3, 2, 1]]))
+    assert board.content_hash == Board.parse_raw(board.json()).content_hash
+    assert board.content_hash != Board(__root__=[[1, 2], [3, 3], [2, 1]]).content_hash
+    pair = BoardPair(input=board, output=[[0]])
+    assert BoardPair.parse_raw(pair.json()) == pair
+
+
+@pytest.mark.parametrize("data", [[[1], [1, 2]], [[256]], [[-1]], []])
+def test_board_validation(data):
+    with pytest.raises(pydantic.ValidationError):
+        Board(__root__=data)
+
+
+def test_trusted_construction():
+    array = np.arange(6).reshape(2, 3)
+    board = Board.from_array_trusted(array)
+    assert board == Board(__root__=array) and not board.np.flags.writeable
+    pair = BoardPair.construct_fast(input=np.rot90(array), output=board)
+    assert pair == BoardPair(input=np.rot90(array), output=array)
+
+
+def test_riddle_batch():
+    riddles = [
+        Riddle(
+            train=[BoardPair(input=[[1, 2]], output=[[3], [4]])],
+            test=[BoardPair(input=[[5]], output=[[6, 7, 8]])],
+        ),
+        Riddle(train=[], test=[BoardPair(input=[[9]], output=[[9]])]),
+    ]
+    batch = RiddleBatch.from_riddles(riddles, with_test_outputs=False, pad_value=10)
+    assert batch.shape == (3, 2, 2)
+    assert batch.riddle_idx.tolist() == [0, 0, 1]
+    assert batch.is_test.tolist() == [False, True, True]
+    assert batch.output_shapes.tolist() == [[2, 1], [0, 0], [0, 0]]
+    assert batch.inputs[0].tolist() == [[1, 2], [10, 10]]
+    assert batch.input_mask[0].sum() == 2 and not batch.output_mask[1].any()
+
+    batch = riddles[0].to_batch()
+    buffer = batch._buffers["inputs"]
+    assert RiddleBatch.from_riddles(riddles[1:], out=batch) is batch
+    assert batch._buffers["inputs"] is buffer
+    assert batch.shape == (1, 1, 1) and batch.outputs[0, 0, 0] == 9
+
+    hidden = Riddle(train=[], test=[BoardPair(input=[[5]], output=[[6, 7, 8]] * 2)])
+    batch = RiddleBatch.from_riddles([hidden], with_test_outputs=False)
+    assert batch.shape == (1, 1, 1)
+    assert RiddleBatch.from_riddles([hidden]).shape == (1, 2, 3)
+
+
+def test_render():
+    pair = BoardPair(input=[[1, 2], [3, 4]], output=[[5]])
+    assert pair.fmt() == f" 1  2 {BOARD_GAP_STR} 5 \n 3  4 {BOARD_GAP_STR}   "
+    assert pair.fmt(with_output=False) == pair.input.fmt() == " 1  2 \n 3  4 "
+    assert pair.input.fmt_cell(1, 0) == " 3 "
+
+
+def test_image_export(tmp_path):
+    riddle = Riddle(
+        train=[BoardPair(input=[[1, 2]], output=[[3]])],
+        test=[BoardPair(input=[[4]], output=[[5]])],
+    )
+    path = tmp_path / "riddle.png"
+    image.save_riddle_image(riddle, path, scale=2, with_test_outputs=True)
+    decoded = (plt.imread(path) * 255).round().astype(np.uint8)
+    assert decoded.shape == (2 * (1 + 1 + 1 + 1 + 1), 2 * (1 + 2 + 1 + 1 + 1), 3)
+    assert (decoded[2:4, 2:6] == image.board_to_rgb(np.array([[1, 2]]), 2)).all()
+    assert (decoded[6:8, 8:10] == image.palette()[5]).all()
+
+
+def test_augmentation_boards():
+    board = Board(__root__=[[1, 2], [3, 4]])
+    pair = noise.noiseInput(BoardPair(input=board, output=board), 1.0, (1, 1), 9)
+    assert pair.input.np.dtype == np.uint8
+    assert pair.input.unique_values <= {1, 2, 3, 4, 9}
+    doubled = spatial.doubleBoard(board, 1, is_horizontal_cat=True)
+    assert doubled == Board(__root__=[[1, 2, 0, 1, 2], [3, 4, 0, 3, 4]])
+    with pytest.raises(pydantic.ValidationError):
+        spatial.cropBoard(board.np, 2, 0, 1, 1)
+    with pytest.raises(pydantic.ValidationError):
+        spatial.superResolutionBoard(board, 0, spatial.Direction.both)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+
+from arc import Board, BoardPair, Riddle, TaskData
+from arc.interface import EvalResult
+from arc.metric_engine import score_tests
+from arc.metrics import CorrectMetric, get_all_metrics
+
+
+def _candidates(output: np.ndarray, rng: np.random.Generator) -> dict:
+    wrong = (output + 1) % 10
+    return {
+        "wrong_shape": [np.zeros((4, 4)), [[1, 2]], np.zeros((9, 1))],
+        "partial": [np.where(rng.random(output.shape) < 0.3, wrong, output)] * 3,
+        "rank_2": [wrong, output, output],
+        "rank_1": [output] * 3,
+    }
+
+
+def test_metric_engine_matches_compute():
+    rng = np.random.default_rng(0)
+    task_data = TaskData(topk=3)
+    outputs = [rng.integers(0, 10, size=shape) for shape in [(3, 3), (2, 4), (1, 1)]]
+    riddle = Riddle(
+        train=[], test=[BoardPair(input=[[0]], output=output) for output in outputs]
+    )
+    candidates = [_candidates(output, rng) for output in outputs]
+
+    def _eval_result(riddle: Riddle, kinds: list[str]) -> EvalResult:
+        solution = [
+            [Board(__root__=board) for board in candidates[idx][kind]]
+            for idx, kind in enumerate(kinds)
+        ]
+        return EvalResult(riddle=riddle, task_data=task_data, solution=solution)
+
+    eval_results = [
+        _eval_result(riddle, ["rank_2", "rank_1", "rank_2"]),
+        _eval_result(riddle, ["partial", "rank_2", "wrong_shape"]),
+        _eval_result(riddle, ["rank_1", "partial", "partial"]),
+        EvalResult.from_error(riddle=riddle, task_data=task_data, error="failed"),
+        _eval_result(riddle.copy(update={"test": riddle.test[:1]}), ["rank_1"]),
+    ]
+    test_scores = score_tests(eval_results)
+    assert test_scores.result_starts.tolist() == [0, 3, 6, 9, 12]
+    for metric in get_all_metrics():
+        computed = [metric.compute(eval_result) for eval_result in eval_results]
+        assert metric.compute_all(eval_results, test_scores) == computed
+    assert test_scores.min_over_tests("correct") == [1.0, 0.0, 0.0, 0.0, 1.0]
+    assert test_scores.min_over_tests("inverse_rank") == [0.5, 0.0, 0.0, 0.0, 1.0]
+
+    no_tests = riddle.copy(update={"test": []})
+    with pytest.raises(ValueError):
+        score_tests([EvalResult.construct_fast(no_tests, task_data, [])])
+
+
+def test_metric_engine_empty_boards():
+    task_data = TaskData(topk=2)
+    # Board validates [[]] to shape (1, 0)
+    riddle = Riddle(
+        train=[],
+        test=[
+            BoardPair(input=[[0]], output=[[]]),
+            BoardPair(input=[[0]], output=[[1]]),
+        ],
+    )
+
+    def _eval_result(*solution: list) -> EvalResult:
+        return EvalResult(
+            riddle=riddle,
+            task_data=task_data,
+            solution=[[Board(__root__=board) for board in topk] for topk in solution],
+        )
+
+    eval_results = [
+        _eval_result([[[]], [[2]]], [[[1]], [[2]]]),
+        _eval_result([[[3]], [[2]]], [[[2]], [[1]]]),
+    ]
+    test_scores = score_tests(eval_results)
+    assert test_scores.correct.tolist() == [1.0, 1.0, 0.0, 1.0]
+    assert test_scores.correct_pixels.tolist() == [1.0, 1.0, 0.0, 1.0]
+    assert test_scores.inverse_rank.tolist() == [1.0, 1.0, 0.0, 0.5]
+    for metric in get_all_metrics():
+        computed = [metric.compute(eval_result) for eval_result in eval_results]
+        assert metric.compute_all(eval_results, test_scores) == computed
+
+
+def test_metric_subclass_overriding_compute():
+    class AlwaysCorrect(CorrectMetric):
+        def _compute(self, eval_result: EvalResult) -> float:
+            return 1.0
+
+    riddle = Riddle(train=[], test=[BoardPair(input=[[0]], output=[[1]])])
+    task_data = TaskData(topk=1)
+    eval_results = [
+        EvalResult(
+            riddle=riddle, task_data=task_data, solution=[[Board(__root__=[[2]])]]
+        )
+    ]
+    test_scores = score_tests(eval_results)
+    assert CorrectMetric().compute_all(eval_results, test_scores) == [0.0]
+    assert AlwaysCorrect().compute_all(eval_results, test_scores) == [1.0]
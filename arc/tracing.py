@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+"""
+Timeline tracing of evaluation runs.
+
+Spans are written as a Chrome trace (JSON of ``traceEvents``), which can be
+opened in Perfetto (https://ui.perfetto.dev) or ``chrome://tracing``. Tracing
+is off unless started with ``start_tracing`` (or ``arc eval --trace``), and a
+disabled ``span`` costs a global lookup. Agents can add their own spans::
+
+    from arc import tracing
+
+    with tracing.span("forward pass", batch=len(boards)):
+        ...
+
+Worker processes started by the evaluator write their spans to
+``<path>.<pid>.part`` files, which ``stop_tracing`` merges into the trace.
+"""
+
+import asyncio
+import contextlib
+import functools as fct
+import json
+import multiprocessing.util
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+# events a worker buffers before appending them to its part file
+WORKER_FLUSH_EVENTS = 1000
+
+
+class Tracer:
+    def __init__(self, path: Path, is_worker: bool = False):
+        self.path = path
+        self.is_worker = is_worker
+        self.pid = os.getpid()
+        self.events: list[dict] = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self.pid,
+                "args": {"name": f"{'worker' if is_worker else 'main'} {self.pid}"},
+            }
+        ]
+        self._lock = threading.Lock()
+
+    @property
+    def part_path(self) -> Path:
+        return self.path.with_name(f"{self.path.name}.{self.pid}.part")
+
+    def add(self, event: dict):
+        event["pid"] = self.pid
+        with self._lock:
+            self.events.append(event)
+            if self.is_worker and len(self.events) >= WORKER_FLUSH_EVENTS:
+                self._flush()
+
+    def _flush(self):
+        with self.part_path.open("a") as f:
+            for event in self.events:
+                f.write(json.dumps(event) + "\n")
+        self.events = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def write(self):
+        """Write the trace file, including the spans of finished workers."""
+        events = list(self.events)
+        for part_path in sorted(self.path.parent.glob(f"{self.path.name}.*.part")):
+            with part_path.open() as f:
+                events.extend(json.loads(line) for line in f if line.strip())
+            part_path.unlink()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(
+            json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+        )
+
+
+_tracer: Optional[Tracer] = None
+
+
+def _forget_tracer():
+    # a forked child must not write the events it inherited
+    global _tracer
+    _tracer = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_tracer)
+
+
+def is_tracing() -> bool:
+    return _tracer is not None
+
+
+def trace_path() -> Optional[Path]:
+    return None if _tracer is None else _tracer.path
+
+
+def start_tracing(path: os.PathLike):
+    global _tracer
+    if _tracer is not None:
+        raise RuntimeError(f"Already tracing to {_tracer.path}")
+    path = Path(path).absolute()
+    for stale_part in path.parent.glob(f"{path.name}.*.part"):
+        stale_part.unlink()
+    _tracer = Tracer(path)
+
+
+def stop_tracing():
+    """Stop tracing and write the trace file."""
+    global _tracer
+    if _tracer is None:
+        return
+    tracer, _tracer = _tracer, None
+    tracer.write()
+
+
+@contextlib.contextmanager
+def tracing(path: os.PathLike) -> Iterator[None]:
+    start_tracing(path)
+    try:
+        yield
+    finally:
+        stop_tracing()
+
+
+def init_worker(path: Optional[Path]):
+    """Trace a worker process into the trace of its parent, if it traces."""
+    global _tracer
+    if path is None or (_tracer is not None and _tracer.pid == os.getpid()):
+        return
+    _tracer = Tracer(path, is_worker=True)
+    # runs when a multiprocessing worker exits, unlike atexit after a fork
+    multiprocessing.util.Finalize(_tracer, _tracer.flush, exitpriority=10)
+
+
+def _now_us() -> float:
+    # CLOCK_MONOTONIC on Linux, shared by the processes of a machine
+    return time.perf_counter_ns() / 1000
+
+
+def _thread_id() -> int:
+    # concurrent riddles of an event loop get a row each
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return threading.get_ident()
+    task = asyncio.current_task()
+    return threading.get_ident() if task is None else id(task)
+
+
+class _Span:
+    def __init__(self, tracer: Tracer, name: str, category: str, args: dict):
+        self.tracer = tracer
+        self.event = {"name": name, "cat": category, "ph": "X", "args": args}
+
+    def __enter__(self) -> "_Span":
+        self.event["tid"] = _thread_id()
+        self.event["ts"] = _now_us()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.event["dur"] = _now_us() - self.event["ts"]
+        self.tracer.add(self.event)
+
+
+class _NullSpan:
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, category: str = "agent", **args):
+    """
+    Context manager that records its duration as a span of the trace.
+
+    :param name: Shown on the span.
+    :param category: Allows to filter spans in the trace viewer.
+    :param args: JSON-serializable details shown for the span.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, category, args)
+
+
+def traced(name: Optional[str] = None, category: str = "agent") -> Callable:
+    """Decorator that records every call of a function as a span."""
+
+    def _decorator(f: Callable) -> Callable:
+        span_name = name or f.__qualname__
+
+        @fct.wraps(f)
+        def _traced_f(*args, **kwargs):
+            if _tracer is None:
+                return f(*args, **kwargs)
+            with _Span(_tracer, span_name, category, {}):
+                return f(*args, **kwargs)
+
+        return _traced_f
+
+    return _decorator
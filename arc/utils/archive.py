@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+"""
+Riddles stored in zip or tar archives.
+
+A dataset archive is read in place, nothing is extracted to disk. The member
+index (riddle id to member name) is cached in the cache directory and reused
+as long as the archive's mtime and size are unchanged. Zip and uncompressed
+tar archives are read with random access. Compressed tar archives cannot be
+seeked efficiently, so their riddle members are decompressed into memory in
+one sequential pass on first read.
+"""
+
+import hashlib
+import json
+import os
+import tarfile
+import threading
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+from arc.utils import cache, index
+
+ARCHIVE_INDEX_VERSION = 1
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+def is_archive(path: os.PathLike) -> bool:
+    return str(path).endswith(ARCHIVE_SUFFIXES)
+
+
+class ArchiveMember(NamedTuple):
+    """Path-like reference to a riddle file inside an archive."""
+
+    archive: str
+    name: str
+
+    @property
+    def stem(self) -> str:
+        return PurePosixPath(self.name).stem
+
+    @property
+    def parent(self) -> PurePosixPath:
+        return PurePosixPath(self.name).parent
+
+    def read_bytes(self) -> bytes:
+        return get_riddle_archive(self.archive).read(self.name)
+
+    def read_text(self, encoding: str = "utf-8") -> str:
+        return self.read_bytes().decode(encoding)
+
+    def __str__(self) -> str:
+        return f"{self.archive}!{self.name}"
+
+
+class RiddleArchive:
+    """Riddle-id index over an archive, with the same lookups as RiddleIndex."""
+
+    def __init__(self, archive_path: os.PathLike, index_path: os.PathLike):
+        self.archive_path = Path(archive_path)
+        self.index_path = Path(index_path)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._handle = None
+        self._contents: Optional[dict[str, bytes]] = None
+        self._subdir_ids: dict[str, list[str]] = {}
+        stat = self.archive_path.stat()
+        self._stat_key = [stat.st_mtime_ns, stat.st_size]
+        # riddle id -> (member name, data offset, size)
+        self.members: dict[str, tuple[str, int, int]] = self._load_members()
+        self._all_ids = sorted(self.members)
+
+    @property
+    def is_zip(self) -> bool:
+        return self.archive_path.suffix == ".zip"
+
+    @property
+    def is_seekable_tar(self) -> bool:
+        return self.archive_path.suffix == ".tar"
+
+    def _load_members(self) -> dict[str, tuple[str, int, int]]:
+        if self.index_path.exists():
+            try:
+                data = json.loads(self.index_path.read_text())
+                if (
+                    data.get("version") == ARCHIVE_INDEX_VERSION
+                    and data["stat"] == self._stat_key
+                ):
+                    return {k: tuple(v) for k, v in data["members"].items()}
+            except ValueError:
+                logger.warning(f"Ignoring corrupt archive index {self.index_path}")
+
+        logger.info(f"Indexing archive {self.archive_path}")
+        if self.is_zip:
+            with zipfile.ZipFile(self.archive_path) as zf:
+                infos = [
+                    (info.filename, -1, info.file_size)
+                    for info in zf.infolist()
+                    if not info.is_dir()
+                ]
+        else:
+            with tarfile.open(self.archive_path) as tf:
+                infos = [
+                    (info.name, info.offset_data, info.size)
+                    for info in tf
+                    if info.isfile()
+                ]
+        members = {}
+        for name, offset, size in sorted(infos):
+            if not index.is_riddle_file(PurePosixPath(name).name):
+                continue
+            riddle_id = PurePosixPath(name).stem
+            if riddle_id in members:
+                logger.warning(
+                    f"Duplicate riddle id {riddle_id} in {name}, "
+                    f"keeping {members[riddle_id][0]}"
+                )
+                continue
+            members[riddle_id] = (name, offset, size)
+
+        data = {
+            "version": ARCHIVE_INDEX_VERSION,
+            "archive": str(self.archive_path),
+            "stat": self._stat_key,
+            "members": members,
+        }
+        with cache.cache_lock(), cache.atomic_write(self.index_path) as f:
+            json.dump(data, f)
+        return members
+
+    def read(self, name: str) -> bytes:
+        if self._pid != os.getpid():
+            # never share file offsets with the process this one was forked from
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._handle = None
+        with self._lock:
+            if self.is_zip:
+                if self._handle is None:
+                    self._handle = zipfile.ZipFile(self.archive_path)
+                return self._handle.read(name)
+            if self.is_seekable_tar:
+                _, offset, size = self.members[PurePosixPath(name).stem]
+                if self._handle is None:
+                    self._handle = self.archive_path.open("rb")
+                self._handle.seek(offset)
+                return self._handle.read(size)
+            if self._contents is None:
+                self._contents = self._read_all_members()
+            return self._contents[name]
+
+    def _read_all_members(self) -> dict[str, bytes]:
+        names = {name for name, _, _ in self.members.values()}
+        contents = {}
+        with tarfile.open(self.archive_path, mode="r|*") as tf:
+            for info in tf:
+                if info.name in names:
+                    contents[info.name] = tf.extractfile(info).read()
+        return contents
+
+    def _member(self, riddle_id: str) -> ArchiveMember:
+        return ArchiveMember(str(self.archive_path), self.members[riddle_id][0])
+
+    def _ids_for_subdir(self, subdir: str) -> list[str]:
+        if subdir == "all":
+            return self._all_ids
+        if subdir not in self._subdir_ids:
+            pattern = f"/{subdir.strip('/')}/"
+            self._subdir_ids[subdir] = [
+                riddle_id
+                for riddle_id in self._all_ids
+                if pattern in f"/{self.members[riddle_id][0]}"
+            ]
+        return self._subdir_ids[subdir]
+
+    def fingerprint(self) -> str:
+        key = json.dumps([str(self.archive_path), *self._stat_key])
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def get_path(self, riddle_id: str) -> ArchiveMember:
+        if riddle_id not in self.members:
+            raise KeyError(f"Riddle {riddle_id} not found in {self.archive_path}")
+        return self._member(riddle_id)
+
+    def get_ids(self, subdirs: list[str]) -> list[str]:
+        if not subdirs or "all" in subdirs:
+            return list(self._all_ids)
+        return sorted(set().union(*(self._ids_for_subdir(sd) for sd in subdirs)))
+
+    def get_paths(self, subdirs: list[str]) -> dict[str, ArchiveMember]:
+        return {
+            riddle_id: self._member(riddle_id) for riddle_id in self.get_ids(subdirs)
+        }
+
+    def get_random_id(self, subdirs: list[str]) -> str:
+        id_lists = [self._ids_for_subdir(sd) for sd in subdirs or ["all"]]
+        if not any(id_lists):
+            raise ValueError(f"No riddles found in {subdirs=}")
+        return index.sample_id(id_lists)
+
+
+_ARCHIVES: dict[str, RiddleArchive] = {}
+
+
+def get_riddle_archive(archive_path: os.PathLike) -> RiddleArchive:
+    archive_path = Path(archive_path)
+    stat = archive_path.stat()
+    archive = _ARCHIVES.get(str(archive_path))
+    if archive is None or archive._stat_key != [stat.st_mtime_ns, stat.st_size]:
+        key = hashlib.sha1(str(archive_path.resolve()).encode()).hexdigest()[:16]
+        index_path = cache.get_cache_dir("index") / f"archive-{key}.json"
+        archive = _ARCHIVES[str(archive_path)] = RiddleArchive(archive_path, index_path)
+    return archive
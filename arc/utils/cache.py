@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
+import contextlib
+import os
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import IO, Iterator, Optional
 
 import filelock
 
@@ -25,4 +28,35 @@ def get_cache_dir(subdir: Optional[str] = None) -> Path:
     return cache_dir
 
 
-cache_lock = filelock.FileLock(str(get_cache_dir() / "lock"))
+@contextlib.contextmanager
+def atomic_write(path: os.PathLike, mode: str = "w") -> Iterator[IO]:
+    """
+    Open a temporary file that replaces ``path`` once it is completely written.
+
+    Readers, also in other processes, see either the old or the new file. The
+    temporary file is hidden and removed if writing fails.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with tmp_path.open(mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+_cache_locks: dict[tuple[int, Path], filelock.FileLock] = {}
+
+
+def cache_lock() -> filelock.FileLock:
+    """
+    The lock of the cache directory, for writers of shared cache files.
+
+    Locks are created per process and cache directory: one inherited from the
+    parent of a worker must not be used, and tests move the cache around.
+    """
+    key = (os.getpid(), get_cache_dir())
+    if (lock := _cache_locks.get(key)) is None:
+        lock = _cache_locks.setdefault(key, filelock.FileLock(str(key[1] / "lock")))
+    return lock
@@ -1,31 +1,144 @@
 #!/usr/bin/env python3
 
-import itertools as itt
+import collections
+import functools
+import hashlib
 import json
 import os
-import random
+import threading
 from concurrent import futures
 from pathlib import Path
-from typing import Optional
+from typing import IO, Iterator, Optional, Union
 
 import requests
 import tqdm
 import yaml
 from loguru import logger
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from arc.interface import Riddle
+from arc import tracing
+from arc.interface import LazyRiddle, Riddle
 from arc.settings import settings
-from arc.utils import cache
+from arc.utils import archive, cache, index, packed, processes
 
 DEFAULT_INVENTORY_FN = "default_inventory.yaml"
+ITER_PREFETCH_FACTOR = 4
+DOWNLOAD_MANIFEST_FN = ".manifest.json"
+DOWNLOAD_CONCURRENCY = 8
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_BACKOFF_FACTOR = 0.5
+DOWNLOAD_TIMEOUT = 30
+
+
+def git_blob_sha(data: bytes) -> str:
+    """SHA the GitHub contents API reports for a file with the given content."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class DownloadManifest:
+    """
+    Records sha and size of every downloaded file, so unchanged files can be
+    skipped and interrupted downloads resumed.
+
+    Updates are appended to a journal of JSON lines next to the manifest,
+    ``compact`` merges them into the manifest once a download is done.
+    """
+
+    def __init__(self, path: os.PathLike):
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(f"{self.path.name}l")
+        self._lock = threading.Lock()
+        self._journal: Optional[IO] = None
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except ValueError:
+                logger.warning(f"Ignoring corrupt manifest {self.path}")
+        if self.journal_path.exists():
+            with self.journal_path.open() as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line of an interrupted run
+                        continue
+                    self.entries[record.pop("key")] = record
+
+    def is_up_to_date(self, key: str, file_path: Path, item: dict) -> bool:
+        if not file_path.is_file() or (sha := item.get("sha")) is None:
+            return False
+        size = file_path.stat().st_size
+        if self.entries.get(key) == {"sha": sha, "size": size}:
+            return item.get("size", size) == size
+        # no (matching) manifest entry, e.g. after an interrupted first run
+        if git_blob_sha(file_path.read_bytes()) == sha:
+            self.update(key, sha=sha, size=size)
+            return True
+        return False
+
+    def update(self, key: str, sha: Optional[str], size: int):
+        with self._lock:
+            self.entries[key] = {"sha": sha, "size": size}
+            if self._journal is None:
+                self._journal = self.journal_path.open("a")
+            self._journal.write(json.dumps({"key": key, "sha": sha, "size": size}))
+            self._journal.write("\n")
+            self._journal.flush()
+
+    def compact(self):
+        """Write all entries to the manifest and start a new journal."""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            elif not self.journal_path.exists():
+                return
+            with cache.atomic_write(self.path) as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            self.journal_path.unlink(missing_ok=True)
+
+
+def make_download_session(
+    concurrency: int = DOWNLOAD_CONCURRENCY, retries: int = DOWNLOAD_RETRIES
+) -> requests.Session:
+    retry = Retry(
+        total=retries,
+        backoff_factor=DOWNLOAD_BACKOFF_FACTOR,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _download_file(
+    session: requests.Session, url: str, file_path: Path, sha: Optional[str]
+) -> int:
+    response = session.get(url, timeout=DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+    content = response.content
+    if sha is not None and git_blob_sha(content) != sha:
+        raise ValueError(f"Checksum mismatch for {url}")
+    with cache.atomic_write(file_path, "wb") as f:
+        f.write(content)
+    return len(content)
 
 
 def download_arc_dataset(
     output_dir: Optional[os.PathLike] = None,
     inventory_path: Optional[os.PathLike] = None,
+    concurrency: int = DOWNLOAD_CONCURRENCY,
+    retries: int = DOWNLOAD_RETRIES,
 ):
     if output_dir is None:
-        output_dir = get_cached_dataset_dir()
+        output_dir = get_cached_dataset_dir(not_exist_ok=True)
     output_dir = Path(output_dir)
     if not output_dir.exists():
         output_dir.mkdir(parents=True)
@@ -48,29 +161,65 @@ def download_arc_dataset(
     with inventory_path.open() as f:
         inventory = yaml.safe_load(f)
 
-    for subdir, subdir_data in inventory["subsets"].items():
-        logger.info(f"Downloading {subdir} dataset")
-        subdir_path = output_dir / subdir
-        if not subdir_path.exists():
-            subdir_path.mkdir(parents=True)
-        elif not subdir_path.is_dir():
-            raise ValueError(f"{subdir_path} is not a directory")
+    manifest = DownloadManifest(output_dir / DOWNLOAD_MANIFEST_FN)
+    session = make_download_session(concurrency=concurrency, retries=retries)
+    failed = []
+    try:
+        for subdir, subdir_data in inventory["subsets"].items():
+            logger.info(f"Downloading {subdir} dataset")
+            subdir_path = output_dir / subdir
+            if not subdir_path.exists():
+                subdir_path.mkdir(parents=True)
+            elif not subdir_path.is_dir():
+                raise ValueError(f"{subdir_path} is not a directory")
 
-        url = subdir_data["github_api_url"]
-        items = requests.get(url).json()
+            url = subdir_data["github_api_url"]
+            response = session.get(url, timeout=DOWNLOAD_TIMEOUT)
+            response.raise_for_status()
+            items = response.json()
 
-        def _download_item(item):
-            if not (filename := item["name"]).endswith(".json"):
-                logger.warning(f"Skipping {filename}")
-                return
-            file_path = subdir_path / filename
-            logger.info(f"Downloading {file_path}")
-            with open(file_path, "wb") as f:
-                f.write(requests.get(item["download_url"]).content)
+            def _download_item(item) -> bool:
+                if not (filename := item["name"]).endswith(".json"):
+                    logger.warning(f"Skipping {filename}")
+                    return False
+                file_path = subdir_path / filename
+                key = f"{subdir}/{filename}"
+                if manifest.is_up_to_date(key, file_path, item):
+                    return False
+                logger.debug(f"Downloading {file_path}")
+                size = _download_file(
+                    session, item["download_url"], file_path, item.get("sha")
+                )
+                manifest.update(key, sha=item.get("sha"), size=size)
+                return True
+
+            num_downloaded = 0
+            with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+                item_futures = {
+                    executor.submit(_download_item, item): item for item in items
+                }
+                for future in tqdm.tqdm(
+                    futures.as_completed(item_futures), total=len(items)
+                ):
+                    try:
+                        num_downloaded += future.result()
+                    except Exception as e:
+                        logger.error(
+                            f"Failed to download {item_futures[future]['name']}"
+                        )
+                        failed.append((f"{subdir}/{item_futures[future]['name']}", e))
+            logger.info(
+                f"Downloaded {num_downloaded} files, "
+                f"{len(items) - num_downloaded} up to date or skipped"
+            )
+    finally:
+        manifest.compact()
 
-        with futures.ThreadPoolExecutor() as executor:
-            for _ in tqdm.tqdm(executor.map(_download_item, items), total=len(items)):
-                pass
+    if failed:
+        raise RuntimeError(
+            f"Failed to download {len(failed)} files (rerun to resume): "
+            + ", ".join(name for name, _ in failed)
+        )
 
 
 def get_cached_dataset_dir(not_exist_ok=False) -> Path:
@@ -87,50 +236,247 @@ def get_cached_dataset_dir(not_exist_ok=False) -> Path:
 
 
 def get_dataset_dir(subdir: Optional[str] = None) -> Path:
+    """
+    Get the dataset directory, or the dataset archive if settings.dataset_dir
+    points to a zip/tar archive (subdirs are then selected inside the archive).
+    """
     if settings.dataset_dir:
         dataset_dir = Path(settings.dataset_dir)
     else:
         dataset_dir = get_cached_dataset_dir()
+    if archive.is_archive(dataset_dir):
+        return dataset_dir
     if subdir and subdir != "all":
         dataset_dir = dataset_dir / subdir
     return dataset_dir
 
 
-def load_riddle_from_file(file_path: os.PathLike) -> Riddle:
-    file_path = Path(file_path)
-    json_data = json.loads(file_path.read_text())
-    riddle = Riddle(**json_data, riddle_id=file_path.stem, subdir=file_path.parent.name)
-    return riddle
+RiddlePath = Union[Path, archive.ArchiveMember]
+
+
+def _as_riddle_path(file_path: os.PathLike) -> RiddlePath:
+    if isinstance(file_path, archive.ArchiveMember):
+        return file_path
+    return Path(file_path)
+
 
+def read_riddle_json(file_path: os.PathLike) -> dict:
+    file_path = _as_riddle_path(file_path)
+    with tracing.span("parse json", "load", path=str(file_path)):
+        return json.loads(file_path.read_text())
 
-def get_riddle_paths(subdirs: list[str] = ["training"]) -> dict[str, Path]:
-    if not subdirs:
-        subdirs = ["all"]
-    return dict(
-        itt.chain.from_iterable(
-            ((s.stem, s) for s in get_dataset_dir(subdir=sd).rglob("*.json"))
-            for sd in subdirs
+
+def load_riddle_from_file(file_path: os.PathLike, lazy: bool = False) -> Riddle:
+    file_path = _as_riddle_path(file_path)
+    json_data = read_riddle_json(file_path)
+    with tracing.span("build riddle", "load", riddle_id=file_path.stem):
+        if lazy:
+            return LazyRiddle.from_raw(
+                json_data, riddle_id=file_path.stem, subdir=file_path.parent.name
+            )
+        return Riddle(
+            **json_data, riddle_id=file_path.stem, subdir=file_path.parent.name
         )
-    )
 
 
-def get_riddle_ids(subdirs: list[str] = ["training"]):
-    return list(sorted(get_riddle_paths(subdirs=subdirs).keys()))
+def get_riddle_index() -> Union[index.RiddleIndex, archive.RiddleArchive]:
+    dataset_dir = get_dataset_dir()
+    if archive.is_archive(dataset_dir):
+        return archive.get_riddle_archive(dataset_dir)
+    return index.get_riddle_index(dataset_dir)
+
+
+Shard = tuple[int, int]
+
+
+def parse_shard(shard: str) -> Shard:
+    """Parse ``"i/n"``, the i-th (counting from 0) of n shards."""
+    try:
+        index_str, count_str = shard.split("/")
+        shard_index, shard_count = int(index_str), int(count_str)
+    except ValueError:
+        raise ValueError(f"Expected a shard as 'i/n', got {shard!r}")
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index must be in [0, {shard_count}), got {shard!r}")
+    return shard_index, shard_count
 
 
-def get_riddles(subdirs: list[str] = ["training"]) -> list[Riddle]:
+def in_shard(riddle_id: str, shard: Shard) -> bool:
+    """Stable partition of riddle ids, independent of the other ids."""
+    shard_index, shard_count = shard
+    digest = hashlib.sha1(riddle_id.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count == shard_index
+
+
+def get_riddle_paths(
+    subdirs: list[str] = ["training"], shard: Optional[Shard] = None
+) -> dict[str, RiddlePath]:
+    paths = get_riddle_index().get_paths(subdirs=subdirs)
+    if shard is None:
+        return paths
+    return {k: v for k, v in paths.items() if in_shard(k, shard)}
+
+
+def get_riddle_ids(subdirs: list[str] = ["training"], shard: Optional[Shard] = None):
+    riddle_ids = get_riddle_index().get_ids(subdirs=subdirs)
+    if shard is None:
+        return riddle_ids
+    return [riddle_id for riddle_id in riddle_ids if in_shard(riddle_id, shard)]
+
+
+def get_riddles(subdirs: list[str] = ["training"], lazy: bool = False) -> list[Riddle]:
     logger.info(f"Loading riddles from {subdirs}")
+    if (packed_dataset := open_packed_dataset(subdirs)) is not None:
+        return list(packed_dataset)
     return [
-        load_riddle_from_file(riddle_path)
+        load_riddle_from_file(riddle_path, lazy=lazy)
         for riddle_path in get_riddle_paths(subdirs=subdirs).values()
     ]
 
 
+def iter_riddles(
+    subdirs: list[str] = ["training"],
+    workers: int = 1,
+    ordered: bool = True,
+    use_processes: bool = True,
+    lazy: bool = False,
+    shard: Optional[Shard] = None,
+) -> Iterator[Riddle]:
+    """
+    Lazily load riddles, parsing files in parallel with a bounded prefetch.
+
+    :param subdirs: Subdirs to load riddles from.
+    :param workers: Number of parallel loaders. With 1, files are parsed inline.
+    :param ordered: Yield riddles in id order, otherwise as soon as ready.
+    :param use_processes: Use a process pool instead of a thread pool.
+    :param lazy: Yield LazyRiddles that validate their boards on first access.
+    :param shard: Only yield the riddles of this ``(index, count)`` shard.
+    :return: Iterator over the riddles.
+    """
+    if (packed_dataset := open_packed_dataset(subdirs)) is not None:
+        with packed_dataset:
+            for riddle_id in packed_dataset.riddle_ids:
+                if shard is None or in_shard(riddle_id, shard):
+                    yield packed_dataset[riddle_id]
+        return
+
+    riddle_paths = list(get_riddle_paths(subdirs=subdirs, shard=shard).values())
+    logger.info(f"Streaming {len(riddle_paths)} riddles from {subdirs}")
+    load_riddle = functools.partial(load_riddle_from_file, lazy=lazy)
+    if workers <= 1:
+        yield from map(load_riddle, riddle_paths)
+        return
+
+    if use_processes:
+        executor = futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=processes.get_context(),
+            initializer=processes.init_worker,
+            initargs=processes.worker_initargs(),
+        )
+    else:
+        executor = futures.ThreadPoolExecutor(
+            max_workers=workers,
+            initializer=tracing.init_worker,
+            initargs=(tracing.trace_path(),),
+        )
+    remaining_paths = iter(riddle_paths)
+    pending = collections.deque()
+
+    def _submit():
+        if (riddle_path := next(remaining_paths, None)) is not None:
+            pending.append(executor.submit(load_riddle, riddle_path))
+
+    try:
+        for _ in range(workers * ITER_PREFETCH_FACTOR):
+            _submit()
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            _submit()
+            yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 def get_random_riddle_id(subdirs: list[str] = ["training"]):
-    return random.choice(get_riddle_ids(subdirs=subdirs))
+    return get_riddle_index().get_random_id(subdirs=subdirs)
+
+
+def load_riddle_from_id(riddle_id: str, lazy: bool = False) -> Riddle:
+    return load_riddle_from_file(get_riddle_index().get_path(riddle_id), lazy=lazy)
+
+
+def get_packed_dataset_path(subdirs: list[str] = ["training"]) -> Path:
+    name = "+".join(subdirs) if subdirs else "all"
+    return cache.get_cache_dir("packed") / f"{name}{packed.PACKED_SUFFIX}"
+
+
+def pack_dataset(
+    subdirs: list[str] = ["training"],
+    output_path: Optional[os.PathLike] = None,
+    input_dir: Optional[os.PathLike] = None,
+) -> Path:
+    if input_dir is not None:
+        input_dir = Path(input_dir)
+        if archive.is_archive(input_dir):
+            riddle_paths = list(
+                archive.get_riddle_archive(input_dir).get_paths(["all"]).values()
+            )
+        else:
+            riddle_paths = sorted(
+                (
+                    path
+                    for path in input_dir.rglob("*.json")
+                    if index.is_riddle_file(path.name)
+                ),
+                key=lambda p: p.stem,
+            )
+        if output_path is None:
+            output_path = cache.get_cache_dir("packed") / (
+                input_dir.name + packed.PACKED_SUFFIX
+            )
+        fingerprint = None
+    else:
+        riddle_index = get_riddle_index()
+        riddle_paths = list(riddle_index.get_paths(subdirs=subdirs).values())
+        fingerprint = riddle_index.fingerprint()
+        if output_path is None:
+            output_path = get_packed_dataset_path(subdirs=subdirs)
+    logger.info(f"Packing {len(riddle_paths)} riddles into {output_path}")
+    riddles = (load_riddle_from_file(path) for path in tqdm.tqdm(riddle_paths))
+    return packed.pack_riddles(riddles, output_path, fingerprint=fingerprint)
+
+
+def open_packed_dataset(
+    subdirs: list[str] = ["training"],
+) -> Optional[packed.PackedDataset]:
+    """
+    The packed file of ``subdirs`` (see ``pack_dataset``), if there is one that
+    was packed from the dataset as it is now.
+
+    ``get_riddles`` and ``iter_riddles`` load riddles from it instead of
+    parsing the riddle files.
+    """
+    path = get_packed_dataset_path(subdirs=subdirs)
+    if not path.is_file():
+        return None
+    packed_dataset = packed.PackedDataset(path)
+    if packed_dataset.fingerprint != get_riddle_index().fingerprint():
+        logger.info(f"Ignoring {path}, the dataset changed since it was packed")
+        packed_dataset.close()
+        return None
+    logger.info(f"Loading riddles from {path}")
+    return packed_dataset
 
 
-def load_riddle_from_id(riddle_id: str) -> Riddle:
-    riddles = get_riddle_paths(subdirs=[])
-    riddle_path = riddles[riddle_id]
-    return load_riddle_from_file(riddle_path)
+def load_packed_dataset(
+    path: Optional[os.PathLike] = None, subdirs: list[str] = ["training"]
+) -> packed.PackedDataset:
+    if path is None:
+        path = get_packed_dataset_path(subdirs=subdirs)
+    return packed.PackedDataset(path)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+"""
+Precomputed riddle features for fast filtering.
+
+The feature index holds one NumPy array per feature with one entry per riddle
+of the dataset. It is built once per dataset state and stored in the cache
+directory, replacing the index of the previous state, so filtering is a
+vectorized mask instead of a loop over parsed riddles.
+
+Conditions are strings of the form ``"<feature> <op> <value>"``, e.g.
+``"num_train>=3"``, ``"subdir==evaluation"`` or ``"input_colors has 1,2"``.
+A bare feature name (``"same_shape"``) selects riddles where it is non-zero,
+``"not same_shape"`` the opposite.
+"""
+
+import hashlib
+import operator
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from arc.utils import cache, dataset
+
+FEATURE_INDEX_VERSION = 1
+
+FEATURE_DESCRIPTIONS = {
+    "riddle_id": "id of the riddle",
+    "subdir": "name of the directory containing the riddle",
+    "num_train": "number of train pairs",
+    "num_test": "number of test pairs",
+    "min_input_rows": "smallest number of rows of any input board",
+    "max_input_rows": "largest number of rows of any input board",
+    "min_input_cols": "smallest number of columns of any input board",
+    "max_input_cols": "largest number of columns of any input board",
+    "min_output_rows": "smallest number of rows of any output board",
+    "max_output_rows": "largest number of rows of any output board",
+    "min_output_cols": "smallest number of columns of any output board",
+    "max_output_cols": "largest number of columns of any output board",
+    "same_shape": "whether all outputs have the shape of their input",
+    "input_colors": "bitmask of the colors used in the input boards",
+    "output_colors": "bitmask of the colors used in the output boards",
+    "num_input_colors": "number of colors used in the input boards",
+    "num_output_colors": "number of colors used in the output boards",
+    "min_size_ratio": "smallest output/input cell count ratio of any pair",
+    "max_size_ratio": "largest output/input cell count ratio of any pair",
+}
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "<": operator.lt,
+    ">": operator.gt,
+}
+_CONDITION_RE = re.compile(r"^\s*(\w+)\s*(==|!=|<=|>=|<|>|\s+has\s+)\s*(\S+)\s*$")
+_BARE_CONDITION_RE = re.compile(r"^\s*(not\s+)?(\w+)\s*$")
+
+
+def _colors_mask(board: np.ndarray) -> int:
+    mask = 0
+    for color in np.unique(board).tolist():
+        mask |= 1 << color
+    return mask
+
+
+def _riddle_features(json_data: dict) -> dict:
+    pairs = [*json_data["train"], *json_data["test"]]
+    inputs = [np.asarray(pair["input"], dtype=np.uint8) for pair in pairs]
+    outputs = [np.asarray(pair["output"], dtype=np.uint8) for pair in pairs]
+    input_colors = output_colors = 0
+    for board in inputs:
+        input_colors |= _colors_mask(board)
+    for board in outputs:
+        output_colors |= _colors_mask(board)
+    size_ratios = [out.size / max(inp.size, 1) for inp, out in zip(inputs, outputs)]
+    return {
+        "num_train": len(json_data["train"]),
+        "num_test": len(json_data["test"]),
+        "min_input_rows": min(b.shape[0] for b in inputs),
+        "max_input_rows": max(b.shape[0] for b in inputs),
+        "min_input_cols": min(b.shape[1] for b in inputs),
+        "max_input_cols": max(b.shape[1] for b in inputs),
+        "min_output_rows": min(b.shape[0] for b in outputs),
+        "max_output_rows": max(b.shape[0] for b in outputs),
+        "min_output_cols": min(b.shape[1] for b in outputs),
+        "max_output_cols": max(b.shape[1] for b in outputs),
+        "same_shape": all(i.shape == o.shape for i, o in zip(inputs, outputs)),
+        "input_colors": input_colors,
+        "output_colors": output_colors,
+        "num_input_colors": bin(input_colors).count("1"),
+        "num_output_colors": bin(output_colors).count("1"),
+        "min_size_ratio": min(size_ratios),
+        "max_size_ratio": max(size_ratios),
+    }
+
+
+_FEATURE_DTYPES = {
+    "same_shape": np.bool_,
+    "input_colors": np.uint16,
+    "output_colors": np.uint16,
+    "min_size_ratio": np.float32,
+    "max_size_ratio": np.float32,
+}
+
+
+class FeatureIndex:
+    def __init__(self, features: dict[str, np.ndarray]):
+        self.features = features
+
+    def __len__(self) -> int:
+        return len(self.features["riddle_id"])
+
+    @property
+    def riddle_ids(self) -> np.ndarray:
+        return self.features["riddle_id"]
+
+    @classmethod
+    def build(cls, riddle_paths: dict) -> "FeatureIndex":
+        logger.info(f"Building feature index for {len(riddle_paths)} riddles")
+        rows = [
+            _riddle_features(dataset.read_riddle_json(riddle_path))
+            for riddle_path in riddle_paths.values()
+        ]
+        features = {
+            "riddle_id": np.array(list(riddle_paths), dtype=np.str_),
+            "subdir": np.array(
+                [riddle_path.parent.name for riddle_path in riddle_paths.values()],
+                dtype=np.str_,
+            ),
+        }
+        for name in FEATURE_DESCRIPTIONS:
+            if name not in features:
+                features[name] = np.array(
+                    [row[name] for row in rows],
+                    dtype=_FEATURE_DTYPES.get(name, np.int16),
+                )
+        return cls(features)
+
+    def _condition_mask(self, condition: str) -> np.ndarray:
+        if match := _BARE_CONDITION_RE.match(condition):
+            negate, name = match.groups()
+            mask = self._feature(name) != 0
+            return ~mask if negate else mask
+        if not (match := _CONDITION_RE.match(condition)):
+            raise ValueError(f"Cannot parse condition {condition!r}")
+        name, op, value = match.groups()
+        values = self._feature(name)
+        if op.strip() == "has":
+            colors_mask = sum(1 << int(color) for color in value.split(","))
+            return (values & colors_mask) == colors_mask
+        if values.dtype.kind != "U":
+            value = float(value)
+        return _OPERATORS[op](values, value)
+
+    def _feature(self, name: str) -> np.ndarray:
+        if name not in self.features:
+            raise ValueError(
+                f"Unknown feature {name!r}, choose from {sorted(self.features)}"
+            )
+        return self.features[name]
+
+    def mask(
+        self, conditions: list[str], riddle_ids: Optional[list[str]] = None
+    ) -> np.ndarray:
+        """Boolean mask of the riddles matching all conditions."""
+        mask = np.ones(len(self), dtype=bool)
+        if riddle_ids is not None:
+            mask &= np.isin(self.riddle_ids, riddle_ids)
+        for condition in conditions:
+            mask &= self._condition_mask(condition)
+        return mask
+
+    def query(
+        self, conditions: list[str], riddle_ids: Optional[list[str]] = None
+    ) -> list[str]:
+        """Ids of the riddles matching all conditions."""
+        return self.riddle_ids[self.mask(conditions, riddle_ids)].tolist()
+
+    def save(self, path: os.PathLike):
+        with cache.atomic_write(path, "wb") as f:
+            np.savez(f, **self.features)
+
+    @classmethod
+    def load(cls, path: os.PathLike) -> "FeatureIndex":
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+
+_FEATURE_INDEXES: dict[Path, FeatureIndex] = {}
+
+
+def get_feature_index() -> FeatureIndex:
+    dataset_dir = dataset.get_dataset_dir()
+    dataset_key = hashlib.sha1(str(dataset_dir.resolve()).encode()).hexdigest()[:16]
+    fingerprint = dataset.get_riddle_index().fingerprint()[:16]
+    features_dir = cache.get_cache_dir("features")
+    path = features_dir / f"{dataset_key}-v{FEATURE_INDEX_VERSION}-{fingerprint}.npz"
+    if (feature_index := _FEATURE_INDEXES.get(path)) is not None:
+        return feature_index
+    if path.exists():
+        feature_index = FeatureIndex.load(path)
+    else:
+        feature_index = FeatureIndex.build(dataset.get_riddle_paths(subdirs=["all"]))
+        feature_index.save(path)
+        # indexes of earlier states of the dataset are never used again
+        for stale_path in features_dir.glob(f"{dataset_key}-*.npz"):
+            if stale_path != path:
+                stale_path.unlink(missing_ok=True)
+    _FEATURE_INDEXES.clear()
+    _FEATURE_INDEXES[path] = feature_index
+    return feature_index
+
+
+def query_riddle_ids(
+    conditions: list[str], subdirs: list[str] = ["training"]
+) -> list[str]:
+    riddle_ids = dataset.get_riddle_ids(subdirs=subdirs)
+    return get_feature_index().query(conditions, riddle_ids=riddle_ids)
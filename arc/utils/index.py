@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+"""
+Persistent riddle-id index.
+
+The index maps every riddle id of a dataset directory to its subdir, path,
+mtime and size and is stored under the cache directory. It is updated
+incrementally: only directories whose mtime changed are rescanned, and a
+single file is re-stat'ed when its riddle is looked up. The fingerprint of the
+dataset is computed once per process and kept until the index changes.
+"""
+
+import hashlib
+import json
+import os
+import random
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+from arc.utils import cache
+
+INDEX_VERSION = 1
+
+
+class RiddleIndexEntry(NamedTuple):
+    subdir: str
+    path: str
+    mtime_ns: int
+    size: int
+
+
+def _group(rel_path: str) -> str:
+    """Top-level subdir of a path relative to the dataset dir."""
+    parts = rel_path.split("/")
+    return parts[0] if len(parts) > 1 else ""
+
+
+def is_riddle_file(name: str) -> bool:
+    # hidden files hold metadata such as the download manifest
+    return name.endswith(".json") and not name.startswith(".")
+
+
+def sample_id(id_lists: list[list[str]]) -> str:
+    """Uniformly sample from the union of id lists in O(len(id_lists))."""
+    idx = random.randrange(sum(map(len, id_lists)))
+    for ids in id_lists:
+        if idx < len(ids):
+            return ids[idx]
+        idx -= len(ids)
+    raise IndexError("Cannot sample from empty id lists.")
+
+
+class RiddleIndex:
+    def __init__(self, dataset_dir: os.PathLike, index_path: os.PathLike):
+        self.dataset_dir = Path(dataset_dir)
+        self.index_path = Path(index_path)
+        self.entries: dict[str, RiddleIndexEntry] = {}
+        self.dir_mtimes: dict[str, int] = {}
+        self._all_ids: list[str] = []
+        self._group_ids: dict[str, list[str]] = {}
+        self._prefix_ids: dict[str, list[str]] = {}
+        self._fingerprint: Optional[str] = None
+        self._load()
+        self.refresh()
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            data = json.loads(self.index_path.read_text())
+        except ValueError:
+            logger.warning(f"Ignoring corrupt riddle index {self.index_path}")
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        self.dir_mtimes = data["dirs"]
+        self.entries = {
+            riddle_id: RiddleIndexEntry(*entry)
+            for riddle_id, entry in data["entries"].items()
+        }
+        self._rebuild_groups()
+
+    def _save(self):
+        data = {
+            "version": INDEX_VERSION,
+            "dataset_dir": str(self.dataset_dir),
+            "dirs": self.dir_mtimes,
+            "entries": self.entries,
+        }
+        with cache.cache_lock(), cache.atomic_write(self.index_path) as f:
+            json.dump(data, f)
+
+    def _rebuild_groups(self):
+        self._all_ids = sorted(self.entries)
+        groups: dict[str, list[str]] = {}
+        for riddle_id in self._all_ids:
+            groups.setdefault(_group(self.entries[riddle_id].path), []).append(
+                riddle_id
+            )
+        self._group_ids = groups
+        self._prefix_ids = {}
+
+    def _dir_mtime(self, rel_dir: str) -> Optional[int]:
+        try:
+            return (self.dataset_dir / rel_dir).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _stale_dirs(self) -> list[str]:
+        if not self.dir_mtimes:
+            return [""]
+        return [
+            rel_dir
+            for rel_dir, mtime_ns in self.dir_mtimes.items()
+            if self._dir_mtime(rel_dir) != mtime_ns
+        ]
+
+    def _scan_dir(self, rel_dir: str):
+        """(Re)scan a single directory and recurse into new subdirectories."""
+        for riddle_id in [
+            riddle_id
+            for riddle_id, entry in self.entries.items()
+            if os.path.dirname(entry.path) == rel_dir
+        ]:
+            del self.entries[riddle_id]
+        if (mtime_ns := self._dir_mtime(rel_dir)) is None:
+            for known_dir in list(self.dir_mtimes):
+                if known_dir == rel_dir or known_dir.startswith(f"{rel_dir}/"):
+                    del self.dir_mtimes[known_dir]
+            return
+        self.dir_mtimes[rel_dir] = mtime_ns
+        with os.scandir(self.dataset_dir / rel_dir) as it:
+            for dir_entry in sorted(it, key=lambda e: e.name):
+                rel_path = f"{rel_dir}/{dir_entry.name}" if rel_dir else dir_entry.name
+                if dir_entry.is_dir():
+                    if rel_path not in self.dir_mtimes:
+                        self._scan_dir(rel_path)
+                elif is_riddle_file(dir_entry.name):
+                    riddle_id = dir_entry.name[: -len(".json")]
+                    if riddle_id in self.entries:
+                        logger.warning(
+                            f"Duplicate riddle id {riddle_id} in {rel_path}, keeping "
+                            f"{self.entries[riddle_id].path}"
+                        )
+                        continue
+                    stat = dir_entry.stat()
+                    self.entries[riddle_id] = RiddleIndexEntry(
+                        subdir=os.path.basename(rel_dir) or self.dataset_dir.name,
+                        path=rel_path,
+                        mtime_ns=stat.st_mtime_ns,
+                        size=stat.st_size,
+                    )
+
+    def refresh(self) -> bool:
+        """
+        Rescan all directories whose mtime changed since the last scan.
+
+        :return: Whether the index changed.
+        """
+        if not (stale_dirs := self._stale_dirs()):
+            return False
+        if not self.dataset_dir.is_dir():
+            logger.warning(f"{self.dataset_dir} is not a directory.")
+        for rel_dir in sorted(stale_dirs):
+            self._scan_dir(rel_dir)
+        self._rebuild_groups()
+        self._fingerprint = None
+        self._save()
+        return True
+
+    def _get_entry(self, riddle_id: str) -> RiddleIndexEntry:
+        if riddle_id not in self.entries:
+            self.refresh()
+        if (entry := self.entries.get(riddle_id)) is None:
+            raise KeyError(f"Riddle {riddle_id} not found in {self.dataset_dir}")
+        try:
+            stat = (self.dataset_dir / entry.path).stat()
+        except FileNotFoundError:
+            self.refresh()
+            if (entry := self.entries.get(riddle_id)) is None:
+                raise KeyError(f"Riddle {riddle_id} not found in {self.dataset_dir}")
+            return entry
+        if (stat.st_mtime_ns, stat.st_size) != (entry.mtime_ns, entry.size):
+            entry = entry._replace(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            self.entries[riddle_id] = entry
+            self._fingerprint = None
+            self._save()
+        return entry
+
+    def fingerprint(self) -> str:
+        """
+        Hash over all entries that changes whenever any riddle file changes.
+
+        All files are re-stat'ed for the first fingerprint only. Afterwards it
+        follows added and removed files and the riddles that are looked up, a
+        file edited in place in the meantime is only noticed when it is read.
+        """
+        self.refresh()
+        if self._fingerprint is None:
+            for riddle_id in list(self._all_ids):
+                try:
+                    self._get_entry(riddle_id)
+                except KeyError:
+                    pass
+            digest = hashlib.sha1(str(self.dataset_dir).encode())
+            for riddle_id in self._all_ids:
+                entry = self.entries[riddle_id]
+                digest.update(json.dumps([riddle_id, *entry]).encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def get_path(self, riddle_id: str) -> Path:
+        return self.dataset_dir / self._get_entry(riddle_id).path
+
+    def _ids_for_subdir(self, subdir: str) -> list[str]:
+        if subdir == "all":
+            return self._all_ids
+        if subdir in self._group_ids:
+            return self._group_ids[subdir]
+        if subdir not in self._prefix_ids:
+            prefix = subdir.rstrip("/") + "/"
+            self._prefix_ids[subdir] = [
+                riddle_id
+                for riddle_id in self._all_ids
+                if self.entries[riddle_id].path.startswith(prefix)
+            ]
+        return self._prefix_ids[subdir]
+
+    def get_ids(self, subdirs: list[str]) -> list[str]:
+        self.refresh()
+        if not subdirs or "all" in subdirs:
+            return list(self._all_ids)
+        if len(subdirs) == 1:
+            return list(self._ids_for_subdir(subdirs[0]))
+        return sorted(set().union(*(self._ids_for_subdir(sd) for sd in subdirs)))
+
+    def get_paths(self, subdirs: list[str]) -> dict[str, Path]:
+        return {
+            riddle_id: self.dataset_dir / self.entries[riddle_id].path
+            for riddle_id in self.get_ids(subdirs)
+        }
+
+    def get_random_id(self, subdirs: list[str]) -> str:
+        """Sample a riddle id uniformly without listing the whole dataset."""
+        if not subdirs:
+            subdirs = ["all"]
+        id_lists = [self._ids_for_subdir(sd) for sd in subdirs]
+        if not any(id_lists):
+            self.refresh()
+            id_lists = [self._ids_for_subdir(sd) for sd in subdirs]
+            if not any(id_lists):
+                raise ValueError(f"No riddles found in {subdirs=}")
+        return sample_id(id_lists)
+
+
+_INDEXES: dict[Path, RiddleIndex] = {}
+
+
+def get_index_path(dataset_dir: os.PathLike) -> Path:
+    key = hashlib.sha1(str(Path(dataset_dir).resolve()).encode()).hexdigest()[:16]
+    return cache.get_cache_dir("index") / f"{key}.json"
+
+
+def get_riddle_index(dataset_dir: os.PathLike) -> RiddleIndex:
+    dataset_dir = Path(dataset_dir)
+    index_path = get_index_path(dataset_dir)
+    if (index := _INDEXES.get(dataset_dir)) is None or index.index_path != index_path:
+        index = _INDEXES[dataset_dir] = RiddleIndex(dataset_dir, index_path)
+    return index
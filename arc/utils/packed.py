@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+"""
+Packed binary corpus format.
+
+A packed file stores a whole set of riddles in a single file that can be
+memory-mapped, so riddles can be handed out without parsing any JSON and many
+processes can share one page-cached copy.
+
+Layout (all integers little endian)::
+
+    8 bytes   magic (b"ARCPACK\\0")
+    8 bytes   uint64 length of the JSON header
+    ...       JSON header, padded to ALIGNMENT
+    ...       array sections, each starting at a multiple of ALIGNMENT
+
+The header holds the riddle-id table, the subdir of every riddle, the
+fingerprint of the dataset it was packed from (if any) and the offset, dtype
+and shape of every array section:
+
+* ``riddles``: int64 ``(R, 3)`` of (first pair index, num train, num test)
+* ``boards``: int64 ``(B, 3)`` of (cell offset, num rows, num cols), two
+  boards (input, output) per pair
+* ``cells``: uint8 ``(C,)`` blob with all board cells in row-major order
+"""
+
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+from arc.interface import Board, BoardPair, Riddle
+from arc.utils import cache
+
+MAGIC = b"ARCPACK\0"
+VERSION = 1
+ALIGNMENT = 64
+PACKED_SUFFIX = ".arcpack"
+
+_PREAMBLE = struct.Struct("<8sQ")
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _iter_pairs(riddle: Riddle) -> Iterator[BoardPair]:
+    yield from riddle.train
+    yield from riddle.test
+
+
+def pack_riddles(
+    riddles: Iterable[Riddle],
+    output_path: os.PathLike,
+    fingerprint: Optional[str] = None,
+) -> Path:
+    """
+    Write riddles into a single packed file.
+
+    :param riddles: Riddles to pack. Every riddle must have a unique riddle_id.
+    :param output_path: Path of the packed file to write.
+    :param fingerprint: Fingerprint of the dataset the riddles come from.
+    :return: Path to the packed file.
+    """
+    riddle_ids, subdirs = [], []
+    riddle_rows, board_rows, cell_chunks = [], [], []
+    num_pairs, num_cells = 0, 0
+    for riddle in riddles:
+        if riddle.riddle_id is None:
+            raise ValueError("Can only pack riddles with a riddle_id.")
+        riddle_ids.append(riddle.riddle_id)
+        subdirs.append(riddle.subdir)
+        riddle_rows.append((num_pairs, len(riddle.train), len(riddle.test)))
+        for pair in _iter_pairs(riddle):
+            for board in (pair.input, pair.output):
+                cells = board.np.ravel()
+                board_rows.append((num_cells, *board.shape))
+                cell_chunks.append(cells)
+                num_cells += cells.size
+            num_pairs += 1
+
+    if len(set(riddle_ids)) != len(riddle_ids):
+        raise ValueError("Riddle ids must be unique to be packed.")
+
+    arrays = {
+        "riddles": np.array(riddle_rows, dtype="<i8").reshape(-1, 3),
+        "boards": np.array(board_rows, dtype="<i8").reshape(-1, 3),
+        "cells": (
+            np.concatenate(cell_chunks) if cell_chunks else np.zeros(0, np.uint8)
+        ),
+    }
+
+    # section offsets depend on the header size, so grow the reserved header
+    # space until the header (including the final offsets) fits into it
+    relative_offsets, offset = {}, 0
+    for name, array in arrays.items():
+        relative_offsets[name] = offset
+        offset = _align(offset + array.nbytes)
+    data_start = 0
+    while True:
+        header = {
+            "version": VERSION,
+            "riddle_ids": riddle_ids,
+            "subdirs": subdirs,
+            "fingerprint": fingerprint,
+            "sections": {
+                name: {
+                    "offset": data_start + relative_offsets[name],
+                    "dtype": array.dtype.str,
+                    "shape": list(array.shape),
+                }
+                for name, array in arrays.items()
+            },
+        }
+        header_bytes = json.dumps(header).encode()
+        if (required := _align(_PREAMBLE.size + len(header_bytes))) <= data_start:
+            break
+        data_start = required
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with cache.atomic_write(output_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.write(b"\0" * (header["sections"][name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+    logger.info(f"Packed {len(riddle_ids)} riddles into {output_path}")
+    return output_path
+
+
+class PackedDataset:
+    """
+    Read-only view on a packed file.
+
+    The file is memory-mapped and all board cells are served from the mapping,
+    so opening a packed dataset is cheap and the pages are shared between
+    processes. Use it as a context manager (or call ``close``) to unmap the
+    file once its riddles are no longer needed.
+    """
+
+    def __init__(self, path: os.PathLike):
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            magic, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a packed arc dataset.")
+            header = json.loads(f.read(header_len))
+            if header["version"] != VERSION:
+                raise ValueError(
+                    f"Unsupported packed version {header['version']} in {self.path}"
+                )
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        arrays = {}
+        for name, section in header["sections"].items():
+            dtype = np.dtype(section["dtype"])
+            shape = tuple(section["shape"])
+            if not (count := int(np.prod(shape))):
+                arrays[name] = np.zeros(shape, dtype=dtype)
+                continue
+            arrays[name] = np.frombuffer(
+                self._mmap,
+                dtype=dtype,
+                count=count,
+                offset=section["offset"],
+            ).reshape(shape)
+        self._riddles = arrays["riddles"]
+        self._boards = arrays["boards"]
+        self._cells = arrays["cells"]
+        self.riddle_ids: list[str] = header["riddle_ids"]
+        self.subdirs: list[Optional[str]] = header["subdirs"]
+        self.fingerprint: Optional[str] = header.get("fingerprint")
+        self._id_to_idx = {rid: idx for idx, rid in enumerate(self.riddle_ids)}
+
+    def close(self):
+        """
+        Unmap the file.
+
+        Boards handed out are views into the mapping, while any of them is
+        alive the file stays mapped until it is garbage collected.
+        """
+        self._riddles = self._boards = self._cells = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self) -> "PackedDataset":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.riddle_ids)
+
+    def __contains__(self, riddle_id: str) -> bool:
+        return riddle_id in self._id_to_idx
+
+    def __iter__(self) -> Iterator[Riddle]:
+        return (self[idx] for idx in range(len(self)))
+
+    def __getitem__(self, key: Union[int, str]) -> Riddle:
+        idx = self._id_to_idx[key] if isinstance(key, str) else key
+        return self.get_riddle(idx)
+
+    def board_array(self, board_idx: int) -> np.ndarray:
+        """Read-only uint8 view of a single board inside the mapping."""
+        offset, num_rows, num_cols = self._boards[board_idx]
+        return self._cells[offset : offset + num_rows * num_cols].reshape(
+            num_rows, num_cols
+        )
+
+    def _board(self, board_idx: int) -> Board:
+        # boards were validated when the file was packed, so hand out the
+        # read-only views into the mapping without copying
+        return Board.from_array_trusted(self.board_array(board_idx))
+
+    def _pair(self, pair_idx: int) -> BoardPair:
+        return BoardPair.construct_fast(
+            input=self._board(2 * pair_idx), output=self._board(2 * pair_idx + 1)
+        )
+
+    def get_riddle(self, idx: int) -> Riddle:
+        first_pair, num_train, num_test = self._riddles[idx].tolist()
+        pairs = [self._pair(first_pair + i) for i in range(num_train + num_test)]
+        return Riddle.construct_fast(
+            train=pairs[:num_train],
+            test=pairs[num_train:],
+            riddle_id=self.riddle_ids[idx],
+            subdir=self.subdirs[idx],
+        )
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import multiprocessing.context
+from pathlib import Path
+from typing import Optional
+
+from arc import tracing
+from arc.settings import settings
+
+_context: Optional[multiprocessing.context.BaseContext] = None
+
+
+def get_context() -> multiprocessing.context.BaseContext:
+    """
+    The multiprocessing context of all worker processes.
+
+    The parent runs threads (progress bars, prefetching, supervisors), forking
+    it could copy locks held by them, so workers are forked from a clean server
+    process that has the evaluator imported already. Where there is no fork
+    server (e.g. on Windows) they are spawned.
+    """
+    global _context
+    if _context is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            _context = multiprocessing.get_context("forkserver")
+            _context.set_forkserver_preload(["arc.eval"])
+        else:
+            _context = multiprocessing.get_context("spawn")
+    return _context
+
+
+def worker_initargs() -> tuple[dict, Optional[Path]]:
+    """The arguments of ``init_worker`` that set a worker up like this process."""
+    return settings.dict(), tracing.trace_path()
+
+
+def init_worker(parent_settings: dict, trace_path: Optional[Path]):
+    """
+    Take over the settings of the parent and trace into its trace.
+
+    Workers do not inherit the memory of their parent, settings changed after
+    the start (e.g. by the CLI) would be lost otherwise.
+    """
+    for name, value in parent_settings.items():
+        setattr(settings, name, value)
+    tracing.init_worker(trace_path)